@@ -17,7 +17,7 @@
 
 """TronBot implementation by Corey Abshire."""
 
-import optparse, logging, time, cProfile, tron
+import optparse, logging, time, cProfile, tron, tronio, tronboard, tronarrays, tronsearch, aimatron
 from tronutils import *
 from tronmoves import *
 
@@ -28,6 +28,11 @@ argp.add_option("--profile", default=None)
 argp.add_option("--time-limit", type="float", default=1.0)
 argp.add_option("--considered-near", type="int", default=6)
 argp.add_option("--same-dist-limit", type="int", default=16)
+argp.add_option("--search", type="choice", choices=searches, default="aima")
+argp.add_option("--eval", type="choice", choices=sorted(aimatron.evaluations),
+                default="regions")
+argp.add_option("--ponder", action="store_true", default=False)
+argp.add_option("--pool-size", type="int", default=tronsearch.POOL_SIZE)
 
 def which_move(board, start_time, same_dist):
     "Determine which move to make given the current board."
@@ -41,28 +46,40 @@ def which_move(board, start_time, same_dist):
 
     # Calculate the shortest path from me to them. This is useful
     # for a couple of different strategies, plus, it tells me if
-    # we are still connected or not.
-    try:
-        path_to_them = shortest_path(board, board.me(), board.them())
-    except KeyError:
-        path_to_them = None
+    # we are still connected or not. The region labels on the board
+    # answer that last part without searching, so skip the search
+    # when we already know there is no path.
+    board = tronboard.compact(board)
+    path_to_them = None
+    if board.connected():
+        try:
+            path_to_them = shortest_path(board, board.me(), board.them())
+        except KeyError:
+            pass
 
     # If we're no longer connected, we do not need to consider
     # the opponents moves at all. Instead, we should just focus
-    # on using as much of the board as possible. The best strategy
-    # I have for that at the moment is the most open strategy.
+    # on using as much of the board as possible, by searching for
+    # the longest path through what's left and following it.
+    finish_by = start_time + config.time_limit - config.hurry
     if not path_to_them:
-        logging.debug('not connected, so using most open')
-        return most_open_move(board, tron.DIRECTIONS)
+        logging.debug('not connected, so filling')
+        return fill_move(board, finish_by)
+
+    # The Monte Carlo search doesn't need the players to be near each
+    # other to see far enough ahead, so when it's asked for, it plays
+    # every move until we are separated.
+    if config.search == 'mcts':
+        logging.debug('connected, so using monte carlo')
+        return mcts_move(board, finish_by)
 
     # If we're near enough that minimax (with alpha-beta pruning)
     # is practical, then we should use that. It should return the
     # absolute best move if it can see far enough ahead in terms
     # of board space.
-    finish_by = start_time + config.time_limit - config.hurry
     if moves_between(path_to_them) <= config.considered_near:
         logging.debug('within threshold, so using alphabeta')
-        return minimax_move(board, finish_by)
+        return minimax_move(board, finish_by, config.search)
 
     # If there is a set of a few points that me and my opponent
     # are an equal distance from, then the are probably pretty
@@ -86,18 +103,35 @@ def mainloop():
     move_number = 1
     first_move = True
 
+    # Pondering keeps searching the boards that could come next while
+    # we wait for the engine. It only helps the in-place searches.
+    ponderer = config.ponder and aimatron.Ponderer() or None
+
     # Just keep iterating. The generator stops when the game is over.
-    for board in tron.Board.generate():
+    for board in tronio.generate():
 
         # Record exactly when we read the board to calculate time remaining.
         start_time = time.time()
 
+        # Stop pondering, and let this turn's search start from what
+        # it found for the moves that were actually made.
+        if ponderer:
+            ponderer.stop()
+            ponderer.seed(board)
+
+        # Positions with more floor than this can't be searched again.
+        logging.debug(aimatron.eval_cache.report())
+        aimatron.eval_cache.new_turn(board.floor_count)
+
         # Some statistics we need are only available on the first move.
         if first_move:
-            same_dist = same_distance(board, board.me(), board.them())
+            if tronarrays.numpy:
+                same_dist = tronarrays.same_distance(board, board.me(), board.them())
+            else:
+                same_dist = same_distance(board, board.me(), board.them())
             first_move = False
 
-        logging.debug('move %d', move_number)
+        logging.debug('move %d (last moves %s)', move_number, board.last_moves)
 
         # Call the configured strategy to determine the best move.
         # Then update the local state object and log a few details.
@@ -112,6 +146,12 @@ def mainloop():
         tron.move(my_move)
         move_number += 1
 
+        if ponderer:
+            ponderer.start(board, my_move)
+
+    if ponderer:
+        ponderer.stop()
+
 def enable_logging(logfile, level=logging.DEBUG):
     "Enable logging to the specified logfile."
     logging.basicConfig(filename=logfile, level=level, filemode='w')
@@ -123,6 +163,17 @@ if __name__ == "__main__":
         enable_logging(config.log)
 
     logging.debug('config: %s', config)
+
+    # Cap the number of states the AIMA search keeps between turns.
+    aimatron.pooled_game.pool.capacity = config.pool_size
+
+    # Pick the evaluation before any worker processes copy the module.
+    aimatron.use_evaluation(config.eval)
+
+    # Start the worker processes now, rather than on the first turn
+    # that needs them, so the time it takes isn't taken from a move.
+    if config.search == 'parallel':
+        aimatron.start_workers()
         
     if config.profile:
         cProfile.run('mainloop()', config.profile)
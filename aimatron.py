@@ -14,15 +14,12 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import logging, time
+import logging, time, threading, multiprocessing, Queue
 import games, utils
-import tron
+import tron, tronboard, tronsearch, bitboard, endgame
+from tronsearch import TimeAlmostUp, TimeManager
 from tronutils import *
 
-class TimeAlmostUp():
-    "Exception class that represents when move submission is due."
-    pass
-
 class TronState():
     "Represents a single game state for minimax search."
 
@@ -45,6 +42,11 @@ class TronState():
         self.score_cache = None
         self.move_cache = {}
 
+    @property
+    def key(self):
+        "The Zobrist key of this state, for hashing positions."
+        return tronboard.state_key(self.board, self.to_move, self.move1)
+
 class TronGame(games.Game):
     "A representation of Tron compatible with AIMA alpha-beta."
 
@@ -99,6 +101,18 @@ class TronGame(games.Game):
         # Useless for this one, but required for the chunky bot.
         return move
 
+    def new_tree(self, board):
+        "Return the root state of a new tree for searching board."
+        return TronState(board, tron.ME)
+
+    def cached_move(self, move, state):
+        "Return the state made by move from state before, or None."
+        return state.move_cache.get(move)
+
+    def reroot(self, state):
+        "Make state the root of the tree, letting go of the rest of it."
+        pass # nothing but the old root refers to the rest
+
 class TronChunkyGame(TronGame):
     "A representation of Tron compatible with AIMA alpha-beta."
 
@@ -152,20 +166,147 @@ class TronChunkyGame(TronGame):
         "Translate this move into what should be returned to the bot."
         return move[0]
 
+class PooledState(object):
+    "A TronState that lives in a NodePool."
+
+    # This is the same state as TronState, but with slots instead of
+    # a dict for its attributes, and with its children kept by the
+    # pool, which refers to them by slot number. The only references
+    # to the states are then the pool's own, so it can let them go.
+    # Each keeps the Zobrist key of its position, so that a state can
+    # be checked against the board it's meant to stand for. Its score
+    # is in score_cache, where the search of its parent finds it.
+
+    __slots__ = ('board', 'to_move', 'move1', 'key', 'score_cache',
+                 'index', 'parent', 'move', 'children', 'used')
+
+    def __init__(self, board, to_move, move1=None):
+        self.board = board
+        self.to_move = to_move
+        self.move1 = move1
+        self.key = tronboard.state_key(board, to_move, move1)
+        self.score_cache = None
+        self.index = -1
+        self.parent = -1
+        self.move = None
+        self.children = {}
+        self.used = 0
+
+class TronPooledGame(TronGame):
+    "A representation of Tron whose search tree is held in a NodePool."
+
+    # The pool caps how many states are cached between iterations and
+    # turns, evicting the coldest subtrees when it fills up. A state
+    # that was evicted while the search was still using it works just
+    # the same, but what is found below it is not cached any more.
+
+    def __init__(self, pool=None):
+        if pool is None:
+            pool = tronsearch.NodePool()
+        self.pool = pool
+
+    def make_move(self, move, state):
+        "Return the new state resulting from making the given move."
+        pool = self.pool
+        pool.touch(state)
+        next_state = pool.child(state, move)
+        if next_state is not None:
+            return next_state
+        next_to_move = opponent(state.to_move)
+        if state.move1:
+            next_board = apply_move(state.board, next_to_move, state.move1)
+            next_board = apply_move(next_board, state.to_move, move)
+            next_state = PooledState(next_board, next_to_move)
+        else:
+            next_state = PooledState(state.board, next_to_move, move)
+            next_state.score_cache = state.score_cache
+        return pool.add(next_state, state, move)
+
+    def new_tree(self, board):
+        "Return the root state of a new tree for searching board."
+        self.searched()
+        self.pool.clear()
+        return self.pool.add(PooledState(board, tron.ME))
+
+    def cached_move(self, move, state):
+        "Return the state made by move from state before, or None."
+        return self.pool.child(state, move)
+
+    def reroot(self, state):
+        "Make state the root of the tree, letting go of the rest of it."
+        self.searched()
+        self.pool.reroot(state)
+
+    def searched(self):
+        "Log what happened to the pool in the last search, and start counting again."
+        logging.debug(self.pool.report())
+        self.pool.reset_stats()
+
+class InPlaceState():
+    "A single game state that is updated in place as the search walks."
+
+    # Rather than creating a new state for every node, the in-place
+    # search keeps just this one and has the game make and unmake
+    # moves on its board. The pending first half of each joint move
+    # is kept on a stack so it can be put back when the second half
+    # is taken back.
+
+    def __init__(self, board, to_move):
+        self.board = board
+        self.to_move = to_move
+        self.move1 = None
+        self.pending = []
+
+    @property
+    def key(self):
+        "The Zobrist key of the current state, for hashing positions."
+        return tronboard.state_key(self.board, self.to_move, self.move1)
+
+class TronInPlaceGame(TronGame):
+    "A representation of Tron that makes and unmakes moves in place."
+
+    def legal_moves(self, state):
+        "Find all the moves possible from the current state."
+        board = state.board
+        if state.to_move == tron.ME:
+            a = board.p1
+        else:
+            a = board.p2
+        return [d for b, d in board.geometry.floor_moves(board.cells, a)]
+
+    def do_move(self, move, state):
+        "Make the given move on the state, in place."
+        if state.move1 is None:
+            # This is the first move for this turn, so just remember
+            # it until the other player has moved as well.
+            state.move1 = move
+        else:
+            # Apply both moves in the same order as TronGame does.
+            first_to_move = opponent(state.to_move)
+            state.board.do_move(first_to_move, state.move1)
+            state.board.do_move(state.to_move, move)
+            state.pending.append(state.move1)
+            state.move1 = None
+        state.to_move = opponent(state.to_move)
+
+    def undo_move(self, state):
+        "Take back the last move made on the state with do_move."
+        state.to_move = opponent(state.to_move)
+        if state.move1 is not None:
+            state.move1 = None
+        else:
+            state.board.undo_move()
+            state.board.undo_move()
+            state.move1 = state.pending.pop()
+
 #_____________________________________________________________________
 # Evaluation Function (very important)
 #
 
-def eval_fn(state):
-    "Assign a score to this board relative to player."
-
-    # Check the cache first, since computing it is expensive.
-    if state.score_cache:
-        logging.debug('cache hit on score: %0.2f', state.score_cache)
-        return state.score_cache
-    
+def evaluate(board):
+    "Assign a score to this board relative to me."
     try:
-        p1, p2, t, touching = dfs_count_around(state.board)
+        p1, p2, t, touching = bitboard.dfs_count_around(board)
 
         # Neither of us have space.
         # Thus, it's a draw.
@@ -193,10 +334,307 @@ def eval_fn(state):
     except KeyError:
         score = -0.5 
 
+    return score
+
+def evaluate_voronoi(board, chambers=False):
+    "Assign a score to this board relative to me, by who can get to more of it first."
+
+    # Rather than counting all the space either of us can reach, as
+    # evaluate does, this only counts the space each of us can get to
+    # before the other, so it can tell who is winning the race for
+    # the space in between. With chambers, each player's territory is
+    # counted as the most moves it could hold, as bounded by the
+    # endgame fill solver, rather than as its size, since a player
+    # can't fill both sides of a territory that splits in two.
+    try:
+        bb = bitboard.BitBoard(board)
+        a, b = bb.bit(board.me()), bb.bit(board.them())
+        can1, can2 = bb.spread(a), bb.spread(b)
+
+        # Neither of us can move, so it's a draw. Otherwise whoever
+        # can't move loses.
+        if not (can1 or can2):
+            return -0.5
+        elif not can1:
+            return -1.0
+        elif not can2:
+            return 1.0
+
+        mine, theirs = bitboard.voronoi(bb, a, b)
+        if chambers:
+            m1 = territory_bound(board, bb, mine, board.me())
+            m2 = territory_bound(board, bb, theirs, board.them())
+        else:
+            m1, m2 = bitboard.popcount(mine), bitboard.popcount(theirs)
+        if not m1 + m2:
+            return 0.0
+        return float(m1 - m2) / float(m1 + m2)
+
+    # KeyError occurs if one of the players disappear (i.e. they crashed)
+    except KeyError:
+        return -0.5
+
+def evaluate_chambers(board):
+    "Assign a score to this board relative to me, by the moves each of us can make in our territory."
+    return evaluate_voronoi(board, True)
+
+def territory_bound(board, bb, territory, coords):
+    "Bound the moves the player at coords can make within the territory."
+    geometry = tronboard.geometry(board.width, board.height)
+    cells = bytearray(tronboard.WALL for i in xrange(geometry.size))
+    for c in bb.coords(territory):
+        cells[geometry.index(c)] = tronboard.FLOOR
+    return endgame.fill_bound(cells, geometry, geometry.index(coords))
+
+def turn_lanes(board, bb, turns):
+    "List the floor and the heads of both players after each turn."
+
+    # Each turn is a pair of my move and theirs from board, onto two
+    # different floor tiles. The tiles they left are already walls on
+    # bb, so all a turn changes is that the tiles moved onto aren't
+    # floor anymore.
+    w = board.width
+    floors, heads1, heads2 = [], [], []
+    for m1, m2 in turns:
+        a = bb.bit(divmod(board.p1 + board.offsets[m1], w))
+        b = bb.bit(divmod(board.p2 + board.offsets[m2], w))
+        floors.append(bb.floor & ~(a | b))
+        heads1.append(a)
+        heads2.append(b)
+    return floors, heads1, heads2
+
+def separated_turns(board, turns):
+    "Determine after which of the turns the players are separated, all at once."
+
+    # The same test as separated_value makes, with every turn in its
+    # own lane: both players can move, but my region doesn't reach
+    # any of the tiles next to them, and we're not next to each other.
+    bb = bitboard.BitBoard(board)
+    count = len(turns)
+    floor, a, b = [bitboard.pack(bb, sets) for sets in turn_lanes(board, bb, turns)]
+    can1 = bitboard.unpack(bb, bb.spread(a, floor), count)
+    near = bitboard.unpack(bb, bb.spread(b, floor), count)
+    reach = bitboard.unpack(bb, bb.fill(a, floor), count)
+    touch = bitboard.unpack(bb, bb.spread(a, ~0) & b, count)
+    return [bool(can1[i] and near[i] and not reach[i] & near[i] and not touch[i])
+            for i in xrange(count)]
+
+def evaluate_turns_voronoi(board, turns):
+    "Evaluate the board after each turn as evaluate_voronoi would, all at once."
+    bb = bitboard.BitBoard(board)
+    count = len(turns)
+    floor, a, b = [bitboard.pack(bb, sets) for sets in turn_lanes(board, bb, turns)]
+    can1 = bitboard.unpack(bb, bb.spread(a, floor), count)
+    can2 = bitboard.unpack(bb, bb.spread(b, floor), count)
+    mine, theirs = bitboard.voronoi(bb, a, b, floor)
+    mine = bitboard.unpack(bb, mine, count)
+    theirs = bitboard.unpack(bb, theirs, count)
+    scores = []
+    for i in xrange(count):
+        if not (can1[i] or can2[i]):
+            scores.append(-0.5)
+        elif not can1[i]:
+            scores.append(-1.0)
+        elif not can2[i]:
+            scores.append(1.0)
+        else:
+            m1, m2 = bitboard.popcount(mine[i]), bitboard.popcount(theirs[i])
+            scores.append(m1 + m2 and float(m1 - m2) / float(m1 + m2) or 0.0)
+    return scores
+
+def evaluate_turns_regions(board, turns):
+    "Evaluate the board after each turn as evaluate would, all at once."
+
+    # Like dfs_count_around, each region next to either player is
+    # filled once, starting from the lowest tile next to a player that
+    # isn't in a region yet, and counts for every move into it. Each
+    # round fills the next region of every board that has one, each
+    # in its own lane, and there is rarely more than one round, since
+    # the moves next to the players mostly all lead into one region.
+    # A player's space is the biggest region it can move into.
+    bb = bitboard.BitBoard(board)
+    count = len(turns)
+    floors, a, b = turn_lanes(board, bb, turns)
+    moves = [(bb.spread(h1, f), bb.spread(h2, f)) for f, h1, h2 in zip(floors, a, b)]
+    remaining = [m1 | m2 for m1, m2 in moves]
+    space = [[0, 0] for i in xrange(count)]
+    while True:
+        boards = [i for i in xrange(count) if remaining[i]]
+        if not boards:
+            break
+        seeds = [bitboard.lowest(remaining[i]) for i in boards]
+        seed = bitboard.pack(bb, seeds)
+        fill = bb.fill(seed, bitboard.pack(bb, [floors[i] for i in boards]))
+        for i, region in zip(boards, bitboard.unpack(bb, fill | seed, len(boards))):
+            c = bitboard.popcount(region)
+            for player in (0, 1):
+                if moves[i][player] & region:
+                    space[i][player] = max(space[i][player], c)
+            remaining[i] &= ~region
+    scores = []
+    for m1, m2 in space:
+        if not (m1 or m2):
+            scores.append(-0.5)
+        elif not m1:
+            scores.append(-1.0)
+        elif not m2:
+            scores.append(1.0)
+        else:
+            scores.append(float(m1) / float(m1 + m2) * 2.0 - 1.0)
+    return scores
+
+# The evaluations the searches can be told to use, by name.
+evaluations = {
+    'regions': evaluate,
+    'voronoi': evaluate_voronoi,
+    'chambers': evaluate_chambers }
+
+# The evaluation every search uses.
+evaluation = evaluate
+
+# Versions of the evaluations that score the boards after many turns
+# at once, by evaluation.
+batch_evaluations = {
+    evaluate: evaluate_turns_regions,
+    evaluate_voronoi: evaluate_turns_voronoi }
+
+# Evaluations of the positions searched so far in the game.
+eval_cache = tronsearch.EvalCache()
+
+def use_evaluation(name):
+    "Make all the searches evaluate boards with the named evaluation."
+    global evaluation
+    evaluation = evaluations[name]
+    eval_cache.clear()
+
+def evaluate_board(board):
+    "Evaluate board with the evaluation the searches use, through the cache."
+    key = tronboard.board_key(board)
+    score = eval_cache.get(key)
+    if score is None:
+        score = separated_value(board)
+        settled = score is not None
+        if not settled:
+            score = evaluation(board)
+        eval_cache.put(key, score, tronboard.floor_count(board), settled)
+    return score
+
+#_____________________________________________________________________
+# Separated Positions
+#
+
+def separated_value(board):
+    "Find the value of board by the moves each of us has left, or None if we can still meet."
+
+    # Once the players can't reach each other, all that's left of the
+    # game is for each of us to fill our own region, and whoever can
+    # make more moves wins (and the same number is a draw). So rather
+    # than guessing at who is ahead, the value is worked out from our
+    # fill lengths: exact ones for small regions, and for the rest,
+    # just the size of the region, which no fill can be longer than.
+    # It's only a sure win, loss or draw if the lengths prove it, and
+    # otherwise the sizes are compared the way evaluate compares them.
+    # Positions where someone can't move at all are left to the
+    # evaluations, which already score them exactly.
+    try:
+        bb = bitboard.BitBoard(board)
+        a, b = bb.bit(board.me()), bb.bit(board.them())
+    except KeyError:
+        return None
+    near = bb.spread(b)
+    if not near or not bb.spread(a) or bb.spread(a, ~0) & b:
+        return None
+    mine = bb.fill(a)
+    if mine & near:
+        return None
+    cells = tronboard.flatten(board)
+    g = tronboard.geometry(board.width, board.height)
+    least1, most1 = fill_length(cells, g, board.me(), mine)
+    least2, most2 = fill_length(cells, g, board.them(), bb.fill(b))
+    if least1 > most2:
+        return 1.0
+    if least2 > most1:
+        return -1.0
+    if least1 == most1 == least2 == most2:
+        return -0.5
+    return float(most1 - most2) / float(most1 + most2)
+
+def fill_length(cells, geometry, coords, region):
+    "Find the least and most moves the player at coords can make in its region."
+    size = bitboard.popcount(region)
+    if size > endgame.EXACT_FILL_SIZE:
+        return 0, size
+    return endgame.fill_length(cells, geometry, geometry.index(coords))
+
+def settle(board):
+    "Determine whether the game on board is settled by the players being separated."
+
+    # For the cutoff tests of the searches, which then evaluate the
+    # board, and find the value waiting in the cache. The same nodes
+    # come up again and again, through transpositions and on every
+    # pass of the deepening, so a board already in the cache is
+    # answered from it.
+    key = tronboard.board_key(board)
+    if eval_cache.get(key) is not None:
+        return eval_cache.settled(key)
+    score = separated_value(board)
+    if score is None:
+        return False
+    eval_cache.put(key, score, tronboard.floor_count(board), True)
+    return True
+
+def evaluate_turns(board, turns):
+    "Evaluate the board after each turn (my move, their move), through the cache."
+
+    # The turns are looked up in the cache by the keys they would
+    # give board, and those that miss are then evaluated all together
+    # if the evaluation has a batch version, or else made on board
+    # one at a time to be evaluated. Either way, turns that separate
+    # the players are made on board to be settled exactly.
+    scores = [eval_cache.get(board.turn_key(m1, m2)) for m1, m2 in turns]
+    missed = [i for i, score in enumerate(scores) if score is None]
+    if not missed:
+        return scores
+    separated = separated_turns(board, [turns[i] for i in missed])
+    for i, apart in zip(missed, separated):
+        if apart:
+            board.do_move(tron.ME, turns[i][0])
+            board.do_move(tron.THEM, turns[i][1])
+            scores[i] = separated_value(board)
+            board.undo_move()
+            board.undo_move()
+    batch = batch_evaluations.get(evaluation)
+    rest = [i for i in missed if scores[i] is None]
+    if batch and rest:
+        for i, score in zip(rest, batch(board, [turns[i] for i in rest])):
+            scores[i] = score
+    else:
+        for i in rest:
+            board.do_move(tron.ME, turns[i][0])
+            board.do_move(tron.THEM, turns[i][1])
+            scores[i] = evaluation(board)
+            board.undo_move()
+            board.undo_move()
+    floor = board.floor_count - 2
+    for i in missed:
+        eval_cache.put(board.turn_key(*turns[i]), scores[i], floor, i not in rest)
+    return scores
+
+def eval_fn(state):
+    "Assign a score to this state relative to player."
+
+    # Check the cache first, since computing it is expensive.
+    if state.score_cache:
+        logging.debug('cache hit on score: %0.2f', state.score_cache)
+        return state.score_cache
+
+    score = evaluate_board(state.board)
+
     # Write out some debug messages.
     logging.debug('score %0.2f', score)
-    for line in state.board.board:
-        logging.debug(line)
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        for line in state.board.board:
+            logging.debug(line)
 
     # Save this in case we need it again.
     state.score_cache = score
@@ -206,7 +644,7 @@ def eval_fn(state):
 # Cut-off Function (also very important)
 #
 
-def make_cutoff_fn(max_depth, stats, finish_by, game):
+def make_cutoff_fn(max_depth, stats, finish_by, game, clock=None):
     "Create a cutoff function based on the given parameters."
     
     # This cutoff function is pretty simple. Basically it
@@ -217,21 +655,71 @@ def make_cutoff_fn(max_depth, stats, finish_by, game):
     # is called it checks if its nearing the deadline for
     # submitting the move and throws an exception that will
     # be caught by the search, so that the best completed move
-    # so far can be returned on time to the game engine.
+    # so far can be returned on time to the game engine. Given
+    # a clock (a TimeManager) it leaves the checking up to that.
 
     def cutoff_fn(state, depth):
         "Determine whether to cutoff the search."
         
-        if finish_by and time.time() >= finish_by:
+        if clock:
+            clock.tick()
+        elif finish_by and time.time() >= finish_by:
             raise TimeAlmostUp()
         
         stats.nodes += 1
         stats.max_depth = max(stats.max_depth, depth)
-        
-        return depth >= max_depth or game.terminal_test(state)
+
+        # Once the players are separated, the rest of the game can be
+        # settled without searching it. Halfway through a turn the
+        # board is the same as at the start, so it was checked then.
+        return (depth >= max_depth or game.terminal_test(state) or
+                (state.move1 is None and settle(state.board)))
         
     return cutoff_fn
 
+#_____________________________________________________________________
+# Search Tree Reuse
+#
+
+# The game and root of the tree the AIMA search built last turn, along
+# with where the players were on its board, or None before the first.
+search_tree = None
+
+# The game the bot searches with, which keeps its pool between turns.
+pooled_game = TronPooledGame()
+
+def reuse_tree(board, game):
+    "Return the state for board from last turn's tree, or a new root if it isn't there."
+
+    # Whatever the search expanded last turn is cached in the move
+    # caches of its states, scores and all, and the board that comes
+    # next is one of the grandchildren of the root. The moves the
+    # players made are found from where they were and where they are
+    # now, and the state they lead to becomes the new root, as long
+    # as its key shows that its board really is the same. The game
+    # then lets go of the rest of the tree.
+    global search_tree
+    state = None
+    if search_tree is not None and search_tree[0] is game:
+        root, me, them = search_tree[1:]
+        try:
+            mine, theirs = move_made(me, board.me()), move_made(them, board.them())
+            state = game.cached_move(mine, root)
+            if state is not None:
+                state = game.cached_move(theirs, state)
+            if state is not None and state.key != tronboard.state_key(board, tron.ME):
+                state = None
+        except KeyError:
+            state = None
+    if state is None:
+        logging.debug('starting a new search tree')
+        state = game.new_tree(board)
+    else:
+        logging.debug('reusing the search tree after moves %s', (mine, theirs))
+        game.reroot(state)
+    search_tree = (game, state, board.me(), board.them())
+    return state
+
 #_____________________________________________________________________
 # Primary Interface for the Bot
 #
@@ -242,9 +730,10 @@ def alphabeta_search(board, game, finish_by=None):
     # Pick at least some default to move if we're really slow.
     # We also keep it updated each level further we go down.
     best_completed_move = board.moves()[0]
+    clock = TimeManager(finish_by)
     
     try:
-        state = TronState(board, tron.ME)
+        state = reuse_tree(board, game)
 
         # Use iterative deepening search around the AIMA minimax
         # algorithm (the one that uses alpha-beta pruning and allows
@@ -254,14 +743,785 @@ def alphabeta_search(board, game, finish_by=None):
         for depth_limit in xrange(2, sys.maxint, 2):
 
             stats = utils.Struct(nodes=0, max_depth=0)
-            cutoff_fn = make_cutoff_fn(depth_limit, stats, finish_by, game)
+            cutoff_fn = make_cutoff_fn(depth_limit, stats, finish_by, game, clock)
             move = games.alphabeta_search(state, game, None, cutoff_fn, eval_fn)
 
-            # Return this move if we didn't get any deeper.
-            if stats.nodes <= 2:
+            # Return this move if no line got as deep as the limit,
+            # since the game ends before it in every line, or if
+            # there isn't time to get any deeper.
+            if stats.max_depth < depth_limit:
                 return game.move_to_return(move)
             else:
                 best_completed_move = game.move_to_return(move)
+            if not clock.completed(depth_limit, stats.nodes, move):
+                return best_completed_move
                 
     except TimeAlmostUp:
         return best_completed_move
+
+# Width of the null windows used to test moves in a principal variation
+# search. Scores are ratios of region sizes, so any two different ones
+# are much further apart than this.
+NULL_WINDOW = 1e-9
+
+# Half the width of the first aspiration window tried around the score
+# of the last iteration. It grows by this factor every time it fails.
+ASPIRATION = 0.1
+ASPIRATION_GROWTH = 4
+
+def inplace_alphabeta(state, game, cutoff_test, eval_fn, table=None, depth_limit=0,
+                      ordering=None):
+    "Search game to determine best action, making moves in place."
+    move, value = inplace_search(state, game, cutoff_test, eval_fn,
+                                 table, depth_limit, ordering)
+    return move
+
+def inplace_search(state, game, cutoff_test, eval_fn, table=None, depth_limit=0,
+                   ordering=None, alpha=-utils.infinity, beta=utils.infinity,
+                   pvs=False, root_moves=None):
+    "Search game within the window (alpha, beta), returning the best move and its value."
+
+    # This follows games.alphabeta_search, except that rather than
+    # building the successors of each node it makes each move on
+    # the one state, searches below it, and then takes it back.
+    # The best value so far is also passed along to the remaining
+    # moves at the root, which prunes more but picks the same move.
+
+    # Given a transposition table (and the depth limit the cutoff
+    # test uses), each node is looked up by its key first, and the
+    # stored value is used if it was searched deep enough to settle
+    # the node. Otherwise the stored best move is tried first. Every
+    # node searched, including the leaves, is then stored again. A
+    # node where no line below it got to the depth limit is stored as
+    # COMPLETE, and horizon counts the lines that did, either by
+    # getting there or by a stored value that wasn't complete.
+
+    # Given a move ordering, the moves at each node are sorted by it,
+    # it is told about every move that causes a cutoff, and at the end
+    # it gets the principal variation (the line of best moves for both
+    # players) to try first in the next iteration. The moves made to
+    # reach the current node are kept in path for it.
+
+    # With pvs, this becomes a principal variation search: only the
+    # first move at each node gets the whole window. The rest are just
+    # tested against the best value so far with a null window, and
+    # only searched again with the real window if the test shows one
+    # of them is better after all. Values outside the window given
+    # are only bounds on the real value, so if the best value at the
+    # root comes back at or outside the window, search again wider.
+
+    # Given root_moves, only those moves are searched at the root.
+
+    path = []
+    pv = {}
+    horizon = [0]
+
+    def children(entry):
+        "List the moves to try from the current node, best first."
+        moves = game.legal_moves(state)
+        hash_move = entry is not None and entry[4] or None
+        if ordering is not None:
+            return ordering.order(state, moves, path, hash_move)
+        if hash_move in moves:
+            moves.remove(hash_move)
+            moves.insert(0, hash_move)
+        return moves
+
+    def max_value(alpha, beta, depth):
+        leaf = cutoff_test(state, depth)
+        pv[depth] = []
+        entry = None
+        if table is not None:
+            key = state.key
+            draft = 0 if leaf else depth_limit - depth
+            entry, v = table.lookup(key, draft, alpha, beta)
+            if v is not None:
+                if entry[1] != tronsearch.COMPLETE:
+                    horizon[0] += 1
+                return v
+        if leaf:
+            v = eval_fn(state)
+            if depth < depth_limit:
+                draft = tronsearch.COMPLETE
+            else:
+                horizon[0] += 1
+            if table is not None:
+                table.store(key, draft, v, tronsearch.EXACT)
+            return v
+        reached = horizon[0]
+        v, best, alpha0 = -utils.infinity, None, alpha
+        for a in children(entry):
+            path.append(a)
+            game.do_move(a, state)
+            if pvs and best is not None:
+                u = min_value(alpha, alpha + NULL_WINDOW, depth+1)
+                if alpha < u < beta:
+                    u = min_value(alpha, beta, depth+1)
+            else:
+                u = min_value(alpha, beta, depth+1)
+            game.undo_move(state)
+            path.pop()
+            if u > v:
+                v, best = u, a
+                if v > alpha:
+                    pv[depth] = [a] + pv[depth+1]
+            if v >= beta:
+                if ordering is not None:
+                    ordering.cutoff(state, a, path, depth_limit - depth)
+                break
+            alpha = max(alpha, v)
+        if table is not None:
+            if horizon[0] == reached:
+                draft = tronsearch.COMPLETE
+            table.store(key, draft, v, tronsearch.bound(v, alpha0, beta), best)
+        return v
+
+    def min_value(alpha, beta, depth):
+        leaf = cutoff_test(state, depth)
+        pv[depth] = []
+        entry = None
+        if table is not None:
+            key = state.key
+            draft = 0 if leaf else depth_limit - depth
+            entry, v = table.lookup(key, draft, alpha, beta)
+            if v is not None:
+                if entry[1] != tronsearch.COMPLETE:
+                    horizon[0] += 1
+                return v
+        if leaf:
+            v = eval_fn(state)
+            if depth < depth_limit:
+                draft = tronsearch.COMPLETE
+            else:
+                horizon[0] += 1
+            if table is not None:
+                table.store(key, draft, v, tronsearch.EXACT)
+            return v
+        reached = horizon[0]
+        v, best, beta0 = utils.infinity, None, beta
+        for a in children(entry):
+            path.append(a)
+            game.do_move(a, state)
+            if pvs and best is not None:
+                u = max_value(beta - NULL_WINDOW, beta, depth+1)
+                if alpha < u < beta:
+                    u = max_value(alpha, beta, depth+1)
+            else:
+                u = max_value(alpha, beta, depth+1)
+            game.undo_move(state)
+            path.pop()
+            if u < v:
+                v, best = u, a
+                if v < beta:
+                    pv[depth] = [a] + pv[depth+1]
+            if v <= alpha:
+                if ordering is not None:
+                    ordering.cutoff(state, a, path, depth_limit - depth)
+                break
+            beta = min(beta, v)
+        if table is not None:
+            if horizon[0] == reached:
+                draft = tronsearch.COMPLETE
+            table.store(key, draft, v, tronsearch.bound(v, alpha, beta0), best)
+        return v
+
+    # The children of the root are at depth 0, so the root itself
+    # has one more ply below it than the depth limit.
+    entry = None
+    if table is not None:
+        entry = table.probe(state.key)
+    moves = children(entry)
+    if root_moves is not None:
+        moves = [a for a in moves if a in root_moves]
+    best_move, best_value, best_line = None, -utils.infinity, []
+    for a in moves:
+        path.append(a)
+        game.do_move(a, state)
+        floor = max(alpha, best_value)
+        if pvs and best_move is not None:
+            v = min_value(floor, floor + NULL_WINDOW, 0)
+            if floor < v < beta:
+                v = min_value(floor, beta, 0)
+        else:
+            v = min_value(floor, beta, 0)
+        game.undo_move(state)
+        path.pop()
+        if best_move is None or v > best_value:
+            best_move, best_value, best_line = a, v, [a] + pv[0]
+    if alpha < best_value < beta:
+        if table is not None:
+            table.store(state.key, depth_limit + 1, best_value,
+                        tronsearch.EXACT, best_move)
+        if ordering is not None:
+            ordering.pv = best_line
+    return best_move, best_value
+
+# Transpositions are kept from one turn to the next. Positions from
+# earlier turns are still correct, since the key covers every wall.
+transpositions = tronsearch.TranspositionTable()
+
+# The move ordering also learns from one turn to the next.
+move_ordering = tronsearch.MoveOrdering()
+
+def inplace_alphabeta_search(board, finish_by=None, table=None, ordering=None,
+                             pvs=False):
+    "Find a move based on an alpha-beta search that makes moves in place."
+
+    # Same iterative deepening as alphabeta_search, but the whole
+    # search runs on a single copy of the board, so no boards or
+    # states are allocated as it goes deeper. With pvs, each iteration
+    # is a principal variation search that starts with a narrow window
+    # around the value the last one found (see aspiration_search).
+    best_completed_move = board.moves()[0]
+    game = TronInPlaceGame()
+    state = InPlaceState(tronboard.compact(board).copy(), tron.ME)
+    state_eval_fn = lambda state: evaluate_board(state.board)
+    if table is None:
+        table = transpositions
+    if ordering is None:
+        ordering = move_ordering
+    table.new_search()
+    ordering.new_search(getattr(board, 'last_moves', None))
+    clock = TimeManager(finish_by)
+    value = None
+    
+    try:
+        for depth_limit in xrange(2, sys.maxint, 2):
+
+            stats = utils.Struct(nodes=0, max_depth=0)
+            cutoffs = table.open_cutoffs
+            cutoff_fn = make_cutoff_fn(depth_limit, stats, finish_by, game, clock)
+            if pvs:
+                move, value, searches = aspiration_search(
+                    state, game, cutoff_fn, state_eval_fn, table, depth_limit,
+                    ordering, value)
+            else:
+                move, value = inplace_search(state, game, cutoff_fn, state_eval_fn,
+                                             table, depth_limit, ordering)
+                searches = 1
+            ordering.nodes.append(stats.nodes)
+            logging.debug('depth %d: %d nodes (branching %0.2f), '
+                          'value %0.3f after %d searches, %s',
+                          depth_limit, stats.nodes, ordering.branching(),
+                          value, searches, table.report())
+
+            # Return this move if we didn't get any deeper, or if
+            # there isn't time to get any deeper. The table can settle
+            # nodes without going deeper, so it only counts if none of
+            # those it settled could have gone deeper.
+            if move is None:
+                return best_completed_move
+            best_completed_move = move
+            if stats.max_depth < depth_limit and table.open_cutoffs == cutoffs:
+                return move
+            if not clock.completed(depth_limit, stats.nodes, move):
+                return move
+
+    except TimeAlmostUp:
+        return best_completed_move
+
+def aspiration_search(state, game, cutoff_test, eval_fn, table, depth_limit,
+                      ordering=None, guess=None):
+    "Run a principal variation search in a window around guess, widening it as needed."
+
+    # Returns the best move, its value, and how many searches it took.
+    delta = ASPIRATION
+    if guess is None:
+        alpha, beta = -utils.infinity, utils.infinity
+    else:
+        alpha, beta = guess - delta, guess + delta
+    searches = 0
+    while True:
+        move, value = inplace_search(state, game, cutoff_test, eval_fn, table,
+                                     depth_limit, ordering, alpha, beta, True)
+        searches += 1
+        if move is None or alpha < value < beta:
+            return move, value, searches
+        delta *= ASPIRATION_GROWTH
+        if value <= alpha:
+            alpha = -utils.infinity
+            if delta < 2:
+                alpha = value - delta
+        else:
+            beta = utils.infinity
+            if delta < 2:
+                beta = value + delta
+
+#_____________________________________________________________________
+# Explicit Stack Search
+#
+
+def stack_alphabeta(board, depth_limit, stats=None, clock=None, forced=False):
+    "Search board like games.alphabeta_search, without recursion, returning (move, value)."
+
+    # The same search as alphabeta_search runs with TronGame, node for
+    # node, but made for Tron instead of for any game. There is one
+    # frame per ply, in parallel lists made before the search starts:
+    # the tile the player to move is on, how far through its moves
+    # the search is, the window and best value so far, and the move
+    # made. Ply 0 is the root, where I move, and the plies go on
+    # taking turns, so at every odd ply my move is waiting in the
+    # frame above until theirs is made, and then both are made on
+    # board. Each move is only looked for when the one before it is
+    # done with, so a cutoff never even gets to the rest. Like the
+    # AIMA search, every move at the root gets the whole window, and
+    # the depth of a node is its ply less one, with the cut off at
+    # depth_limit, at the end of the game, or once it's settled.
+
+    # With forced, a move that is the only one the player has doesn't
+    # count towards the depth, and whole turns where both players have
+    # only one move are made on the spot, with no frames for them, so
+    # the search goes through corridors for free and the horizon is at
+    # the next real choice. Then stats.reached is how deep the search
+    # really got, counting every move made.
+    geometry = board.geometry
+    moves = geometry.moves
+    cells = board.cells
+    floor = tronboard.FLOOR
+    evaluate = evaluate_board
+    tick = clock and clock.tick or (lambda: None)
+    size = depth_limit + 2 + (forced and board.floor_count or 0)
+    tiles = [None] * size
+    index = [0] * size
+    alpha = [0.0] * size
+    beta = [0.0] * size
+    value = [0.0] * size
+    made = [None] * size
+    depth = [0] * size
+    step = [1] * size
+    turns = [0] * size
+    nodes = max_depth = reached = skipped = 0
+    best_move = None
+
+    tiles[0] = moves[board.p1]
+    index[0] = 0
+    alpha[0], beta[0] = -utils.infinity, utils.infinity
+    value[0] = -utils.infinity
+    depth[0] = -1
+    if forced and len(geometry.floor_moves(cells, board.p1)) == 1:
+        step[0] = 0
+    ply = 0
+    while True:
+
+        # Make the next move at this ply, if there is one left.
+        ways = tiles[ply]
+        k = index[ply]
+        while k < len(ways) and cells[ways[k][0]] != floor:
+            k += 1
+        if k < len(ways):
+            index[ply] = k + 1
+            d = made[ply] = ways[k][1]
+            if ply & 1:
+                board.do_move(tron.ME, made[ply-1])
+                board.do_move(tron.THEM, d)
+            ply += 1
+            tick()
+            nodes += 1
+            depth[ply] = depth[ply-1] + step[ply-1]
+            if depth[ply] > max_depth:
+                max_depth = depth[ply]
+
+            # Find the moves both players have from the node, going on
+            # through any forced turns first.
+            p1, p2 = board.p1, board.p2
+            mine = p1 >= 0 and [e for j, e in moves[p1] if cells[j] == floor] or []
+            theirs = p2 >= 0 and [e for j, e in moves[p2] if cells[j] == floor] or []
+            turns[ply] = 0
+            if forced and not ply & 1:
+                while len(mine) == 1 and len(theirs) == 1:
+                    board.do_move(tron.ME, mine[0])
+                    board.do_move(tron.THEM, theirs[0])
+                    turns[ply] += 1
+                    p1, p2 = board.p1, board.p2
+                    mine = p1 >= 0 and [e for j, e in moves[p1] if cells[j] == floor] or []
+                    theirs = p2 >= 0 and [e for j, e in moves[p2] if cells[j] == floor] or []
+                skipped += 2 * turns[ply]
+            if ply - 1 + skipped > reached:
+                reached = ply - 1 + skipped
+
+            # Then either evaluate the node, or go on into it with the
+            # window from the one above.
+            if (depth[ply] >= depth_limit or not mine or not theirs or
+                (not ply & 1 and settle(board))):
+                u = evaluate(board)
+            else:
+                if ply & 1:
+                    tiles[ply] = moves[p2]
+                    value[ply] = utils.infinity
+                    step[ply] = (forced and len(theirs) == 1) and 0 or 1
+                else:
+                    tiles[ply] = moves[p1]
+                    value[ply] = -utils.infinity
+                    step[ply] = (forced and len(mine) == 1) and 0 or 1
+                index[ply] = 0
+                alpha[ply], beta[ply] = alpha[ply-1], beta[ply-1]
+                continue
+
+        # Otherwise this node is done with, so its value goes back up.
+        elif ply == 0:
+            break
+        else:
+            u = value[ply]
+
+        # Take back the move that led to the node, and any forced turns
+        # after it, and see whether its value is better for the player
+        # that made it, or is enough to show that the other player
+        # won't let it get this far.
+        for i in xrange(2 * turns[ply]):
+            board.undo_move()
+        skipped -= 2 * turns[ply]
+        ply -= 1
+        if ply & 1:
+            board.undo_move()
+            board.undo_move()
+            if u < value[ply]:
+                value[ply] = u
+            if value[ply] <= alpha[ply]:
+                index[ply] = len(tiles[ply])
+            elif value[ply] < beta[ply]:
+                beta[ply] = value[ply]
+        else:
+            if u > value[ply]:
+                value[ply] = u
+                if ply == 0:
+                    best_move = made[0]
+            if ply == 0:
+                continue
+            if value[ply] >= beta[ply]:
+                index[ply] = len(tiles[ply])
+            elif value[ply] > alpha[ply]:
+                alpha[ply] = value[ply]
+
+    if stats is not None:
+        stats.nodes += nodes
+        stats.max_depth = max(stats.max_depth, max_depth)
+        stats.reached = max(getattr(stats, 'reached', 0), reached)
+    return best_move, value[0]
+
+def stack_alphabeta_search(board, finish_by=None, forced=True):
+    "Find a move by iteratively deepening the explicit stack search."
+
+    # Deepens just like alphabeta_search does, on a copy of the board,
+    # since a search stopped for time leaves its moves made on it.
+    # Forced moves are passed through for free unless told otherwise.
+    best_completed_move = board.moves()[0]
+    clock = TimeManager(finish_by)
+    try:
+        for depth_limit in xrange(2, sys.maxint, 2):
+            stats = utils.Struct(nodes=0, max_depth=0, reached=0)
+            copy = tronboard.compact(board).copy()
+            move, value = stack_alphabeta(copy, depth_limit, stats, clock, forced)
+            logging.debug('depth %d: %d nodes, reached %d, value %0.3f',
+                          depth_limit, stats.nodes, stats.reached, value)
+            if move is None:
+                return best_completed_move
+            if stats.max_depth < depth_limit:
+                return move
+            best_completed_move = move
+            if not clock.completed(depth_limit, stats.nodes, move):
+                return best_completed_move
+    except TimeAlmostUp:
+        return best_completed_move
+
+#_____________________________________________________________________
+# Parallel Search
+#
+
+# The most worker processes to start. There are never more than
+# four moves at the root to split between them.
+MAX_WORKERS = 4
+
+# The workers, once they have been started by start_workers.
+workers = None
+
+class Workers():
+    "A set of worker processes that search the root moves in parallel."
+
+    # Each worker has its own queue of jobs, and they all share one
+    # queue for results. A job is the board for a turn and the root
+    # moves the worker is to search, which it deepens one after the
+    # other until the deadline, reporting the value of each move at
+    # each depth as it goes. The best value found at each depth is
+    # kept in a shared array of bounds, so the other workers search
+    # their moves against it and give up on them as soon as they
+    # can't beat it. Workers keep their own transposition tables and
+    # move ordering from turn to turn, so they are started just once.
+
+    # Every job and result carries the number of the turn, which is
+    # also kept in bounds[0], so that anything a worker was still
+    # doing for the last turn when the deadline passed is ignored.
+
+    def __init__(self, count=None):
+        if count is None:
+            count = min(multiprocessing.cpu_count(), MAX_WORKERS)
+        self.count = max(1, count)
+        self.turn = 0
+        self.results = multiprocessing.Queue()
+        self.bounds = multiprocessing.Array('d', 256)
+        self.jobs = []
+        self.processes = []
+        for i in xrange(self.count):
+            jobs = multiprocessing.Queue()
+            p = multiprocessing.Process(target=parallel_worker,
+                                        args=(jobs, self.results, self.bounds))
+            p.daemon = True
+            p.start()
+            self.jobs.append(jobs)
+            self.processes.append(p)
+
+    def stop(self):
+        "Tell every worker to exit, and wait for them to do so."
+        for jobs in self.jobs:
+            jobs.put(None)
+        for p in self.processes:
+            p.join()
+
+    def search(self, board, moves, finish_by):
+        "Search moves on board in the workers, and collect what they find by finish_by."
+
+        # Returns a dict of each move to a list of its results, and
+        # the total node count. See best_parallel_result.
+        self.turn += 1
+        with self.bounds.get_lock():
+            self.bounds[0] = self.turn
+            for i in xrange(1, len(self.bounds)):
+                self.bounds[i] = -utils.infinity
+        cells = str(board.cells)
+        busy = min(self.count, len(moves))
+        for i in xrange(busy):
+            self.jobs[i].put((self.turn, board.width, board.height, cells,
+                              moves[i::busy], finish_by))
+        found = dict((m, []) for m in moves)
+        nodes = 0
+        while busy:
+            timeout = None
+            if finish_by:
+                timeout = max(finish_by - time.time(), 0.0)
+            try:
+                result = self.results.get(True, timeout)
+            except Queue.Empty:
+                break # the workers will see the deadline has passed
+            turn, move, n = result[:3]
+            if turn != self.turn:
+                continue # left over from the last turn
+            nodes += n
+            if move is None:
+                busy -= 1 # the worker is done with the turn
+            else:
+                found[move].append(result[3:])
+        return found, nodes
+
+def parallel_worker(jobs, results, bounds):
+    "Run searches for the jobs given to a worker process, until told to stop."
+
+    # Results are (turn, move, nodes, depth, value, exact, final),
+    # where exact is whether the value is more than a bound, and
+    # final is whether the search of the move could go no deeper.
+    # A result with no move says the worker is done with the turn.
+    game = TronInPlaceGame()
+    table = tronsearch.TranspositionTable()
+    ordering = tronsearch.MoveOrdering()
+    eval_fn = lambda state: evaluate_board(state.board)
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        turn, width, height, cells, moves, finish_by = job
+        board = tronboard.CompactBoard(width, height, bytearray(cells))
+        state = InPlaceState(board, tron.ME)
+        clock = TimeManager(finish_by)
+        eval_cache.new_turn(board.floor_count)
+        table.new_search()
+        ordering.new_search()
+        remaining = list(moves)
+        try:
+            for depth_limit in xrange(2, len(bounds), 2):
+                nodes = 0
+                for move in list(remaining):
+                    stats = utils.Struct(nodes=0, max_depth=0)
+                    cutoff_fn = make_cutoff_fn(depth_limit, stats, finish_by,
+                                               game, clock)
+                    cutoffs = table.open_cutoffs
+                    alpha = bounds[depth_limit]
+                    m, value = inplace_search(state, game, cutoff_fn, eval_fn,
+                                              table, depth_limit, ordering,
+                                              alpha, root_moves=[move])
+                    exact = value > alpha
+                    final = (stats.max_depth < depth_limit and
+                             table.open_cutoffs == cutoffs)
+                    with bounds.get_lock():
+                        if exact and bounds[0] == turn:
+                            bounds[depth_limit] = max(bounds[depth_limit], value)
+                    results.put((turn, move, stats.nodes, depth_limit, value,
+                                 exact, final))
+                    nodes += stats.nodes
+                    if final:
+                        remaining.remove(move)
+                if not remaining or not clock.completed(depth_limit, nodes):
+                    break
+        except TimeAlmostUp:
+            pass # the board is made again for the next job anyway
+        results.put((turn, None, 0))
+
+def start_workers(count=None):
+    "Start the worker processes for the parallel search, if not already started."
+    global workers
+    if workers is None:
+        workers = Workers(count)
+    return workers
+
+def stop_workers():
+    "Stop the worker processes for the parallel search, if they were started."
+    global workers
+    if workers is not None:
+        workers.stop()
+        workers = None
+
+def best_parallel_result(found):
+    "Pick the best move from the deepest depth every move was searched to."
+
+    # The results for each move are (depth, value, exact, final). A
+    # move whose search was final keeps its last value at every depth
+    # after that. An exact value wins a tie with one that is a bound.
+    # Returns the move, the depth and its value, or None.
+    best = None
+    depths = sorted(set(r[0] for results in found.values() for r in results))
+    for depth in depths:
+        values = {}
+        for move, results in found.iteritems():
+            known = [r for r in results if r[0] == depth or (r[3] and r[0] < depth)]
+            if not known:
+                break
+            values[move] = known[0][1:3]
+        else:
+            move = max(values, key=lambda m: values[m])
+            best = move, depth, values[move][0]
+    return best
+
+def parallel_search(board, finish_by=None):
+    "Find a move by searching the root moves in parallel worker processes."
+    board = tronboard.compact(board)
+    moves = [d for b, d in board.geometry.floor_moves(board.cells, board.p1)]
+    if len(moves) <= 1:
+        return board.moves()[0]
+    found, nodes = start_workers().search(board, moves, finish_by)
+    best = best_parallel_result(found)
+    logging.debug('parallel: %d nodes, best %s', nodes, best)
+    if best is None:
+        return moves[0]
+    return best[0]
+
+#_____________________________________________________________________
+# Pondering
+#
+
+class Ponderer():
+    "Searches in a background thread while the bot waits for the next board."
+
+    # Once my move has been sent, the only thing not known about the
+    # next board is which way they went. So for each move they could
+    # make, the ponder thread sets up the board that would follow,
+    # and deepens a search of each of those in turn until it is told
+    # to stop. The searches store everything they find in the same
+    # transposition table and move ordering that the in-place and
+    # principal variation searches use, and the best move and line
+    # found for each of their moves is kept in results.
+
+    # When the next board does arrive, seed finds the results for the
+    # moves that were actually made and puts that line first in the
+    # move ordering, so that the real search starts by following it
+    # and finds most of the positions it needs already in the table.
+    # The move ordering is moved along to the next turn as pondering
+    # starts, so what pondering adds to it is kept as it is.
+
+    # Reading the next board from stdin lets go of the interpreter,
+    # so the ponder thread gets to run all the time the bot waits.
+
+    def __init__(self, table=None, ordering=None):
+        self.table = table or transpositions
+        self.ordering = ordering or move_ordering
+        self.thread = None
+        self.stopping = threading.Event()
+        self.move = None
+        self.results = {}
+
+    def start(self, board, move):
+        "Start pondering the boards that could follow my move on board."
+        self.stop()
+        board = tronboard.compact(board)
+        self.move = move
+        self.results = {}
+        if not board.connected():
+            return # their moves make no difference to mine
+        boards = {}
+        target = board.p1 + board.offsets[move]
+        for b, reply in board.geometry.floor_moves(board.cells, board.p2):
+            if b != target: # we'd collide, and the game would be over
+                next = board.copy()
+                next.do_move(tron.ME, move)
+                next.do_move(tron.THEM, reply)
+                boards[reply] = next
+        if boards:
+            self.ordering.seed()
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self.run, args=(boards,))
+            self.thread.daemon = True
+            self.thread.start()
+
+    def stop(self):
+        "Stop pondering, and wait for the thread to finish."
+        if self.thread is not None:
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+
+    def run(self, boards):
+        "Deepen searches of all the boards, one depth at a time, until stopped."
+        game = TronInPlaceGame()
+        clock = TimeManager(stop=self.stopping)
+        eval_fn = lambda state: evaluate_board(state.board)
+        states = dict((r, InPlaceState(b, tron.ME)) for r, b in boards.iteritems())
+        lines = dict((r, []) for r in boards)
+        self.table.new_search()
+        try:
+            for depth_limit in xrange(2, sys.maxint, 2):
+                deeper = False
+                for reply, state in states.iteritems():
+                    stats = utils.Struct(nodes=0, max_depth=0)
+                    cutoffs = self.table.open_cutoffs
+                    cutoff_fn = make_cutoff_fn(depth_limit, stats, None, game, clock)
+                    self.ordering.pv = lines[reply]
+                    move, value = inplace_search(state, game, cutoff_fn, eval_fn,
+                                                 self.table, depth_limit,
+                                                 self.ordering)
+                    if move is None:
+                        continue
+                    lines[reply] = self.ordering.pv
+                    self.results[reply] = (move, depth_limit, list(self.ordering.pv))
+                    if (stats.max_depth >= depth_limit or
+                        self.table.open_cutoffs != cutoffs):
+                        deeper = True
+                if not deeper:
+                    return # every line of every board ends before this depth
+        except TimeAlmostUp:
+            pass
+
+    def seed(self, board):
+        "Seed the search of board with the ponder results for how we got here."
+
+        # Pondering moved the ordering along to this turn when it
+        # started, so its killers and history are already for plies
+        # counted from this board, and the search keeps them as they
+        # are. Without a line for this board, the search starts with
+        # no pv. Returns the move pondering found, or None if nothing
+        # was found for this board.
+        result = None
+        if board.last_moves and board.last_moves[0] == self.move:
+            result = self.results.get(board.last_moves[1])
+        if result is None:
+            self.ordering.seed()
+            return None
+        move, depth, line = result
+        self.ordering.seed(line)
+        logging.debug('ponder hit: %s at depth %d', move, depth)
+        return move
@@ -0,0 +1,415 @@
+#!/usr/bin/python
+# benchmark: Measures the speed of parts of my TronBot.
+# Copyright (C) 2010 Corey Abshire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# The purpose of this script is to compare alternative versions
+# of the routines the bot spends its time in, so that a change
+# meant to make the bot faster comes with numbers that show it.
+#
+#   python benchmark.py [--map maps/huge-room.txt] [name ...]
+#
+# Some benchmarks also take a directory, such as --map maps/.
+
+import os, sys, time, tempfile, optparse
+import games, utils, tron, tronio, tronutils, tronboard, tronsearch, bitboard, tronarrays, aimatron
+import simsearch, mcts
+
+argp = optparse.OptionParser(usage="usage: %prog [options] [benchmark ...]")
+argp.add_option("--map", default="maps/huge-room.txt")
+argp.add_option("--depth", type="int", default=4)
+argp.add_option("--time", type="float", default=0.1)
+
+def repeated(n, fn, *args):
+    "Call fn with args n times, and return n."
+    for i in xrange(n):
+        fn(*args)
+    return n
+
+def timed(fn, *args):
+    "Call fn with args and return its result along with the elapsed time."
+    start = time.time()
+    result = fn(*args)
+    return result, time.time() - start
+
+def report(name, count, elapsed, unit='nodes'):
+    "Print a line with the throughput of one benchmark run."
+    rate = count / max(elapsed, 1e-9)
+    print '  %-24s %8d %s in %7.3fs = %10.1f %s/s' % \
+        (name, count, unit, elapsed, rate, unit)
+    return rate
+
+def flat_eval_fn(state):
+    "Evaluation that costs nothing, to time just walking the tree."
+    return 0.0
+
+def aima_search_nodes(board, depth, eval_fn=aimatron.eval_fn):
+    "Run a fixed depth AIMA alpha-beta search and count its nodes."
+    game = aimatron.TronGame()
+    state = aimatron.TronState(board, tron.ME)
+    stats = utils.Struct(nodes=0, max_depth=0)
+    cutoff_fn = aimatron.make_cutoff_fn(depth, stats, None, game)
+    games.alphabeta_search(state, game, None, cutoff_fn, eval_fn)
+    return stats.nodes
+
+def inplace_search_nodes(board, depth, eval_fn=aimatron.eval_fn):
+    "Run a fixed depth in-place alpha-beta search and count its nodes."
+    game = aimatron.TronInPlaceGame()
+    state = aimatron.InPlaceState(tronboard.compact(board).copy(), tron.ME)
+    stats = utils.Struct(nodes=0, max_depth=0)
+    cutoff_fn = aimatron.make_cutoff_fn(depth, stats, None, game)
+    state_eval_fn = lambda state: eval_fn(utils.Struct(board=state.board,
+                                                       score_cache=None))
+    aimatron.inplace_alphabeta(state, game, cutoff_fn, state_eval_fn)
+    return stats.nodes
+
+def deepening_nodes(board, depth, table=None, ordering=None, pvs=False):
+    "Run the in-place search deepening up to depth and count all its nodes."
+    game = aimatron.TronInPlaceGame()
+    state = aimatron.InPlaceState(tronboard.compact(board).copy(), tron.ME)
+    eval_fn = lambda state: aimatron.evaluate(state.board)
+    nodes = 0
+    value = None
+    if table:
+        table.new_search()
+    if ordering:
+        ordering.new_search()
+    for depth_limit in xrange(2, depth + 1, 2):
+        stats = utils.Struct(nodes=0, max_depth=0)
+        cutoff_fn = aimatron.make_cutoff_fn(depth_limit, stats, None, game)
+        if pvs:
+            move, value, searches = aimatron.aspiration_search(
+                state, game, cutoff_fn, eval_fn, table, depth_limit,
+                ordering, value)
+        else:
+            aimatron.inplace_alphabeta(state, game, cutoff_fn, eval_fn,
+                                       table, depth_limit, ordering)
+        if ordering:
+            ordering.nodes.append(stats.nodes)
+        nodes += stats.nodes
+    return nodes
+
+def deepening_depth(board, seconds, evaluation=aimatron.evaluate):
+    "Deepen the in-place search for a number of seconds and return the depth it completed."
+    game = aimatron.TronInPlaceGame()
+    state = aimatron.InPlaceState(tronboard.compact(board).copy(), tron.ME)
+    eval_fn = lambda state: evaluation(state.board)
+    clock = tronsearch.TimeManager(time.time() + seconds)
+    depth = 0
+    try:
+        for depth_limit in xrange(2, sys.maxint, 2):
+            stats = utils.Struct(nodes=0, max_depth=0)
+            cutoff_fn = aimatron.make_cutoff_fn(depth_limit, stats, None, game, clock)
+            aimatron.inplace_alphabeta(state, game, cutoff_fn, eval_fn)
+            depth = depth_limit
+            if stats.max_depth < depth_limit:
+                break # the game is over in every line
+    except tronsearch.TimeAlmostUp:
+        pass
+    return depth
+
+def map_files(config):
+    "List the maps to run on: the --map file, or every map in a --map directory."
+    if os.path.isdir(config.map):
+        return tronutils.list_files(config.map)
+    return [config.map]
+
+#_____________________________________________________________________
+# Benchmarks
+#
+
+def bench_board(config):
+    "Node throughput of the AIMA search on tron.Board vs CompactBoard."
+    board = tronutils.read_board(config.map)
+    for label, eval_fn in (('eval_fn', aimatron.eval_fn),
+                           ('tree walk only', flat_eval_fn)):
+        print ' %s:' % label
+        nodes, elapsed = timed(aima_search_nodes, board,
+                               config.depth, eval_fn)
+        before = report('tron.Board', nodes, elapsed)
+        nodes, elapsed = timed(aima_search_nodes, tronboard.compact(board),
+                               config.depth, eval_fn)
+        after = report('CompactBoard', nodes, elapsed)
+        print '  speedup: %0.2fx' % (after / before)
+
+def bench_inplace(config):
+    "Node throughput of copying boards vs making moves in place."
+    board = tronboard.compact(tronutils.read_board(config.map))
+    for label, eval_fn in (('eval_fn', aimatron.eval_fn),
+                           ('tree walk only', flat_eval_fn)):
+        print ' %s:' % label
+        nodes, elapsed = timed(aima_search_nodes, board,
+                               config.depth, eval_fn)
+        before = report('apply_move', nodes, elapsed)
+        nodes, elapsed = timed(inplace_search_nodes, board,
+                               config.depth, eval_fn)
+        after = report('do_move/undo_move', nodes, elapsed)
+        print '  speedup: %0.2fx' % (after / before)
+
+def bench_fill(config):
+    "Flood fill throughput of the neighbor tables vs the bitboards."
+    board = tronboard.compact(tronutils.read_board(config.map))
+    me = board.me()
+    for name, module in (('tronutils', tronutils), ('bitboard', bitboard)):
+        print ' %s:' % name
+        calls, elapsed = timed(repeated, 200, module.count_around, board, me)
+        report('count_around', calls, elapsed, 'calls')
+        calls, elapsed = timed(repeated, 200, module.dfs_count_around, board)
+        report('dfs_count_around', calls, elapsed, 'calls')
+
+def bench_arrays(config):
+    "Distance map throughput of the tronutils dicts vs the NumPy arrays."
+    board = tronboard.compact(tronutils.read_board(config.map))
+    me, them = board.me(), board.them()
+    calls, elapsed = timed(repeated, 50, tronutils.same_distance,
+                           board, me, them)
+    report('tronutils.same_distance', calls, elapsed, 'calls')
+    if not tronarrays.numpy:
+        print '  numpy is not installed'
+        return
+    calls, elapsed = timed(repeated, 50, tronarrays.same_distance,
+                           board, me, them)
+    report('tronarrays.same_distance', calls, elapsed, 'calls')
+    calls, elapsed = timed(repeated, 50, tronarrays.territory, board)
+    report('tronarrays.territory', calls, elapsed, 'calls')
+
+def bench_tt(config):
+    "Iterative deepening with and without a transposition table."
+    board = tronutils.read_board(config.map)
+    nodes, before = timed(deepening_nodes, board, config.depth)
+    report('no table', nodes, before)
+    table = tronsearch.TranspositionTable()
+    nodes, after = timed(deepening_nodes, board, config.depth, table)
+    report('transposition table', nodes, after)
+    print '  %s' % table.report()
+    print '  time to depth %d: %0.2fx faster' % (config.depth, before / after)
+
+def bench_ordering(config):
+    "Nodes to reach a depth with the table alone vs the table plus move ordering."
+    totals = [0, 0]
+    for m in map_files(config):
+        board = tronutils.read_board(m)
+        before = deepening_nodes(board, config.depth,
+                                 tronsearch.TranspositionTable())
+        ordering = tronsearch.MoveOrdering()
+        after = deepening_nodes(board, config.depth,
+                                tronsearch.TranspositionTable(), ordering)
+        print '  %-28s %8d -> %8d nodes (branching %0.2f, per depth %s)' % \
+            (os.path.basename(m), before, after, ordering.branching(),
+             ordering.nodes)
+        totals[0] += before
+        totals[1] += after
+    print '  total %d -> %d nodes (%0.1f%% fewer)' % \
+        (totals[0], totals[1], 100.0 - 100.0 * totals[1] / max(totals[0], 1))
+
+def bench_pvs(config):
+    "Nodes to reach a depth with alpha-beta vs principal variation search."
+    totals = [0, 0, 0]
+    for m in map_files(config):
+        board = tronutils.read_board(m)
+        counts = [deepening_nodes(board, config.depth),
+                  deepening_nodes(board, config.depth,
+                                  tronsearch.TranspositionTable(),
+                                  tronsearch.MoveOrdering()),
+                  deepening_nodes(board, config.depth,
+                                  tronsearch.TranspositionTable(),
+                                  tronsearch.MoveOrdering(), True)]
+        print '  %-28s %8d %8d %8d' % tuple([os.path.basename(m)] + counts)
+        totals = [t + c for t, c in zip(totals, counts)]
+    print '  %-28s %8d %8d %8d nodes (alphabeta, +table/ordering, pvs)' % \
+        tuple(['total'] + totals)
+
+def bench_stack(config):
+    "Node throughput of the AIMA search vs the explicit stack search, over every map."
+    totals = [0, 0.0, 0, 0.0]
+    for m in tronutils.list_files('maps/') + tronutils.list_files('cases/'):
+        board = tronboard.compact(tronutils.read_board(m))
+        if not board.moves() or not board.connected():
+            continue
+        aimatron.eval_cache.clear()
+        nodes, elapsed = timed(aima_search_nodes, board.copy(), config.depth)
+        stats = utils.Struct(nodes=0, max_depth=0)
+        aimatron.eval_cache.clear()
+        result, seconds = timed(aimatron.stack_alphabeta, board.copy(),
+                                config.depth, stats)
+        totals = [t + c for t, c in zip(totals, [nodes, elapsed, stats.nodes, seconds])]
+    report('alphabeta_search', totals[0], totals[1])
+    report('stack_alphabeta', totals[2], totals[3])
+    print '  speedup: %0.2fx' % (totals[1] / totals[3])
+
+def stack_deepening(board, seconds, forced):
+    "Deepen the stack search for a number of seconds, returning the depth limit and depth reached."
+    clock = tronsearch.TimeManager(time.time() + seconds)
+    aimatron.eval_cache.clear()
+    completed = (0, 0)
+    try:
+        for depth_limit in xrange(2, sys.maxint, 2):
+            stats = utils.Struct(nodes=0, max_depth=0, reached=0)
+            aimatron.stack_alphabeta(board.copy(), depth_limit, stats, clock, forced)
+            completed = (depth_limit, stats.reached)
+            if stats.max_depth < depth_limit:
+                break # the game is over in every line
+    except tronsearch.TimeAlmostUp:
+        pass
+    return completed
+
+def hug_walls(board, turns):
+    "Move both players to the tile with the fewest ways on, for a number of turns."
+    g = board.geometry
+    for turn in xrange(turns):
+        for player, i in ((tron.ME, board.p1), (tron.THEM, board.p2)):
+            exits = lambda (j, d): len(g.floor_moves(board.cells, j))
+            board.do_move(player, min(g.floor_moves(board.cells, i), key=exits)[1])
+
+def bench_corridors(config):
+    "Depth the stack search completes in --time, with and without passing through forced moves."
+    print '  %-28s %8s %8s %8s %8s' % ('', 'limit', 'reached', 'forced', 'reached')
+    for m in ('maps/u.txt', 'maps/keyhole.txt', 'maps/trix.txt'):
+        board = tronboard.compact(tronutils.read_board(m))
+        # Then again after both players have followed the walls for a
+        # while, which is when the corridors start to show up.
+        for turns in (0, 10):
+            position = board.copy()
+            hug_walls(position, turns)
+            depths = stack_deepening(position, config.time, False) + \
+                stack_deepening(position, config.time, True)
+            print '  %-28s %8d %8d %8d %8d' % (('%s+%d' % (m, turns),) + depths)
+
+def bench_simultaneous(config):
+    "Time to search the same depth taking turns vs with joint moves."
+    board = tronboard.compact(tronutils.read_board(config.map))
+    nodes, before = timed(inplace_search_nodes, board, config.depth,
+                          aimatron.eval_fn)
+    report('half-ply turns', nodes, before)
+    stats = utils.Struct(nodes=0, max_depth=0)
+    result, after = timed(simsearch.joint_alphabeta, board.copy(),
+                          config.depth / 2, aimatron.evaluate, stats)
+    report('joint moves', stats.nodes, after)
+    print '  speedup: %0.2fx' % (before / after)
+
+def bench_voronoi(config):
+    "Evaluations per second and depth reached in --time with each evaluation."
+    names = sorted(aimatron.evaluations)
+    files = tronutils.list_files('maps/') + tronutils.list_files('cases/')
+    calls, elapsed, depths = {}, {}, {}
+    print '  %-28s %s' % ('depth reached', ' '.join('%8s' % n for n in names))
+    for m in files:
+        board = tronboard.compact(tronutils.read_board(m))
+        if not board.moves() or not board.connected():
+            continue
+        line = []
+        for name in names:
+            evaluation = aimatron.evaluations[name]
+            n, seconds = timed(repeated, 20, evaluation, board)
+            calls[name] = calls.get(name, 0) + n
+            elapsed[name] = elapsed.get(name, 0.0) + seconds
+            depth = deepening_depth(board, config.time, evaluation)
+            depths[name] = depths.get(name, 0) + depth
+            line.append(depth)
+        print '  %-28s %s' % (m, ' '.join('%8d' % d for d in line))
+    for name in names:
+        report(name, calls[name], elapsed[name], 'evals')
+    print '  %-28s %s' % ('total depth', ' '.join('%8d' % depths[n] for n in names))
+
+def joint_deepening_nodes(board, depth, batch):
+    "Deepen the joint move search to depth turns, returning the nodes searched."
+    aimatron.eval_cache.clear()
+    nodes = 0
+    for depth_limit in xrange(1, depth + 1):
+        stats = utils.Struct(nodes=0, max_depth=0)
+        simsearch.joint_alphabeta(board.copy(), depth_limit, None, stats,
+                                  None, None, batch)
+        nodes += stats.nodes
+    return nodes
+
+def bench_batch(config):
+    "Time to deepen --depth turns, evaluating horizon leaves one at a time vs in batches."
+    boards = []
+    for m in tronutils.list_files('maps/') + tronutils.list_files('cases/'):
+        board = tronboard.compact(tronutils.read_board(m))
+        if board.moves() and board.connected():
+            boards.append(board)
+    for name in ('regions', 'voronoi'):
+        aimatron.use_evaluation(name)
+        for batch in (False, True):
+            nodes, elapsed = 0, 0.0
+            for board in boards:
+                n, seconds = timed(joint_deepening_nodes, board, config.depth / 2, batch)
+                nodes += n
+                elapsed += seconds
+            report('%s%s' % (name, batch and ' batched' or ''), nodes, elapsed)
+    aimatron.use_evaluation('regions')
+
+def bench_mcts(config):
+    "Monte Carlo playouts per second in --time on each map."
+    files = tronutils.list_files('maps/') + tronutils.list_files('cases/')
+    total, elapsed = 0, 0.0
+    for m in files:
+        board = tronboard.compact(tronutils.read_board(m))
+        if not board.moves() or not board.connected():
+            continue
+        stats = utils.Struct(playouts=0, turns=0)
+        start = time.time()
+        mcts.mcts_search(board, start + config.time, None, None, stats)
+        seconds = time.time() - start
+        report(m, stats.playouts, seconds, 'playouts')
+        total += stats.playouts
+        elapsed += seconds
+    report('total', total, elapsed, 'playouts')
+
+def count_frames(frames):
+    "Pull every board out of a frame generator and count them."
+    return sum(1 for board in frames)
+
+def bench_reader(config):
+    "Frame parsing throughput of tron.Board.generate vs tronio.generate."
+    board = tronutils.read_board(config.map)
+    tronboard.geometry(board.width, board.height) # built once per game
+    frames = tempfile.TemporaryFile()
+    frames.write(open(config.map).read() * 200)
+    stdin = os.dup(0)
+    try:
+        frames.seek(0)
+        os.dup2(frames.fileno(), 0) # the starter package only reads stdin
+        count, elapsed = timed(count_frames, tron.Board.generate())
+        report('tron.Board.generate', count, elapsed, 'frames')
+        frames.seek(0)
+        count, elapsed = timed(count_frames, tronio.generate(frames.fileno()))
+        report('tronio.generate', count, elapsed, 'frames')
+    finally:
+        os.dup2(stdin, 0)
+        os.close(stdin)
+        frames.close()
+
+benchmarks = { 'arrays': bench_arrays,
+               'batch': bench_batch,
+               'board': bench_board,
+               'corridors': bench_corridors,
+               'fill': bench_fill,
+               'inplace': bench_inplace,
+               'mcts': bench_mcts,
+               'ordering': bench_ordering,
+               'pvs': bench_pvs,
+               'reader': bench_reader,
+               'simultaneous': bench_simultaneous,
+               'stack': bench_stack,
+               'tt': bench_tt,
+               'voronoi': bench_voronoi }
+
+if __name__ == '__main__':
+    config, args = argp.parse_args()
+    for name in args or sorted(benchmarks):
+        print '%s (%s, depth %d)' % (name, config.map, config.depth)
+        benchmarks[name](config)
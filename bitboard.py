@@ -0,0 +1,187 @@
+# bitboard: Bitboard flood fills for a TronBot.
+# Copyright (C) 2010 Corey Abshire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import tron, tronboard
+from tronutils import touching
+
+#_____________________________________________________________________
+# Constants and Enumerations
+#
+
+# Translation table that turns floor tiles into '1' and the rest to '0'.
+FLOOR_BITS = ''.join(chr(c) == tron.FLOOR and '1' or '0' for c in xrange(256))
+
+#_____________________________________________________________________
+# Bitboard
+#
+
+def popcount(bits):
+    "Count the tiles in a set of tiles."
+    return bin(bits).count('1')
+
+def lowest(bits):
+    "Return the lowest tile in a non-empty set of tiles."
+    return bits & -bits
+
+class BitBoard():
+    "The floor of a Tron board as the bits of one arbitrary-precision int."
+
+    # Tile (y, x) is bit y * stride + x, where the stride is one more
+    # than the width. The extra padding column is never floor, so a
+    # set of tiles shifted one bit east or west cannot wrap around
+    # into the next row, and shifting by a whole stride moves it one
+    # row north or south. Then each step of a flood fill is just a
+    # handful of whole-board shifts and masks, instead of a loop over
+    # every tile on the edge of the fill.
+
+    def __init__(self, board):
+        w = board.width
+        self.width = w
+        self.height = board.height
+        self.stride = w + 1
+        tiles = str(tronboard.flatten(board)).translate(FLOOR_BITS)
+        rows = '0'.join(tiles[i:i+w] for i in xrange(0, len(tiles), w))
+        self.floor = int(rows[::-1], 2)
+
+    def bit(self, coords):
+        "Return the set holding just the tile at coords."
+        y, x = coords
+        return 1 << (y * self.stride + x)
+
+    def coords(self, bits):
+        "List the coordinates of the tiles in a set of tiles."
+        points = []
+        digits = bin(bits)[:1:-1]
+        i = digits.find('1')
+        while i >= 0:
+            points.append(divmod(i, self.stride))
+            i = digits.find('1', i + 1)
+        return points
+
+    def spread(self, bits, floor=None):
+        "Find the floor tiles next to any of the given tiles."
+        s = self.stride
+        if floor is None:
+            floor = self.floor
+        return (bits << 1 | bits >> 1 | bits << s | bits >> s) & floor
+
+    def moves(self, bit):
+        "Find the moves from a tile onto floor, as (bit, direction) pairs."
+        s, floor = self.stride, self.floor
+        steps = ((bit >> s, tron.NORTH), (bit << 1, tron.EAST),
+                 (bit << s, tron.SOUTH), (bit >> 1, tron.WEST))
+        return [(b, d) for b, d in steps if b & floor]
+
+    def fill(self, seed, floor=None):
+        "Find the floor tiles connected to the seed tiles."
+        s = self.stride
+        if floor is None:
+            floor = self.floor
+        region = 0
+        edge = seed
+        while edge:
+            edge = (edge << 1 | edge >> 1 | edge << s | edge >> s) & floor
+            floor ^= edge
+            region |= edge
+        return region
+
+def voronoi(bb, mine, theirs, floor=None):
+    "Split the floor between two players, at the given tiles, by who gets to each tile first."
+
+    # Both players flood out at once, one step at a time, and each
+    # floor tile goes to whoever's flood reaches it first. Tiles both
+    # reach on the same step go to neither, and aren't spread from.
+    # Returns the sets of tiles each player gets.
+    s = bb.stride
+    if floor is None:
+        floor = bb.floor
+    a, b = 0, 0
+    while mine or theirs:
+        mine = (mine << 1 | mine >> 1 | mine << s | mine >> s) & floor
+        theirs = (theirs << 1 | theirs >> 1 | theirs << s | theirs >> s) & floor
+        floor &= ~(mine | theirs)
+        both = mine & theirs
+        mine ^= both
+        theirs ^= both
+        a |= mine
+        b |= theirs
+    return a, b
+
+#_____________________________________________________________________
+# Lanes
+#
+
+# Sets of tiles for many boards of the same size can be packed side
+# by side into one int, each in its own lane. A lane is a whole board
+# plus one more row that is never floor, so just like the padding
+# column stops a shift east or west from wrapping into the next row,
+# the padding row stops a shift north or south from carrying a tile
+# into the next lane. Flood fills of the packed sets, over the packed
+# floors, then fill every lane at once, in as many steps as the
+# longest of them, which saves a pass through the interpreter for
+# every step of every board.
+
+def lane_size(bb):
+    "Return the number of bits in each lane for boards like bb."
+    return bb.stride * (bb.height + 1)
+
+def pack(bb, sets):
+    "Pack each of the sets of tiles into its own lane of one int."
+    size = lane_size(bb)
+    bits = 0
+    for i, tiles in enumerate(sets):
+        bits |= tiles << (i * size)
+    return bits
+
+def unpack(bb, bits, count):
+    "Unpack count sets of tiles from their lanes of bits."
+    size = lane_size(bb)
+    mask = (1 << size) - 1
+    return [bits >> (i * size) & mask for i in xrange(count)]
+
+#_____________________________________________________________________
+# Board Analysis (drop-in versions of the ones in tronutils)
+#
+
+def count_around(board, coords):
+    "Count of all spaces around coords."
+    bb = BitBoard(board)
+    return popcount(bb.fill(bb.bit(coords)))
+
+def dfs_count_around(board):
+    "Count all the spaces on the board around either player."
+    bb = BitBoard(board)
+    N = [tron.ME, tron.THEM]
+    M = [bb.moves(bb.bit(board.me())), bb.moves(bb.bit(board.them()))]
+    C = [{}, {}]
+    T = []
+    remaining = 0
+    for m in M:
+        for a, d in m:
+            remaining |= a
+    while remaining:
+        u = lowest(remaining)
+        V = bb.fill(u) | u
+        c = popcount(V)
+        t = []
+        for i in (0, 1):
+            for a, d in M[i]:
+                if a & V:
+                    C[i][d] = c
+                    t.append((N[i],d))
+        remaining &= ~V
+        T.append(t)
+    return C[0], C[1], T, touching(T)
@@ -0,0 +1,348 @@
+# endgame: Fills the space left once the players are separated, for a TronBot.
+# Copyright (C) 2010 Corey Abshire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Once the players can't reach each other, whoever makes the most
+# moves wins, and what the other player does makes no difference.
+# What's left is to find the longest path through my own region,
+# which this module does with a branch and bound search, and then
+# to play that path out over the turns that follow.
+
+import logging, sys, time
+import utils, tron, tronboard
+from tronboard import FLOOR, WALL
+from tronsearch import TimeAlmostUp, TimeManager
+
+#_____________________________________________________________________
+# Constants and Enumerations
+#
+
+# Regions that allow more moves than this are too big to work out the
+# bound at every node of the search.
+EXACT_BOUND_SIZE = 500
+
+# Regions that allow more moves than this are too big for fill_length
+# to search for their longest path, and it gives up on the search
+# after this many nodes.
+EXACT_FILL_SIZE = 24
+EXACT_FILL_NODES = 500
+
+# Share of the time left in a turn that goes to making a plan that
+# wasn't proven longer, while the board still follows it, and the
+# least time that is worth starting on that.
+EXTEND_SHARE = 0.25
+EXTEND_TIME = 0.05
+
+# Orders to try the directions in when all else is equal, each of
+# which follows the walls around a different way.
+PATTERNS = [
+    (tron.NORTH, tron.EAST, tron.WEST, tron.SOUTH),
+    (tron.SOUTH, tron.WEST, tron.EAST, tron.NORTH),
+    (tron.EAST, tron.NORTH, tron.SOUTH, tron.WEST),
+    (tron.WEST, tron.SOUTH, tron.NORTH, tron.EAST),
+    (tron.NORTH, tron.WEST, tron.EAST, tron.SOUTH),
+    (tron.SOUTH, tron.EAST, tron.WEST, tron.NORTH),
+    (tron.EAST, tron.SOUTH, tron.NORTH, tron.WEST),
+    (tron.WEST, tron.NORTH, tron.SOUTH, tron.EAST)]
+
+#_____________________________________________________________________
+# Bounding the Fill
+#
+
+# The checkerboard color of every tile, by board size.
+colorings = {}
+
+def coloring(geometry):
+    "Return the checkerboard color (0 or 1) of every tile on the board."
+    key = (geometry.width, geometry.height)
+    if key not in colorings:
+        colorings[key] = [(y + x) & 1 for y, x in geometry.coords]
+    return colorings[key]
+
+# The eight tiles around every tile, going clockwise from the north,
+# with -1 for those off the board, by board size.
+rings = {}
+
+def ring(geometry):
+    "Return the eight tiles around every tile on the board."
+    key = (geometry.width, geometry.height)
+    if key not in rings:
+        w, h = geometry.width, geometry.height
+        steps = ((-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1))
+        rings[key] = [tuple((0 <= y+dy < h and 0 <= x+dx < w) and (y+dy) * w + x+dx or -1
+                            for dy, dx in steps)
+                      for y, x in geometry.coords]
+    return rings[key]
+
+def may_split(cells, around):
+    "Determine whether filling the tile with the given ring around it could split the floor."
+
+    # Each run of floor tiles going around the ring is connected, so
+    # if there is only one, filling the tile in the middle can't cut
+    # any of its neighbors off from each other. Each run is counted
+    # where it starts.
+    runs = 0
+    last = around[7] >= 0 and cells[around[7]] == FLOOR
+    for i in around:
+        floor = i >= 0 and cells[i] == FLOOR
+        if floor and not last:
+            runs += 1
+        last = floor
+    return runs > 1
+
+def parity_bound(colors, tiles, color):
+    "Bound the moves through tiles, starting next to them on a tile of color."
+
+    # Every move goes to a tile of the other color than the last, so
+    # the moves alternate colors, starting with the other color. At
+    # most one more of those can be used than of the tiles that are
+    # the same color as the start.
+    same = 0
+    for i in tiles:
+        if colors[i] == color:
+            same += 1
+    other = len(tiles) - same
+    if other > same:
+        return 2 * same + 1
+    return 2 * other
+
+def fill_bound(cells, geometry, start):
+    "Bound the number of moves that can be made from start without crossing a wall."
+
+    # The floor reachable from start is split into chambers (blocks)
+    # at its articulation points, which are found with Tarjan's depth
+    # first search. A path can go into a chamber, leave it through one
+    # of its articulation points and never come back, so at best it
+    # uses up one chamber, then one of the chambers hanging from it,
+    # and so on down the tree of chambers. Each chamber is bounded by
+    # its checkerboard parity from the tile the path enters it by,
+    # and down[i] keeps the best bound of the chambers entered from
+    # tile i. Chambers are found leaves first, so by the time one is,
+    # all of those below it have been.
+    neighbors = geometry.neighbors
+    colors = coloring(geometry)
+    disc = {start: 0}
+    low = {start: 0}
+    parent = {start: -1}
+    down = {}
+    tiles = [start]
+    work = [(start, iter(neighbors[start]))]
+    count = 1
+    while work:
+        v, edges = work[-1]
+        for w in edges:
+            if cells[w] != FLOOR and w != start:
+                continue
+            if w not in disc:
+                disc[w] = low[w] = count
+                count += 1
+                parent[w] = v
+                tiles.append(w)
+                work.append((w, iter(neighbors[w])))
+                break
+            elif w != parent[v] and disc[w] < low[v]:
+                low[v] = disc[w]
+        else:
+            work.pop()
+            if not work:
+                break
+            u = work[-1][0]
+            if low[v] < low[u]:
+                low[u] = low[v]
+            if low[v] >= disc[u]:
+                # The tiles from v up on the stack and u make a chamber.
+                chamber = []
+                deepest = 0
+                while True:
+                    t = tiles.pop()
+                    chamber.append(t)
+                    if down.get(t, 0) > deepest:
+                        deepest = down[t]
+                    if t == v:
+                        break
+                value = parity_bound(colors, chamber, colors[u]) + deepest
+                if value > down.get(u, 0):
+                    down[u] = value
+    return down.get(start, 0)
+
+#_____________________________________________________________________
+# Longest Fill Search
+#
+
+def longest_fill(board, finish_by=None, incumbent=None, pattern=PATTERNS[0]):
+    "Find the longest run of moves I can make on board, returning (moves, proven)."
+    stats = utils.Struct(nodes=0)
+    limit = fill_bound(board.cells, board.geometry, board.p1)
+    best, proven = fill_search(board.cells, board.geometry, board.p1, limit,
+                               finish_by, incumbent, pattern, stats)
+    logging.debug('fill of %d moves (bound %d) in %d nodes, %s', len(best),
+                  limit, stats.nodes, proven and 'proven' or 'out of time')
+    return best, proven
+
+def fill_search(cells, geometry, start, limit, finish_by=None, incumbent=None,
+                pattern=PATTERNS[0], stats=None, max_nodes=None):
+    "Find the longest run of moves from start, up to the bound limit, returning (moves, proven)."
+
+    # A depth first search of my possible paths, which gives up on a
+    # path as soon as its bound shows it can't get longer than the
+    # best one so far. The moves are tried best bound first, and then
+    # the one with the fewest ways on, which hugs the walls and finds
+    # a good path right away, and then in the order of the pattern.
+    # The search is over once every path has been ruled out, or a
+    # path as long as the bound is found, and either way the best
+    # path is then known to be the longest. If time runs out first,
+    # the best path so far is returned instead.
+    # The incumbent is a path to beat, such as one found before. Given
+    # max_nodes, the search also gives up after that many nodes.
+
+    # Working out the bound takes a pass over the whole region, which
+    # is too slow to do at every node in a big one. There, a move is
+    # taken to make one fewer move possible from then on, and the
+    # bound is only worked out again when the move could split the
+    # region.
+    moves = geometry.moves
+    neighbors = geometry.neighbors
+    rings = ring(geometry)
+    cells = bytearray(cells)
+    clock = TimeManager(finish_by)
+    if stats is None:
+        stats = utils.Struct(nodes=0)
+    best = list(incumbent or [])
+    path = []
+    exact = limit <= EXACT_BOUND_SIZE
+    recursion = sys.getrecursionlimit()
+
+    def search(i, bound):
+        clock.tick()
+        stats.nodes += 1
+        if stats.nodes == max_nodes:
+            raise TimeAlmostUp()
+        if len(path) > len(best):
+            best[:] = path
+        children = []
+        for j, d in moves[i]:
+            if cells[j] == FLOOR:
+                cells[j] = WALL
+                if exact or may_split(cells, rings[j]):
+                    b = fill_bound(cells, geometry, j)
+                else:
+                    b = bound - 1
+                exits = 0
+                for k in neighbors[j]:
+                    if cells[k] == FLOOR:
+                        exits += 1
+                cells[j] = FLOOR
+                children.append((-b, exits, pattern.index(d), j, d))
+        children.sort()
+        for b, exits, k, j, d in children:
+            if len(path) + 1 - b <= len(best) or len(best) >= limit:
+                return
+            cells[j] = WALL
+            path.append(d)
+            search(j, -b)
+            path.pop()
+            cells[j] = FLOOR
+
+    proven = True
+    if len(best) < limit:
+        sys.setrecursionlimit(max(recursion, limit + 100))
+        try:
+            search(start, limit)
+        except TimeAlmostUp:
+            proven = False
+        finally:
+            sys.setrecursionlimit(recursion)
+    return best, proven
+
+def fill_length(cells, geometry, start):
+    "Estimate the most moves that can be made from start, returning (least, most)."
+
+    # Regions small enough to search are searched for their longest
+    # path, which settles it exactly unless the search gives up first.
+    # The rest just get their bound, with nothing known of the least.
+    limit = fill_bound(cells, geometry, start)
+    if limit > EXACT_FILL_SIZE:
+        return 0, limit
+    stats = utils.Struct(nodes=0)
+    best, proven = fill_search(cells, geometry, start, limit, None, None,
+                               PATTERNS[0], stats, EXACT_FILL_NODES)
+    if proven:
+        return len(best), len(best)
+    return len(best), limit
+
+#_____________________________________________________________________
+# Playing the Fill
+#
+
+class FillPlanner():
+    "Plans how to fill the space I have left, and plays the plan out."
+
+    # The plan is the longest path found, which is followed for as
+    # long as the board agrees with it: I'm where it expects, and the
+    # tiles it goes through are still open. If not, a new one is made.
+    # A plan that wasn't proven to be the longest is worked on again
+    # with a share of the time left over in the turn, with the rest
+    # of it as the path to beat, so it only ever gets longer. Each
+    # time, the moves are tried in a different pattern, since a
+    # search that runs out of time has only looked at paths that
+    # start the same way.
+
+    def __init__(self):
+        self.plan = []
+        self.position = None
+        self.proven = False
+        self.searches = 0
+
+    def follows(self, board):
+        "Determine whether the rest of the plan can still be played on board."
+        if board.p1 != self.position or not self.plan:
+            return False
+        moves, cells, i = board.geometry.moves, board.cells, board.p1
+        for move in self.plan:
+            for j, d in moves[i]:
+                if d == move:
+                    break
+            else:
+                return False
+            if cells[j] != FLOOR:
+                return False
+            i = j
+        return True
+
+    def move(self, board, finish_by=None):
+        "Return the next move of the plan for board, planning again if needed."
+        board = tronboard.compact(board)
+        pattern = PATTERNS[self.searches % len(PATTERNS)]
+        left = finish_by is not None and finish_by - time.time() or 0.0
+        if not self.follows(board):
+            self.plan, self.proven = longest_fill(board, finish_by, None, pattern)
+            self.searches += 1
+        elif not self.proven and left >= EXTEND_TIME:
+            extend_by = time.time() + EXTEND_SHARE * left
+            self.plan, self.proven = longest_fill(board, extend_by, self.plan, pattern)
+            self.searches += 1
+        else:
+            logging.debug('following the fill plan, %d moves left', len(self.plan))
+        if not self.plan:
+            # No plan in time, or nowhere to go: any legal move will do.
+            self.position = None
+            moves = board.moves()
+            return moves and moves[0] or tron.NORTH
+        move = self.plan.pop(0)
+        self.position = board.p1 + board.offsets[move]
+        return move
+
+# The planner the bot uses, which keeps its plan from turn to turn.
+planner = FillPlanner()
@@ -0,0 +1,215 @@
+# mcts: Monte Carlo tree search for a TronBot.
+# Copyright (C) 2010 Corey Abshire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Instead of evaluating every position at the edge of a fixed depth,
+# as the alpha-beta searches do, this search plays lots of quick games
+# out from the current position and grows a tree towards the moves
+# that do best in them. It can stop whenever time is up, and doesn't
+# need a search a whole ply deeper to get any better, which helps on
+# the big open maps where the alpha-beta searches can't get deep.
+
+import logging, math, random, time
+import utils, tron, tronboard, aimatron
+from tronboard import FLOOR, WALL
+from tronsearch import TimeAlmostUp, TimeManager
+
+#_____________________________________________________________________
+# Constants and Enumerations
+#
+
+# How much the choice of moves in the tree favors trying moves that
+# haven't been tried much over the ones that have done well.
+EXPLORATION = 0.5
+
+# How often a playout picks a move at random rather than the one that
+# hugs the walls the most.
+RANDOM_MOVES = 0.2
+
+# Most turns a playout goes on for before the position it has reached
+# is just evaluated instead.
+PLAYOUT_TURNS = 40
+
+# Value of a head-on collision (a draw), as scored by aimatron.
+COLLISION = -0.5
+
+#_____________________________________________________________________
+# Search Tree
+#
+
+class Node():
+    "A position in the Monte Carlo search tree."
+
+    # In Tron both players move at once, so each node keeps separate
+    # statistics for each player's moves, and each player picks a move
+    # from its own as though the other player's move were not known.
+    # This is decoupled UCT. The node for the position after the pair
+    # of moves they picked is then in children. The statistics are
+    # [visits, total value] by move, with values from my side, so the
+    # other player tries to make them as small as possible.
+
+    def __init__(self):
+        self.visits = 0
+        self.mine = {}
+        self.theirs = {}
+        self.children = {}
+
+def select(stats, visits, sign, rand):
+    "Pick a move by the UCB1 rule, with values counted for the player by sign."
+    untried = [m for m, s in stats.iteritems() if not s[0]]
+    if untried:
+        return rand.choice(untried)
+    log_visits = math.log(visits)
+    best, best_score = None, -utils.infinity
+    for m, (n, total) in stats.iteritems():
+        score = sign * total / n + EXPLORATION * math.sqrt(log_visits / n)
+        if score > best_score:
+            best, best_score = m, score
+    return best
+
+#_____________________________________________________________________
+# Playouts
+#
+
+def playout_move(cells, moves, neighbors, i, rand):
+    "Pick a move from tile i for a playout, or return None if there isn't one."
+
+    # Mostly the move to the tile with the fewest open tiles around
+    # it, which follows the walls and fills space tidily, and now and
+    # then one at random.
+    choices = [(j, d) for j, d in moves[i] if cells[j] == FLOOR]
+    if not choices:
+        return None
+    if len(choices) == 1 or rand.random() < RANDOM_MOVES:
+        return rand.choice(choices)
+    best, fewest = [], 5
+    for j, d in choices:
+        exits = 0
+        for k in neighbors[j]:
+            if cells[k] == FLOOR:
+                exits += 1
+        if exits < fewest:
+            best, fewest = [(j, d)], exits
+        elif exits == fewest:
+            best.append((j, d))
+    return rand.choice(best)
+
+def outcome(m1, m2):
+    "Score a turn where the players move to m1 and m2 (None for no move), or return None if the game goes on."
+    if m1 is None and m2 is None:
+        return COLLISION
+    if m1 is None:
+        return -1.0
+    if m2 is None:
+        return 1.0
+    if m1[0] == m2[0]:
+        return COLLISION
+    return None
+
+def playout(board, cells, p1, p2, rand, stats):
+    "Play the game out from the position in cells, and return its value."
+    geometry = board.geometry
+    moves, neighbors = geometry.moves, geometry.neighbors
+    for turn in xrange(PLAYOUT_TURNS):
+        m1 = playout_move(cells, moves, neighbors, p1, rand)
+        m2 = playout_move(cells, moves, neighbors, p2, rand)
+        value = outcome(m1, m2)
+        if value is not None:
+            return value
+        cells[p1] = cells[p2] = WALL
+        p1, p2 = m1[0], m2[0]
+        cells[p1] = tronboard.ME
+        cells[p2] = tronboard.THEM
+        stats.turns += 1
+    end = tronboard.CompactBoard(board.width, board.height, cells, p1, p2, 0)
+    return aimatron.evaluate_voronoi(end)
+
+#_____________________________________________________________________
+# Primary Interface for the Bot
+#
+
+def mcts_search(board, finish_by=None, iterations=None, seed=None, stats=None):
+    "Find a move with a Monte Carlo tree search, until finish_by or the iterations run out."
+
+    # Each iteration starts from a fresh copy of the tiles, picks
+    # moves down the tree until it gets to a pair that hasn't been
+    # tried, adds the node for it, plays the game out from there, and
+    # adds the value of the playout to the statistics of every move
+    # on the way down. The move returned is the one of mine that was
+    # tried the most, which is the one the search trusts the most.
+    board = tronboard.compact(board)
+    best_move = board.moves()[0]
+    geometry = board.geometry
+    moves = geometry.moves
+    rand = random.Random(seed)
+    root = Node()
+    clock = TimeManager(finish_by)
+    if stats is None:
+        stats = utils.Struct(playouts=0, turns=0)
+    start = time.time()
+    try:
+        while iterations is None or stats.playouts < iterations:
+            clock.tick()
+            cells = bytearray(board.cells)
+            p1, p2 = board.p1, board.p2
+            node, path = root, []
+            while True:
+                mine = [(j, d) for j, d in moves[p1] if cells[j] == FLOOR]
+                theirs = [(j, d) for j, d in moves[p2] if cells[j] == FLOOR]
+                if not node.mine:
+                    for j, d in mine:
+                        node.mine[d] = [0, 0.0]
+                    for j, d in theirs:
+                        node.theirs[d] = [0, 0.0]
+                if not mine or not theirs:
+                    value = outcome(mine and mine[0] or None,
+                                    theirs and theirs[0] or None)
+                    break
+                a = select(node.mine, node.visits, 1.0, rand)
+                b = select(node.theirs, node.visits, -1.0, rand)
+                path.append((node, a, b))
+                j1 = p1 + board.offsets[a]
+                j2 = p2 + board.offsets[b]
+                if j1 == j2:
+                    value = COLLISION
+                    break
+                cells[p1] = cells[p2] = WALL
+                p1, p2 = j1, j2
+                cells[p1] = tronboard.ME
+                cells[p2] = tronboard.THEM
+                child = node.children.get((a, b))
+                if child is None:
+                    node.children[(a, b)] = Node()
+                    value = playout(board, cells, p1, p2, rand, stats)
+                    break
+                node = child
+            for node, a, b in path:
+                node.visits += 1
+                s = node.mine[a]
+                s[0] += 1
+                s[1] += value
+                s = node.theirs[b]
+                s[0] += 1
+                s[1] += value
+            stats.playouts += 1
+    except TimeAlmostUp:
+        pass
+    elapsed = time.time() - start
+    if root.mine:
+        best_move = max(root.mine, key=lambda m: root.mine[m][0])
+    logging.debug('mcts %d playouts (%d turns) in %0.3fs = %0.1f playouts/s; %s',
+                  stats.playouts, stats.turns, elapsed,
+                  stats.playouts / max(elapsed, 1e-9), root.mine)
+    return best_move
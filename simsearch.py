@@ -0,0 +1,173 @@
+# simsearch: Simultaneous move alpha-beta search for a TronBot.
+# Copyright (C) 2010 Corey Abshire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# The searches in aimatron take turns, the way minimax expects,
+# and fake the simultaneous moves of Tron by holding on to the
+# first move of each turn until the second one is made. This one
+# works with whole turns instead: every node is a position after
+# both players have moved, and its children are the joint moves.
+
+import logging, sys
+import utils, tron, tronboard, aimatron
+from aimatron import TimeAlmostUp, TimeManager
+
+#_____________________________________________________________________
+# Constants and Enumerations
+#
+
+# Value of a head-on collision, where both players move onto the
+# same tile. Both crash, so it's a draw (scored like aimatron does).
+COLLISION = -0.5
+
+#_____________________________________________________________________
+# Joint Move Search
+#
+
+def joint_alphabeta(board, depth_limit, eval_fn=None, stats=None,
+                    clock=None, first=None, batch=False):
+    "Search depth_limit whole turns ahead on board, returning (move, value)."
+
+    # At each node the value is the max over my moves of the min over
+    # theirs, just as if they could see my move before making theirs,
+    # which is the same pessimism as the turn taking searches. The
+    # joint moves are worked through one row of the 3x3 matrix at a
+    # time. A row is given up on as soon as one of their replies
+    # shows it can't beat the best row so far, and the whole node as
+    # soon as a row is good enough for the other side to avoid it.
+    # Moves are made and taken back in place on the one board, and a
+    # pair of moves onto the same tile is scored as a collision right
+    # there, without making either move. The first move given is
+    # tried first at the root. The clock (a TimeManager) is told
+    # about every node, so it can stop the search when time is up.
+    # With batch, the turns from a node one turn above the horizon
+    # are all evaluated together (see horizon_value).
+
+    geometry = board.geometry
+    cells = board.cells
+    if eval_fn is None:
+        eval_fn = aimatron.evaluate_board
+    if stats is None:
+        stats = utils.Struct(nodes=0, max_depth=0)
+
+    def value(alpha, beta, depth):
+        if clock:
+            clock.tick()
+        stats.nodes += 1
+        stats.max_depth = max(stats.max_depth, depth)
+        if depth >= depth_limit or board.p1 < 0 or board.p2 < 0:
+            return eval_fn(board)
+        mine = geometry.floor_moves(cells, board.p1)
+        theirs = geometry.floor_moves(cells, board.p2)
+        if not mine or not theirs or aimatron.settle(board):
+            return eval_fn(board)
+        if batch and depth + 1 >= depth_limit:
+            stats.max_depth = max(stats.max_depth, depth_limit)
+            return horizon_value(board, mine, theirs, stats)
+        v = -utils.infinity
+        for a, m in mine:
+            w = utils.infinity
+            for b, t in theirs:
+                if a == b:
+                    u = COLLISION
+                else:
+                    board.do_move(tron.ME, m)
+                    board.do_move(tron.THEM, t)
+                    u = value(max(alpha, v), min(beta, w), depth + 1)
+                    board.undo_move()
+                    board.undo_move()
+                w = min(w, u)
+                if w <= max(alpha, v):
+                    break
+            v = max(v, w)
+            if v >= beta:
+                return v
+        return v
+
+    # The root is the same, except that it keeps track of the move.
+    mine = geometry.floor_moves(cells, board.p1)
+    theirs = geometry.floor_moves(cells, board.p2)
+    mine.sort(key=lambda (a, m): m != first)
+    best_move, best_value = None, -utils.infinity
+    for a, m in mine:
+        w = utils.infinity
+        for b, t in theirs:
+            if a == b:
+                u = COLLISION
+            else:
+                board.do_move(tron.ME, m)
+                board.do_move(tron.THEM, t)
+                u = value(best_value, w, 1)
+                board.undo_move()
+                board.undo_move()
+            w = min(w, u)
+            if best_move is not None and w <= best_value:
+                break
+        if best_move is None or w > best_value:
+            best_move, best_value = m, w
+    return best_move, best_value
+
+def horizon_value(board, mine, theirs, stats):
+    "Find the value of a node whose children are all at the horizon, evaluating them at once."
+
+    # This gives up the cutoffs alpha-beta would find among the
+    # children, but they are all leaves, and evaluating them together
+    # (see aimatron.evaluate_turns) costs less than one at a time.
+    turns = [(m, t) for a, m in mine for b, t in theirs if a != b]
+    scores = dict(zip(turns, aimatron.evaluate_turns(board, turns)))
+    stats.nodes += len(turns)
+    v = -utils.infinity
+    for a, m in mine:
+        w = utils.infinity
+        for b, t in theirs:
+            if a == b:
+                w = min(w, COLLISION)
+            else:
+                w = min(w, scores[(m, t)])
+        v = max(v, w)
+    return v
+
+#_____________________________________________________________________
+# Primary Interface for the Bot
+#
+
+def simultaneous_search(board, finish_by=None, batch=False):
+    "Find a move by iteratively deepening a search of whole turns."
+
+    # Each iteration goes one whole turn deeper, which is as far as
+    # two iterations of the turn taking searches. When no line got
+    # as deep as the limit, the game ends within it in every line,
+    # so going deeper would not change anything.
+    board = tronboard.compact(board).copy()
+    best_completed_move = board.moves()[0]
+    if not board.geometry.floor_moves(board.cells, board.p2):
+        return best_completed_move # they have already lost
+    clock = TimeManager(finish_by)
+    try:
+        for depth_limit in xrange(1, sys.maxint):
+            stats = utils.Struct(nodes=0, max_depth=0)
+            move, value = joint_alphabeta(board, depth_limit, None, stats,
+                                          clock, best_completed_move, batch)
+            logging.debug('turns %d: %d nodes, value %0.2f',
+                          depth_limit, stats.nodes, value)
+            if move is None:
+                return best_completed_move
+            best_completed_move = move
+            if stats.max_depth < depth_limit:
+                return move
+            if not clock.completed(depth_limit, stats.nodes, move):
+                return move
+    except TimeAlmostUp:
+        return best_completed_move
@@ -14,8 +14,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import unittest
-import tron, tronutils, MyTronBot, aimatron
+import os, sys, time, random, tempfile, unittest, StringIO
+import games, utils
+import tron, tronio, tronutils, tronboard, tronsearch, bitboard, tronarrays, MyTronBot, aimatron, simsearch, endgame, mcts, tronmoves
 
 #_____________________________________________________________________
 # Board Helper Tests
@@ -60,6 +61,17 @@ class BoardHelperTestCase(unittest.TestCase):
         self.assertFalse(MyTronBot.valid_coords(board, (6,6)))
         self.assertFalse(MyTronBot.valid_coords(board, (4,0)))
 
+    def test_search_option(self):
+        config, args = MyTronBot.argp.parse_args(['--search', 'stack'])
+        self.assertEquals(config.search, 'stack')
+        stderr = sys.stderr
+        try:
+            sys.stderr = StringIO.StringIO()
+            self.assertRaises(SystemExit, MyTronBot.argp.parse_args,
+                              ['--search', 'stak'])
+        finally:
+            sys.stderr = stderr
+
     def test_tile_is_a(self):
         board = tronutils.read_board('maps/test-board.txt')
         is_wall = MyTronBot.tile_is_a(tron.WALL)
@@ -168,6 +180,335 @@ class BoardHelperTestCase(unittest.TestCase):
         board = tronutils.read_board('maps/test-board.txt')
         self.assertEquals(MyTronBot.count_around(board, board.me()), 4)
 
+#_____________________________________________________________________
+# Compact Board Tests
+#
+
+class CompactBoardTestCase(unittest.TestCase):
+
+    def test_compact_matches_board(self):
+        for m in tronutils.list_files('maps/'):
+            board = tronutils.read_board(m)
+            compact = tronboard.compact(board)
+            self.assertEquals(compact.me(), board.me())
+            self.assertEquals(compact.them(), board.them())
+            self.assertEquals(compact.board, board.board[:board.height])
+            for y in xrange(-1, board.height + 1):
+                for x in xrange(-1, board.width + 1):
+                    self.assertEquals(compact[y,x], board[y,x])
+
+    def test_moves(self):
+        board = tronboard.compact(tronutils.read_board('maps/test-board.txt'))
+        self.assertEquals(board.moves(), [tron.SOUTH])
+        self.assertEquals(board.adjacent(board.me()),
+                          [(0,1),(1,2),(2,1),(1,0)])
+
+    def test_apply_move(self):
+        board = tronboard.compact(tronutils.read_board('maps/test-board.txt'))
+        next = tronutils.apply_move(board, tron.ME, tron.SOUTH)
+        self.assertEquals(next.me(), (2,1))
+        self.assertEquals(next.them(), (1,4))
+        self.assertEquals(next[1,1], tron.WALL)
+        self.assertEquals(next[2,1], tron.ME)
+        self.assertEquals(board.me(), (1,1), 'should not have changed')
+        self.assertEquals(board[2,1], tron.FLOOR, 'should still be FLOOR')
+
+    def test_collision(self):
+        board = tronboard.compact(tronutils.read_board('cases/small-001.txt'))
+        board.do_move(tron.ME, tron.EAST)
+        board.do_move(tron.THEM, tron.NORTH)
+        board.do_move(tron.THEM, tron.WEST)
+        self.assertEquals(board.them(), (3,3))
+        board.do_move(tron.ME, tron.SOUTH)
+        self.assertEquals(board.me(), (3,3))
+        self.assertRaises(KeyError, board.them)
+        self.assertTrue(tronutils.is_game_over(board))
+
+    def test_zobrist_key(self):
+        board = tronboard.compact(tronutils.read_board('cases/small-001.txt'))
+        start = board.key
+        g = board.geometry
+        for player, d in ((tron.ME, tron.EAST), (tron.THEM, tron.NORTH),
+                          (tron.THEM, tron.WEST), (tron.ME, tron.SOUTH)):
+            board.do_move(player, d)
+            self.assertNotEquals(board.key, start)
+            self.assertEquals(board.key, g.zobrist(board.cells, board.p1, board.p2))
+            self.assertEquals(board.copy().key, board.key)
+        while board.history:
+            board.undo_move()
+        self.assertEquals(board.key, start)
+
+    def test_zobrist_from_scratch(self):
+        # The same as combining the keys of the tiles one by one.
+        for m in ['maps/u.txt', 'maps/huge-room.txt', 'cases/small-001.txt']:
+            board = tronboard.compact(tronutils.read_board(m))
+            g = board.geometry
+            key = g.me_keys[board.p1] ^ g.them_keys[board.p2]
+            for i, c in enumerate(board.cells):
+                if c == tronboard.WALL:
+                    key ^= g.wall_keys[i]
+            self.assertEquals(g.zobrist(board.cells, board.p1, board.p2), key, m)
+
+    def test_update_same_board(self):
+        board = tronboard.compact(tronutils.read_board('maps/u.txt'))
+        key, labels = board.key, board.labels()
+        board.last_moves = (tron.NORTH, tron.SOUTH)
+        self.assertTrue(board.update(bytearray(board.cells)))
+        self.assertEquals((board.key, board.last_moves), (key, None))
+        self.assertTrue(board.labels() is labels)
+
+    def test_transposition_keys(self):
+        board = tronboard.compact(tronutils.read_board('maps/empty-room.txt'))
+        a = tronutils.apply_move(board, tron.ME, tron.SOUTH)
+        a = tronutils.apply_move(a, tron.ME, tron.EAST)
+        b = tronutils.apply_move(board, tron.ME, tron.EAST)
+        b = tronutils.apply_move(b, tron.ME, tron.SOUTH)
+        self.assertNotEquals(a.cells, b.cells)
+        self.assertNotEquals(a.key, b.key)
+        c = tronutils.apply_move(board, tron.THEM, tron.NORTH)
+        c = tronutils.apply_move(c, tron.ME, tron.SOUTH)
+        d = tronutils.apply_move(board, tron.ME, tron.SOUTH)
+        d = tronutils.apply_move(d, tron.THEM, tron.NORTH)
+        self.assertEquals(c.key, d.key)
+        self.assertEquals(tronboard.board_key(tronutils.read_board('maps/empty-room.txt')),
+                          board.key)
+        state = aimatron.TronState(board, tron.ME)
+        pending = aimatron.TronState(board, tron.THEM, tron.SOUTH)
+        self.assertEquals(state.key, board.key)
+        self.assertNotEquals(pending.key, state.key)
+
+class GeometryTestCase(unittest.TestCase):
+
+    def test_shared(self):
+        a = tronboard.compact(tronutils.read_board('maps/u.txt'))
+        b = tronboard.compact(tronutils.read_board('maps/ring.txt'))
+        self.assertTrue(a.geometry is b.geometry)
+        self.assertTrue(a.geometry is tronboard.geometry(15, 15))
+
+    def test_moves(self):
+        geometry = tronboard.geometry(6, 4)
+        self.assertEquals(geometry.moves[0], ((1, tron.EAST), (6, tron.SOUTH)))
+        self.assertEquals(geometry.moves[23], ((17, tron.NORTH), (22, tron.WEST)))
+        self.assertEquals(geometry.neighbors[7], (1, 8, 13, 6))
+        board = tronboard.compact(tronutils.read_board('maps/test-board.txt'))
+        self.assertEquals(geometry.floor_moves(board.cells, board.p1),
+                          [(13, tron.SOUTH)])
+        self.assertEquals(geometry.floor_neighbors(board.cells, 9), [15])
+        self.assertEquals(geometry.fill(board.cells, [13]),
+                          set([13, 14, 15, 9]))
+
+    def reference_dfs_count_around(self, board):
+        # The original version, on the coordinates of a tron.Board.
+        N = [tron.ME, tron.THEM]
+        A = tronutils.Adjacent(board, tronutils.is_floor)
+        P = [board.me(), board.them()]
+        C = [{} for p in P]
+        T = []
+        remaining = set(A[P[0]] + A[P[1]])
+        while remaining:
+            u = remaining.pop()
+            V = set([])
+            tronutils.root_dfs(u, A, V)
+            t = []
+            for i in range(len(P)):
+                for a in A[P[i]]:
+                    if a in V:
+                        d = tronutils.move_made(P[i], a)
+                        C[i][d] = len(V)
+                        t.append((N[i], d))
+                        remaining.discard(a)
+            T.append(t)
+        return C[0], C[1], T, tronutils.touching(T)
+
+    def test_dfs_count_around(self):
+        for m in tronutils.list_files('maps/') + tronutils.list_files('cases/'):
+            board = tronutils.read_board(m)
+            p1, p2, t, touching = self.reference_dfs_count_around(board)
+            for b in (board, tronboard.compact(board)):
+                q1, q2, u, same = tronutils.dfs_count_around(b)
+                self.assertEquals((q1, q2, same), (p1, p2, touching), m)
+                self.assertEquals(sorted(map(sorted, u)), sorted(map(sorted, t)), m)
+
+    def test_dfs_count_around_values(self):
+        board = tronutils.read_board('maps/test-board.txt')
+        p1, p2, t, touching = tronutils.dfs_count_around(board)
+        self.assertEquals((p1, p2, touching), ({tron.SOUTH: 4}, {tron.WEST: 4}, True))
+
+#_____________________________________________________________________
+# Bitboard Tests
+#
+
+class BitBoardTestCase(unittest.TestCase):
+
+    def maps(self):
+        for m in tronutils.list_files('maps/') + tronutils.list_files('cases/'):
+            yield m, tronutils.read_board(m)
+
+    def test_floor(self):
+        board = tronutils.read_board('maps/test-board.txt')
+        bb = bitboard.BitBoard(board)
+        self.assertEquals(bb.stride, 7)
+        self.assertEquals(set(bb.coords(bb.floor)),
+                          set(tronutils.tiles_matching(board, tronutils.is_floor)))
+        self.assertEquals(bb.coords(bb.spread(bb.bit(board.me()))), [(2,1)])
+        self.assertEquals(bitboard.popcount(bb.floor), 4)
+
+    def test_count_around(self):
+        for m, board in self.maps():
+            for coords in (board.me(), board.them()):
+                self.assertEquals(bitboard.count_around(board, coords),
+                                  tronutils.count_around(board, coords), m)
+
+    def test_dfs_count_around(self):
+        for m, board in self.maps():
+            p1, p2, t, touching = bitboard.dfs_count_around(board)
+            q1, q2, u, same = tronutils.dfs_count_around(board)
+            self.assertEquals((p1, p2, touching), (q1, q2, same), m)
+            self.assertEquals(sorted(t), sorted(u), m)
+
+#_____________________________________________________________________
+# Evaluation Cache Tests
+#
+
+class EvalCacheTestCase(unittest.TestCase):
+
+    def test_get_put(self):
+        cache = tronsearch.EvalCache(4)
+        self.assertEquals(cache.get(1), None)
+        cache.put(1, 0.5, 100)
+        self.assertEquals(cache.get(1), 0.5)
+        self.assertEquals((cache.hits, cache.misses), (1, 1))
+
+    def test_clock_eviction(self):
+        cache = tronsearch.EvalCache(4)
+        for key in range(4):
+            cache.put(key, float(key), 100)
+        cache.get(0)
+        cache.get(2)
+        cache.put(4, 4.0, 100) # takes 1, which wasn't used
+        cache.put(5, 5.0, 100) # takes 3
+        self.assertEquals([cache.get(k) for k in range(6)],
+                          [0.0, None, 2.0, None, 4.0, 5.0])
+        self.assertEquals(cache.evicted, 2)
+
+    def test_expired(self):
+        cache = tronsearch.EvalCache(4)
+        for key in range(4):
+            cache.put(key, float(key), 100 - key)
+            cache.get(key)
+        cache.new_turn(98)
+        cache.put(4, 4.0, 98) # takes 0, which has more floor
+        cache.put(5, 5.0, 97) # takes 1
+        self.assertEquals(cache.expired, 2)
+        cache.put(6, 6.0, 97) # passes 2 and 3, which were used, to take 4
+        self.assertEquals([cache.get(k) for k in (2, 3, 4, 5, 6)],
+                          [2.0, 3.0, None, 5.0, 6.0])
+        self.assertEquals(cache.evicted, 1)
+
+    def test_put_again(self):
+        cache = tronsearch.EvalCache(4)
+        cache.put(1, 0.5, 100)
+        cache.put(1, 0.25, 100, True)
+        self.assertEquals(cache.slots, {1: 0})
+        self.assertEquals(cache.get(1), 0.25)
+        self.assertTrue(cache.settled(1))
+        for key in range(2, 10):
+            cache.put(key, float(key), 100)
+        self.assertEquals(sorted(cache.slots), [6, 7, 8, 9])
+        self.assertFalse(cache.settled(1))
+
+    def test_evaluate_board(self):
+        board = tronboard.compact(tronutils.read_board('maps/u.txt'))
+        aimatron.eval_cache.clear()
+        score = aimatron.evaluate_board(board)
+        self.assertEquals(score, aimatron.evaluate(board))
+        self.assertEquals(aimatron.evaluate_board(tronutils.read_board('maps/u.txt')), score)
+        self.assertEquals(aimatron.eval_cache.hits, 1)
+        aimatron.use_evaluation('regions')
+        self.assertEquals(aimatron.eval_cache.get(board.key), None)
+
+#_____________________________________________________________________
+# Separated Position Tests
+#
+
+class SeparatedTestCase(unittest.TestCase):
+
+    def corridor(self, row):
+        return tronboard.compact(tron.Board(len(row), 3, ['#' * len(row), row,
+                                                          '#' * len(row)]))
+
+    def test_separated_value(self):
+        self.assertEquals(aimatron.separated_value(self.corridor('#1   #2 #')), 1.0)
+        self.assertEquals(aimatron.separated_value(self.corridor('#1 #2   #')), -1.0)
+        self.assertEquals(aimatron.separated_value(self.corridor('#1  #2  #')), -0.5)
+        self.assertEquals(aimatron.separated_value(self.corridor('#1      2#')), None)
+        self.assertEquals(aimatron.separated_value(self.corridor('#12     #')), None)
+        self.assertEquals(aimatron.separated_value(self.corridor('#1#    2#')), None)
+
+    def test_settle(self):
+        board = self.corridor('#1   #2 #')
+        aimatron.eval_cache.clear()
+        self.assertTrue(aimatron.settle(board))
+        self.assertEquals(aimatron.evaluate_board(board), 1.0)
+        self.assertFalse(aimatron.settle(self.corridor('#1      2#')))
+
+    def test_settle_again(self):
+        # Settling the same board again keeps it in the one slot, so
+        # the hand can come all the way around the cache and back.
+        board = self.corridor('#1   #2 #')
+        cache = aimatron.eval_cache
+        try:
+            aimatron.eval_cache = tronsearch.EvalCache(4)
+            self.assertTrue(aimatron.settle(board))
+            self.assertTrue(aimatron.settle(board))
+            self.assertEquals(len(aimatron.eval_cache.slots), 1)
+            self.assertEquals(aimatron.eval_cache.hits, 1)
+            for key in range(8):
+                aimatron.eval_cache.put(key, 0.0, 100)
+            self.assertTrue(aimatron.settle(board))
+            self.assertEquals(aimatron.evaluate_board(board), 1.0)
+            self.assertEquals(sorted(aimatron.eval_cache.keys),
+                              sorted(aimatron.eval_cache.slots))
+        finally:
+            aimatron.eval_cache = cache
+
+    def test_deepening_stops(self):
+        # Every line is settled once we're on our own sides of the
+        # divider, and every line of the small board is soon over, so
+        # there's nothing for more passes to find.
+        searches = [
+            lambda board, finish_by: aimatron.alphabeta_search(
+                tronboard.compact(board), aimatron.TronPooledGame(), finish_by),
+            lambda board, finish_by: aimatron.stack_alphabeta_search(board, finish_by),
+            lambda board, finish_by: aimatron.inplace_alphabeta_search(
+                board, finish_by, tronsearch.TranspositionTable(1 << 12),
+                tronsearch.MoveOrdering()),
+            lambda board, finish_by: aimatron.inplace_alphabeta_search(
+                board, finish_by, tronsearch.TranspositionTable(1 << 12),
+                tronsearch.MoveOrdering(), True)]
+        for m in ['maps/divider.txt', 'cases/small-002.txt']:
+            board = tronutils.read_board(m)
+            for i, search in enumerate(searches):
+                aimatron.eval_cache.clear()
+                start = time.time()
+                self.assertTrue(search(board, start + 0.5) in board.moves())
+                self.assertTrue(time.time() - start < 0.25, (m, i))
+
+    def test_separated_turns(self):
+        for m in tronutils.list_files('cases/'):
+            board = tronboard.compact(tronutils.read_board(m))
+            floor_moves = board.geometry.floor_moves
+            turns = [(m, t) for a, m in floor_moves(board.cells, board.p1)
+                     for b, t in floor_moves(board.cells, board.p2) if a != b]
+            expected = []
+            for a, b in turns:
+                board.do_move(tron.ME, a)
+                board.do_move(tron.THEM, b)
+                expected.append(aimatron.separated_value(board) is not None)
+                board.undo_move()
+                board.undo_move()
+            self.assertEquals(aimatron.separated_turns(board, turns), expected, m)
+
 #_____________________________________________________________________
 # AIMA Alpha-Beta Interface Test
 #
@@ -216,22 +557,26 @@ class AlphaBetaTestCase(unittest.TestCase):
         # very simple open board; should tie
         self.assertEquals(aimatron.eval_fn(state), 0.0)
 
-        # very simple closed board; should also tie
+        # very simple closed board; should also tie, and since we're
+        # separated with a move each, it's a draw
         board.board[2] = '# ####'
         state = aimatron.TronState(board, tron.ME)
-        self.assertEquals(aimatron.eval_fn(state), 0.0)
+        self.assertEquals(aimatron.evaluate(board), 0.0)
+        self.assertEquals(aimatron.eval_fn(state), -0.5)
 
-        # advantage me
+        # advantage me, which is a win once separated
         board.board[2] = '#  ###'
         state = aimatron.TronState(board, tron.ME)
         a = 1.0 / 3.0
-        self.assertAlmostEqual(aimatron.eval_fn(state), a)
+        self.assertAlmostEqual(aimatron.evaluate(board), a)
+        self.assertEquals(aimatron.eval_fn(state), 1.0)
 
-        # advantage them
+        # advantage them, which is a loss once separated
         board.board[2] = '# # ##'
         state = aimatron.TronState(board, tron.ME)
         a = 1.0 / 3.0
-        self.assertAlmostEqual(aimatron.eval_fn(state), -a)
+        self.assertAlmostEqual(aimatron.evaluate(board), -a)
+        self.assertEquals(aimatron.eval_fn(state), -1.0)
 
         # I'm stuck
         board.board[2] = '######'
@@ -250,6 +595,961 @@ class AlphaBetaTestCase(unittest.TestCase):
         state = aimatron.TronState(board, tron.ME)
         self.assertEquals(aimatron.eval_fn(state), -0.5)
 
+class SearchTreeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        aimatron.search_tree = None
+
+    def tearDown(self):
+        aimatron.search_tree = None
+
+    def search(self, game, state, depth):
+        stats = utils.Struct(nodes=0, max_depth=0)
+        cutoff_fn = aimatron.make_cutoff_fn(depth, stats, None, game)
+        return games.alphabeta_search(state, game, None, cutoff_fn, aimatron.eval_fn)
+
+    def reuse_tree(self, game):
+        # The same board is updated in place, as tronio.generate does.
+        board = tronboard.compact(tronutils.read_board('maps/u.txt'))
+        root = aimatron.reuse_tree(board, game)
+        move = self.search(game, root, 4)
+        reply = board.geometry.floor_moves(board.cells, board.p2)[0][1]
+        next = tronutils.apply_move(board, tron.ME, move)
+        next = tronutils.apply_move(next, tron.THEM, reply)
+        expected = game.cached_move(reply, game.cached_move(move, root))
+        board.update(next.cells)
+        state = aimatron.reuse_tree(board, game)
+        self.assertTrue(state is expected)
+        self.assertTrue(aimatron.search_tree[1] is state)
+        self.assertEquals(state.board.board, board.board)
+        self.assertEquals(self.search(game, state, 4),
+                          self.search(aimatron.TronGame(),
+                                      aimatron.TronState(next, tron.ME), 4))
+        return state
+
+    def test_reuse_tree(self):
+        state = self.reuse_tree(aimatron.TronGame())
+        self.assertNotEquals(state.move_cache, {})
+
+    def test_reuse_pooled_tree(self):
+        game = aimatron.TronPooledGame(tronsearch.NodePool(1 << 12))
+        state = self.reuse_tree(game)
+        self.assertNotEquals(state.children, {})
+        self.assertEquals(state.parent, -1)
+        nodes = [n for n in game.pool.nodes if n is not None]
+        self.assertEquals(len(nodes), len(game.pool))
+        for node in nodes:
+            while node.parent >= 0:
+                node = game.pool.nodes[node.parent]
+            self.assertTrue(node is state)
+
+    def test_reuse_checks_key(self):
+        # A cached state whose key doesn't match the board isn't reused.
+        game = aimatron.TronPooledGame(tronsearch.NodePool(1 << 12))
+        board = tronboard.compact(tronutils.read_board('maps/u.txt'))
+        root = aimatron.reuse_tree(board, game)
+        move = self.search(game, root, 4)
+        reply = board.geometry.floor_moves(board.cells, board.p2)[0][1]
+        next = tronutils.apply_move(board, tron.ME, move)
+        next = tronutils.apply_move(next, tron.THEM, reply)
+        cached = game.cached_move(reply, game.cached_move(move, root))
+        cached.key ^= 1
+        board.update(next.cells)
+        state = aimatron.reuse_tree(board, game)
+        self.assertFalse(state is cached)
+        self.assertEquals(state.key, board.key)
+        self.assertEquals(len(game.pool), 1)
+
+    def test_new_tree(self):
+        game = aimatron.TronGame()
+        board = tronboard.compact(tronutils.read_board('maps/u.txt'))
+        root = aimatron.reuse_tree(board, game)
+        self.search(game, root, 2)
+        other = tronboard.compact(tronutils.read_board('maps/keyhole.txt'))
+        state = aimatron.reuse_tree(other, game)
+        self.assertEquals(state.move_cache, {})
+        self.assertTrue(state.board is other)
+        self.assertTrue(aimatron.search_tree[1] is state)
+        pooled = aimatron.TronPooledGame()
+        state = aimatron.reuse_tree(other, pooled)
+        self.assertEquals(len(pooled.pool), 1)
+
+    def test_search_stops_when_game_ends(self):
+        # Every line ends well before the deadline on a board this small.
+        board = tronboard.compact(tronutils.read_board('cases/small-002.txt'))
+        start = time.time()
+        move = aimatron.alphabeta_search(board, aimatron.TronPooledGame(), start + 0.5)
+        self.assertTrue(move in board.moves())
+        self.assertTrue(time.time() - start < 0.25)
+
+class NodePoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.board = tronboard.compact(tronutils.read_board('maps/u.txt'))
+
+    def node(self):
+        return aimatron.PooledState(self.board, tron.ME)
+
+    def test_key(self):
+        node = aimatron.PooledState(self.board, tron.THEM, tron.NORTH)
+        self.assertEquals(node.key, tronboard.state_key(self.board, tron.THEM, tron.NORTH))
+        self.assertEquals(self.node().key, self.board.key)
+
+    def test_add_and_evict(self):
+        pool = tronsearch.NodePool(16)
+        root = pool.add(self.node())
+        a = pool.add(self.node(), root, tron.NORTH)
+        b = pool.add(self.node(), a, tron.EAST)
+        c = pool.add(self.node(), root, tron.SOUTH)
+        self.assertEquals(len(pool), 4)
+        self.assertTrue(pool.child(root, tron.NORTH) is a)
+        self.assertTrue(pool.child(a, tron.EAST) is b)
+        pool.evict(a)
+        self.assertEquals(len(pool), 2)
+        self.assertEquals((a.index, b.index), (-1, -1))
+        self.assertEquals(pool.child(root, tron.NORTH), None)
+        self.assertTrue(pool.child(root, tron.SOUTH) is c)
+        d = pool.add(self.node(), a, tron.WEST) # under an evicted node
+        self.assertEquals(d.index, -1)
+        self.assertEquals(len(pool), 2)
+        self.assertEquals(pool.evicted, 2)
+
+    def test_reroot(self):
+        pool = tronsearch.NodePool(16)
+        root = pool.add(self.node())
+        a = pool.add(self.node(), root, tron.NORTH)
+        b = pool.add(self.node(), a, tron.EAST)
+        c = pool.add(self.node(), b, tron.SOUTH)
+        pool.add(self.node(), a, tron.WEST)
+        pool.reroot(b)
+        self.assertEquals(len(pool), 2)
+        self.assertEquals(b.parent, -1)
+        self.assertTrue(pool.child(b, tron.SOUTH) is c)
+
+    def test_capacity(self):
+        # Search with a pool too small to hold the tree.
+        pool = tronsearch.NodePool(32)
+        board = tronboard.compact(tronutils.read_board('maps/huge-room.txt'))
+        pooled = aimatron.TronPooledGame(pool)
+        game = aimatron.TronGame()
+        for depth in (2, 4, 6):
+            stats = utils.Struct(nodes=0, max_depth=0)
+            state = aimatron.TronState(board, tron.ME)
+            cutoff_fn = aimatron.make_cutoff_fn(depth, stats, None, game)
+            expected = games.alphabeta_search(state, game, None, cutoff_fn,
+                                              aimatron.eval_fn)
+            root = pooled.new_tree(board)
+            for d in range(2, depth + 1, 2):
+                cutoff_fn = aimatron.make_cutoff_fn(d, stats, None, pooled)
+                actual = games.alphabeta_search(root, pooled, None, cutoff_fn,
+                                                aimatron.eval_fn)
+            self.assertEquals(actual, expected)
+            self.assertTrue(len(pool) <= 32)
+        self.assertTrue(pool.evictions > 0)
+
+class VoronoiTestCase(unittest.TestCase):
+
+    def board(self, lines):
+        return tronboard.compact(tron.Board(len(lines[0]), len(lines), lines))
+
+    def test_voronoi(self):
+        board = self.board(['########',
+                            '#1     #',
+                            '#   #  #',
+                            '#     2#',
+                            '########'])
+        bb = bitboard.BitBoard(board)
+        mine, theirs = bitboard.voronoi(bb, bb.bit(board.me()), bb.bit(board.them()))
+        self.assertEquals(mine & theirs, 0)
+        self.assertEquals(mine & ~bb.floor, 0)
+        self.assertEquals(sorted(bb.coords(mine)),
+                          [(1,2), (1,3), (1,4), (2,1), (2,2), (2,3), (3,1), (3,2)])
+        self.assertEquals(sorted(bb.coords(theirs)),
+                          [(1,5), (1,6), (2,5), (2,6), (3,3), (3,4), (3,5)])
+        self.assertAlmostEqual(aimatron.evaluate_voronoi(board), 1.0 / 15)
+
+    def test_terminal(self):
+        board = tronutils.read_board('maps/test-board.txt')
+        board.board[2] = '######'
+        self.assertEquals(aimatron.evaluate_voronoi(board), -1.0)
+        board.board[1] = '#1##2#'
+        self.assertEquals(aimatron.evaluate_voronoi(board), -0.5)
+        board.board[2] = '#   ##'
+        self.assertEquals(aimatron.evaluate_voronoi(board), 1.0)
+
+    def test_chambers(self):
+        # My territory is a corridor with two dead ends.
+        board = self.board(['#########',
+                            '###   ###',
+                            '#   1   #',
+                            '#### ####',
+                            '####2####',
+                            '#########'])
+        self.assertEquals(aimatron.evaluate_voronoi(board), 1.0)
+        self.assertEquals(aimatron.evaluate_chambers(board), 1.0)
+        board = self.board(['#########',
+                            '##### ###',
+                            '#   1   #',
+                            '#### ####',
+                            '#### ####',
+                            '#    2  #',
+                            '#########'])
+        # I get more tiles first, but they can make more moves in theirs.
+        self.assertAlmostEqual(aimatron.evaluate_voronoi(board), 1.0 / 7)
+        self.assertAlmostEqual(aimatron.evaluate_chambers(board), -1.0 / 7)
+
+    def test_use_evaluation(self):
+        board = self.board(['########',
+                            '#1     #',
+                            '#   #  #',
+                            '#     2#',
+                            '########'])
+        try:
+            aimatron.use_evaluation('voronoi')
+            state = aimatron.TronState(board, tron.ME)
+            self.assertAlmostEqual(aimatron.eval_fn(state), 1.0 / 15)
+        finally:
+            aimatron.use_evaluation('regions')
+        self.assertTrue(aimatron.evaluation is aimatron.evaluate)
+
+class BatchEvaluationTestCase(unittest.TestCase):
+
+    def turns(self, board):
+        mine = board.geometry.floor_moves(board.cells, board.p1)
+        theirs = board.geometry.floor_moves(board.cells, board.p2)
+        return [(m, t) for a, m in mine for b, t in theirs if a != b]
+
+    def one_at_a_time(self, board, turns, evaluation):
+        scores = []
+        for m, t in turns:
+            board.do_move(tron.ME, m)
+            board.do_move(tron.THEM, t)
+            scores.append(evaluation(board))
+            board.undo_move()
+            board.undo_move()
+        return scores
+
+    def test_lanes(self):
+        bb = bitboard.BitBoard(tronutils.read_board('maps/u.txt'))
+        sets = [bb.floor, 0, bb.bit((1, 1)), bb.floor & ~bb.bit((3, 3))]
+        self.assertEquals(bitboard.unpack(bb, bitboard.pack(bb, sets), 4), sets)
+        # Filling every lane at once fills each as if on its own.
+        seeds = [bb.bit((1, 1)), 0, bb.bit((1, 1)), bb.bit((5, 5))]
+        floors = [bb.floor, bb.floor, 0, sets[3]]
+        packed = bb.fill(bitboard.pack(bb, seeds), bitboard.pack(bb, floors))
+        self.assertEquals(bitboard.unpack(bb, packed, 4),
+                          [bb.fill(s, f) for s, f in zip(seeds, floors)])
+
+    def test_same_scores(self):
+        for m in tronutils.list_files('maps/') + tronutils.list_files('cases/'):
+            board = tronboard.compact(tronutils.read_board(m))
+            if board.p1 < 0 or board.p2 < 0:
+                continue
+            turns = self.turns(board)
+            for evaluation, batch in aimatron.batch_evaluations.items():
+                expected = self.one_at_a_time(board, turns, evaluation)
+                for score, other in zip(batch(board, turns), expected):
+                    self.assertAlmostEqual(score, other)
+
+    def test_turn_key(self):
+        board = tronboard.compact(tronutils.read_board('maps/u.txt'))
+        for m, t in self.turns(board):
+            key = board.turn_key(m, t)
+            board.do_move(tron.ME, m)
+            board.do_move(tron.THEM, t)
+            self.assertEquals(board.key, key)
+            board.undo_move()
+            board.undo_move()
+
+    def test_evaluate_turns(self):
+        board = tronboard.compact(tronutils.read_board('maps/keyhole.txt'))
+        turns = self.turns(board)
+        try:
+            for name in ('regions', 'chambers'):
+                aimatron.use_evaluation(name)
+                expected = self.one_at_a_time(board, turns, aimatron.evaluation)
+                self.assertEquals(aimatron.evaluate_turns(board, turns), expected)
+                self.assertEquals(aimatron.evaluate_turns(board, turns), expected)
+                self.assertEquals(aimatron.eval_cache.hits, len(turns))
+        finally:
+            aimatron.use_evaluation('regions')
+
+    def test_batched_search(self):
+        for m in tronutils.list_files('cases/'):
+            board = tronboard.compact(tronutils.read_board(m))
+            for turns in (1, 2, 3):
+                aimatron.eval_cache.clear()
+                expected = simsearch.joint_alphabeta(board.copy(), turns)
+                aimatron.eval_cache.clear()
+                copy = board.copy()
+                move, value = simsearch.joint_alphabeta(copy, turns, batch=True)
+                self.assertEquals(move, expected[0], m)
+                self.assertAlmostEqual(value, expected[1])
+                self.assertEquals(copy.cells, board.cells)
+
+class InPlaceSearchTestCase(unittest.TestCase):
+
+    def search(self, depth, game, state, search_fn, eval_fn):
+        stats = utils.Struct(nodes=0, max_depth=0)
+        cutoff_fn = aimatron.make_cutoff_fn(depth, stats, None, game)
+        return search_fn(state, game, cutoff_fn, eval_fn)
+
+    def test_do_undo_move(self):
+        board = tronboard.compact(tronutils.read_board('maps/u.txt'))
+        before = board.copy()
+        game = aimatron.TronInPlaceGame()
+        state = aimatron.InPlaceState(board, tron.ME)
+        for move in (tron.WEST, tron.WEST, tron.SOUTH, tron.NORTH):
+            game.do_move(move, state)
+        self.assertEquals(board.me(), (3,11))
+        self.assertEquals(board.them(), (11,11))
+        self.assertEquals(state.move1, None)
+        game.do_move(tron.SOUTH, state)
+        self.assertEquals(state.move1, tron.SOUTH)
+        for i in range(5):
+            game.undo_move(state)
+        self.assertEquals(state.to_move, tron.ME)
+        self.assertEquals(board.cells, before.cells)
+        self.assertEquals((board.p1, board.p2), (before.p1, before.p2))
+        self.assertEquals(board.history, [])
+
+    def test_same_move_as_aima(self):
+        for m in tronutils.list_files('cases/'):
+            board = tronboard.compact(tronutils.read_board(m))
+            game = aimatron.TronGame()
+            state = aimatron.TronState(board, tron.ME)
+            expected = self.search(4, game, state,
+                lambda s, g, c, e: games.alphabeta_search(s, g, None, c, e),
+                aimatron.eval_fn)
+            game = aimatron.TronInPlaceGame()
+            state = aimatron.InPlaceState(board.copy(), tron.ME)
+            actual = self.search(4, game, state, aimatron.inplace_alphabeta,
+                                 lambda s: aimatron.evaluate_board(s.board))
+            self.assertEquals(actual, expected, m)
+            self.assertEquals(state.board.cells, board.cells)
+
+    def assertSameValue(self, game, state, eval_fn, actual, expected, msg):
+        # Separated positions are worth exactly a win, loss or draw, so
+        # several moves can tie, and whichever is tried first is picked.
+        self.assertAlmostEqual(actual[1], expected[1], 7, msg)
+        move, value = self.search(6, game, state, lambda s, g, c, e:
+            aimatron.inplace_search(s, g, c, e, root_moves=[actual[0]]), eval_fn)
+        self.assertAlmostEqual(value, expected[1], 7, msg)
+
+    def test_same_move_with_table(self):
+        table = tronsearch.TranspositionTable(1 << 10)
+        for m in tronutils.list_files('cases/'):
+            board = tronboard.compact(tronutils.read_board(m))
+            game = aimatron.TronInPlaceGame()
+            eval_fn = lambda s: aimatron.evaluate_board(s.board)
+            state = aimatron.InPlaceState(board.copy(), tron.ME)
+            expected = self.search(6, game, state, aimatron.inplace_search, eval_fn)
+            table.new_search()
+            for depth in (2, 4, 6):
+                actual = self.search(depth, game, state,
+                    lambda s, g, c, e: aimatron.inplace_search(s, g, c, e, table, depth),
+                    eval_fn)
+            self.assertSameValue(game, state, eval_fn, actual, expected, m)
+            self.assertEquals(state.board.cells, board.cells)
+            self.assertTrue(table.hits > 0)
+
+    def test_same_move_with_ordering(self):
+        for m in tronutils.list_files('cases/'):
+            board = tronboard.compact(tronutils.read_board(m))
+            game = aimatron.TronInPlaceGame()
+            eval_fn = lambda s: aimatron.evaluate_board(s.board)
+            state = aimatron.InPlaceState(board.copy(), tron.ME)
+            expected = self.search(6, game, state, aimatron.inplace_search, eval_fn)
+            table = tronsearch.TranspositionTable(1 << 10)
+            ordering = tronsearch.MoveOrdering()
+            for depth in (2, 4, 6):
+                actual = self.search(depth, game, state,
+                    lambda s, g, c, e: aimatron.inplace_search(
+                        s, g, c, e, table, depth, ordering), eval_fn)
+            self.assertSameValue(game, state, eval_fn, actual, expected, m)
+            self.assertEquals(ordering.pv[0], actual[0], m)
+            self.assertEquals(state.board.cells, board.cells)
+            self.assertEquals(state.board.history, [])
+
+class StackSearchTestCase(unittest.TestCase):
+
+    def test_same_as_aima(self):
+        for m in ['maps/test-board.txt'] + tronutils.list_files('cases/'):
+            board = tronutils.read_board(m)
+            for depth in (2, 4, 6):
+                game = aimatron.TronGame()
+                state = aimatron.TronState(board, tron.ME)
+                before = utils.Struct(nodes=0, max_depth=0)
+                cutoff_fn = aimatron.make_cutoff_fn(depth, before, None, game)
+                expected = games.alphabeta_search(state, game, None, cutoff_fn,
+                                                  aimatron.eval_fn)
+                copy = tronboard.compact(board).copy()
+                stats = utils.Struct(nodes=0, max_depth=0)
+                move, value = aimatron.stack_alphabeta(copy, depth, stats)
+                self.assertEquals(move, expected, m)
+                self.assertEquals(stats.max_depth, before.max_depth)
+                # argmax searches the first move at the root twice.
+                self.assertTrue(stats.nodes < before.nodes)
+                self.assertEquals(copy.cells, tronboard.compact(board).cells)
+
+    def test_same_value_as_inplace(self):
+        board = tronboard.compact(tronutils.read_board('maps/u.txt'))
+        game = aimatron.TronInPlaceGame()
+        state = aimatron.InPlaceState(board.copy(), tron.ME)
+        stats = utils.Struct(nodes=0, max_depth=0)
+        cutoff_fn = aimatron.make_cutoff_fn(6, stats, None, game)
+        expected = aimatron.inplace_search(state, game, cutoff_fn,
+                                           lambda s: aimatron.evaluate_board(s.board))
+        self.assertEquals(aimatron.stack_alphabeta(board.copy(), 6), expected)
+
+    def test_search_returns_legal_move(self):
+        board = tronboard.compact(tronutils.read_board('cases/small-001.txt'))
+        move = aimatron.stack_alphabeta_search(board, time.time() + 0.5)
+        self.assertTrue(move in board.moves())
+
+    def test_search_stops_when_game_ends(self):
+        # Every line ends well before the deadline on a board this small.
+        board = tronboard.compact(tronutils.read_board('cases/small-002.txt'))
+        start = time.time()
+        move = aimatron.stack_alphabeta_search(board, start + 0.5)
+        self.assertTrue(move in board.moves())
+        self.assertTrue(time.time() - start < 0.25)
+
+    def test_forced_corridors(self):
+        # We can only head towards each other, until we meet.
+        board = tronboard.compact(tron.Board(10, 3, ['##########',
+                                                     '#1      2#',
+                                                     '##########']))
+        stats = utils.Struct(nodes=0, max_depth=0, reached=0)
+        move, value = aimatron.stack_alphabeta(board.copy(), 2, stats)
+        self.assertEquals(value, 0.0) # a turn in, 4 tiles each
+        stats = utils.Struct(nodes=0, max_depth=0, reached=0)
+        copy = board.copy()
+        self.assertEquals(aimatron.stack_alphabeta(copy, 2, stats, None, True),
+                          (tron.EAST, -0.5))
+        self.assertEquals(stats.max_depth, 0)
+        self.assertEquals(stats.reached, 5) # a turn, then two forced ones
+        self.assertEquals(copy.cells, board.cells)
+
+    def test_forced_takes_back_moves(self):
+        for m in tronutils.list_files('cases/'):
+            board = tronboard.compact(tronutils.read_board(m))
+            for depth in (2, 4, 6):
+                copy = board.copy()
+                stats = utils.Struct(nodes=0, max_depth=0, reached=0)
+                move, value = aimatron.stack_alphabeta(copy, depth, stats, None, True)
+                self.assertTrue(move in board.moves(), m)
+                self.assertTrue(stats.reached >= stats.max_depth)
+                self.assertEquals((copy.cells, copy.p1, copy.p2, copy.key),
+                                  (board.cells, board.p1, board.p2, board.key))
+
+class PrincipalVariationSearchTestCase(unittest.TestCase):
+
+    def search(self, board, depth, *args):
+        game = aimatron.TronInPlaceGame()
+        state = aimatron.InPlaceState(board.copy(), tron.ME)
+        stats = utils.Struct(nodes=0, max_depth=0)
+        cutoff_fn = aimatron.make_cutoff_fn(depth, stats, None, game)
+        eval_fn = lambda s: aimatron.evaluate_board(s.board)
+        return args[0](state, game, cutoff_fn, eval_fn, *args[1:])
+
+    def test_same_as_alphabeta(self):
+        for m in tronutils.list_files('cases/'):
+            board = tronboard.compact(tronutils.read_board(m))
+            expected = self.search(board, 6, aimatron.inplace_search)
+            actual = self.search(board, 6, aimatron.inplace_search, None, 6,
+                                 None, -utils.infinity, utils.infinity, True)
+            self.assertEquals(actual, expected, m)
+
+    def test_aspiration_failures(self):
+        board = tronboard.compact(tronutils.read_board('cases/trap-001.txt'))
+        expected = self.search(board, 6, aimatron.inplace_search)
+        for guess in (-1.0, expected[1], 1.0):
+            move, value, searches = self.search(board, 6,
+                aimatron.aspiration_search, tronsearch.TranspositionTable(16),
+                6, tronsearch.MoveOrdering(), guess)
+            self.assertEquals((move, value), expected)
+            self.assertEquals(searches > 1, guess != expected[1])
+
+    def test_aspiration_zero_bound(self):
+        # Failing low at 0.4 from a window around 0.5 gives a new
+        # alpha of exactly 0, which is still a bound to search with.
+        windows = []
+        values = [0.4, 0.2]
+        def search(state, game, cutoff_test, eval_fn, table, depth_limit,
+                   ordering, alpha, beta, pvs):
+            windows.append((alpha, beta))
+            return tron.NORTH, values.pop(0)
+        inplace_search = aimatron.inplace_search
+        try:
+            aimatron.inplace_search = search
+            result = aimatron.aspiration_search(None, None, None, None, None,
+                                                6, None, 0.5)
+        finally:
+            aimatron.inplace_search = inplace_search
+        self.assertEquals(result, (tron.NORTH, 0.2, 2))
+        self.assertEquals(windows[1][0], 0.0)
+
+class TimeManagerTestCase(unittest.TestCase):
+
+    def test_deadline(self):
+        clock = tronsearch.TimeManager(time.time() - 1)
+        self.assertRaises(tronsearch.TimeAlmostUp, clock.tick)
+        self.assertTrue(aimatron.TimeAlmostUp is tronsearch.TimeAlmostUp)
+
+    def test_check_interval(self):
+        clock = tronsearch.TimeManager(time.time() + 60)
+        stop = time.time() + 0.02
+        while time.time() < stop:
+            clock.tick()
+        self.assertTrue(clock.interval > 1)
+        self.assertTrue(clock.nodes > clock.interval)
+
+    def test_prediction(self):
+        clock = tronsearch.TimeManager()
+        self.assertTrue(clock.completed(2, 10, tron.NORTH))
+        self.assertEquals(clock.branching(), tronsearch.GROWTH)
+        self.assertTrue(clock.completed(4, 40, tron.NORTH))
+        self.assertEquals(clock.branching(), 4.0)
+        clock = tronsearch.TimeManager(time.time() + 0.05)
+        clock.completed(2, 100, tron.NORTH)
+        time.sleep(0.02)
+        self.assertFalse(clock.completed(4, 400, tron.EAST))
+        self.assertTrue(0 < clock.saved < 0.05)
+
+    def stable_clock(self, moves):
+        clock = tronsearch.TimeManager(time.time() + 0.12)
+        for depth, move in enumerate(moves):
+            clock.completed(depth, 30 * 3 ** depth, move)
+        time.sleep(0.02)
+        return clock.completed(len(moves), 30 * 3 ** len(moves), tron.EAST)
+
+    def test_stable_move(self):
+        self.assertFalse(self.stable_clock([tron.EAST, tron.EAST, tron.EAST]))
+        self.assertTrue(self.stable_clock([tron.WEST, tron.EAST, tron.EAST]))
+
+    def test_search_on_time(self):
+        board = tronboard.compact(tronutils.read_board('maps/huge-room.txt'))
+        for search in (aimatron.inplace_alphabeta_search,
+                       lambda board, finish_by: aimatron.inplace_alphabeta_search(
+                           board, finish_by, pvs=True),
+                       simsearch.simultaneous_search):
+            finish_by = time.time() + 0.1
+            move = search(board, finish_by)
+            self.assertTrue(move in board.moves())
+            self.assertTrue(time.time() < finish_by + 0.01)
+
+class ParallelSearchTestCase(unittest.TestCase):
+
+    def test_best_result(self):
+        found = {tron.NORTH: [(2, 0.5, True, False), (4, 0.25, True, False)],
+                 tron.EAST: [(2, 0.0, False, True)],
+                 tron.SOUTH: [(2, 0.5, False, False)]}
+        self.assertEquals(aimatron.best_parallel_result(found),
+                          (tron.NORTH, 2, 0.5))
+        found[tron.SOUTH].append((4, 0.75, True, False))
+        self.assertEquals(aimatron.best_parallel_result(found),
+                          (tron.SOUTH, 4, 0.75))
+        found[tron.WEST] = []
+        self.assertEquals(aimatron.best_parallel_result(found), None)
+
+    def test_parallel_search(self):
+        try:
+            workers = aimatron.start_workers(2)
+            for m in ('cases/trap-001.txt', 'cases/small-001.txt'):
+                board = tronboard.compact(tronutils.read_board(m))
+                finish_by = time.time() + 0.2
+                move = aimatron.parallel_search(board, finish_by)
+                self.assertTrue(move in board.moves())
+                self.assertTrue(time.time() < finish_by + 0.05)
+            self.assertTrue(aimatron.start_workers() is workers)
+            self.assertEquals(workers.turn, 2)
+        finally:
+            aimatron.stop_workers()
+        self.assertEquals(aimatron.workers, None)
+
+class PonderTestCase(unittest.TestCase):
+
+    def test_ponder_and_seed(self):
+        board = tronboard.compact(tronutils.read_board('cases/empty-room-001.txt'))
+        before = board.copy()
+        table = tronsearch.TranspositionTable(1 << 12)
+        ordering = tronsearch.MoveOrdering()
+        ponderer = aimatron.Ponderer(table, ordering)
+        move = board.moves()[0]
+        ordering.history = {(tron.ME, board.p1, tron.NORTH): 8}
+        ponderer.start(board, move)
+        time.sleep(0.1)
+        start = time.time()
+        ponderer.stop()
+        self.assertTrue(time.time() - start < 0.05)
+        self.assertEquals(board.cells, before.cells)
+        replies = [d for b, d in board.geometry.floor_moves(board.cells, board.p2)]
+        self.assertEquals(sorted(ponderer.results), sorted(replies))
+
+        # The next board, after they made one of the moves pondered.
+        reply = replies[0]
+        next = board.copy()
+        next.do_move(tron.ME, move)
+        next.do_move(tron.THEM, reply)
+        next.last_moves = (move, reply)
+        pondered, depth, line = ponderer.results[reply]
+        history = dict(ordering.history)
+        killers = dict(ordering.killers)
+        self.assertEquals(history[(tron.ME, board.p1, tron.NORTH)], 4)
+        self.assertEquals(ponderer.seed(next), pondered)
+        ordering.new_search(next.last_moves)
+        self.assertEquals(ordering.pv, line)
+        self.assertEquals(ordering.pv[0], pondered)
+        # What pondering found is already for this turn, as it is.
+        self.assertEquals(ordering.history, history)
+        self.assertEquals(ordering.killers, killers)
+        self.assertTrue(aimatron.inplace_alphabeta_search(
+            next, time.time() + 0.1, table, ordering) in next.moves())
+
+    def test_nothing_to_seed(self):
+        board = tronboard.compact(tronutils.read_board('cases/empty-room-001.txt'))
+        ponderer = aimatron.Ponderer(tronsearch.TranspositionTable(16),
+                                     tronsearch.MoveOrdering())
+        self.assertEquals(ponderer.seed(board), None)
+        ponderer.start(board, tron.NORTH)
+        ponderer.stop()
+        board.last_moves = (tron.SOUTH, tron.NORTH)
+        self.assertEquals(ponderer.seed(board), None)
+
+    def test_pondering_ends(self):
+        # Once every line of every board has ended, pondering stops by itself.
+        board = tronboard.compact(tronutils.read_board('cases/small-002.txt'))
+        ponderer = aimatron.Ponderer(tronsearch.TranspositionTable(1 << 10),
+                                     tronsearch.MoveOrdering())
+        ponderer.start(board, board.moves()[0])
+        ponderer.thread.join(1.0)
+        self.assertFalse(ponderer.thread.is_alive())
+        ponderer.stop()
+
+    def test_moved_along_once(self):
+        # Whether or not pondering found anything, the ordering only
+        # moves along to the next turn once.
+        board = tronboard.compact(tronutils.read_board('cases/empty-room-001.txt'))
+        ordering = tronsearch.MoveOrdering()
+        ponderer = aimatron.Ponderer(tronsearch.TranspositionTable(16), ordering)
+        ordering.history = {(tron.ME, board.p1, tron.NORTH): 8}
+        ordering.killers = {2: [tron.EAST]}
+        ponderer.start(board, board.moves()[0])
+        ponderer.stop()
+        board.last_moves = (board.moves()[0], None)
+        self.assertEquals(ponderer.seed(board), None)
+        ordering.new_search(board.last_moves)
+        self.assertEquals(ordering.pv, [])
+        self.assertEquals(ordering.history[(tron.ME, board.p1, tron.NORTH)], 4)
+        self.assertEquals(ordering.killers.get(0), [tron.EAST])
+
+class SimultaneousSearchTestCase(unittest.TestCase):
+
+    def test_same_move_as_turns(self):
+        for m in tronutils.list_files('cases/'):
+            board = tronboard.compact(tronutils.read_board(m))
+            for turns in (1, 2):
+                game = aimatron.TronInPlaceGame()
+                state = aimatron.InPlaceState(board.copy(), tron.ME)
+                stats = utils.Struct(nodes=0, max_depth=0)
+                cutoff_fn = aimatron.make_cutoff_fn(2 * turns, stats, None, game)
+                expected = aimatron.inplace_alphabeta(state, game, cutoff_fn,
+                    lambda s: aimatron.evaluate_board(s.board))
+                copy = board.copy()
+                move, value = simsearch.joint_alphabeta(copy, turns)
+                self.assertEquals(move, expected, m)
+                self.assertEquals(copy.cells, board.cells)
+
+    def test_collision(self):
+        # Both players can only move onto the same tile.
+        board = tronboard.compact(tron.Board(5, 3, ['#####', '#1 2#', '#####']))
+        self.assertEquals(simsearch.joint_alphabeta(board, 3),
+                          (tron.EAST, simsearch.COLLISION))
+
+    def test_search_returns_legal_move(self):
+        board = tronboard.compact(tronutils.read_board('cases/small-001.txt'))
+        move = simsearch.simultaneous_search(board, time.time() + 0.5)
+        self.assertTrue(move in board.moves())
+
+class MonteCarloTestCase(unittest.TestCase):
+
+    def test_avoids_walls(self):
+        for m in tronutils.list_files('cases/'):
+            board = tronboard.compact(tronutils.read_board(m))
+            if not board.geometry.floor_moves(board.cells, board.p1):
+                continue
+            move = mcts.mcts_search(board, None, 200, 1)
+            self.assertEquals(board.cells[board.p1 + board.offsets[move]],
+                              tronboard.FLOOR, m)
+
+    def test_takes_the_only_win(self):
+        # West wins, since they are boxed in a turn later; east is a collision.
+        board = tronboard.compact(tron.Board(7, 3, ['#######', '#  1 2#', '#######']))
+        self.assertEquals(mcts.mcts_search(board, None, 100, 1), tron.WEST)
+
+    def test_outcome(self):
+        self.assertEquals(mcts.outcome(None, None), mcts.COLLISION)
+        self.assertEquals(mcts.outcome(None, (1, tron.NORTH)), -1.0)
+        self.assertEquals(mcts.outcome((1, tron.NORTH), None), 1.0)
+        self.assertEquals(mcts.outcome((1, tron.NORTH), (1, tron.SOUTH)), mcts.COLLISION)
+        self.assertEquals(mcts.outcome((1, tron.NORTH), (2, tron.SOUTH)), None)
+
+    def test_stops_in_time(self):
+        board = tronboard.compact(tronutils.read_board('maps/huge-room.txt'))
+        stats = utils.Struct(playouts=0, turns=0)
+        start = time.time()
+        move = mcts.mcts_search(board, start + 0.3, None, 1, stats)
+        self.assertTrue(time.time() - start < 0.5)
+        self.assertTrue(stats.playouts > 0)
+        self.assertTrue(move in board.moves())
+
+    def test_minimax_move(self):
+        board = tronboard.compact(tron.Board(7, 3, ['#######', '#  1 2#', '#######']))
+        calls = []
+        mcts_search = mcts.mcts_search
+        try:
+            mcts.mcts_search = lambda *args: calls.append(args) or tron.WEST
+            self.assertEquals(tronmoves.minimax_move(board, None, 'mcts'), tron.WEST)
+        finally:
+            mcts.mcts_search = mcts_search
+        self.assertEquals(calls, [(board, None)])
+        self.assertRaises(ValueError, tronmoves.minimax_move, board, None, 'nope')
+
+class EndgameTestCase(unittest.TestCase):
+
+    def board(self, lines):
+        return tronboard.compact(tron.Board(len(lines[0]), len(lines), lines))
+
+    def longest(self, cells, geometry, i):
+        best = 0
+        for j in geometry.neighbors[i]:
+            if cells[j] == tronboard.FLOOR:
+                cells[j] = tronboard.WALL
+                best = max(best, 1 + self.longest(cells, geometry, j))
+                cells[j] = tronboard.FLOOR
+        return best
+
+    def test_fill_bound(self):
+        board = self.board(['#######',
+                            '#1    #',
+                            '#######',
+                            '2######'])
+        self.assertEquals(endgame.fill_bound(board.cells, board.geometry, board.p1), 4)
+        # Two chambers on either side of the start: only one can be used.
+        board = self.board(['#########',
+                            '#   1   #',
+                            '#   #   #',
+                            '#########',
+                            '2########'])
+        self.assertEquals(endgame.fill_bound(board.cells, board.geometry, board.p1), 6)
+        # Three tiles of one color and one of the other can't all be used.
+        board = self.board(['#####',
+                            '## ##',
+                            '# 1 #',
+                            '## ##',
+                            '####2'])
+        self.assertEquals(endgame.fill_bound(board.cells, board.geometry, board.p1), 1)
+
+    def test_may_split(self):
+        board = self.board(['#####',
+                            '#   #',
+                            '#   #',
+                            '## ##',
+                            '#1 2#',
+                            '#####'])
+        rings = endgame.ring(board.geometry)
+        self.assertFalse(endgame.may_split(board.cells, rings[6]))
+        self.assertTrue(endgame.may_split(board.cells, rings[17]))
+
+    def test_longest_fill(self):
+        # Compare with trying every path, on small random boards.
+        r = random.Random(2)
+        for n in range(50):
+            lines = [''.join((y in (0, 5) or x in (0, 6) or r.random() < 0.25)
+                             and '#' or ' ' for x in range(7)) for y in range(6)]
+            y, x = r.randrange(1, 5), r.randrange(1, 6)
+            lines[y] = lines[y][:x] + '1' + lines[y][x+1:]
+            lines[0] = '2' + lines[0][1:]
+            board = self.board(lines)
+            longest = self.longest(bytearray(board.cells), board.geometry, board.p1)
+            bound = endgame.fill_bound(board.cells, board.geometry, board.p1)
+            moves, proven = endgame.longest_fill(board)
+            self.assertTrue(bound >= longest, lines)
+            self.assertEquals(len(moves), longest, lines)
+            self.assertTrue(proven)
+            for move in moves:
+                self.assertTrue(move in board.moves())
+                board.do_move(tron.ME, move)
+
+    def test_big_fill(self):
+        board = tronboard.compact(tronutils.read_board('maps/huge-room.txt'))
+        moves, proven = endgame.longest_fill(board, time.time() + 1.0)
+        self.assertEquals(len(moves), board.floor_count - 1) # them
+        self.assertTrue(proven)
+
+    def test_planner(self):
+        board = tronboard.compact(tronutils.read_board('maps/u.txt'))
+        planner = endgame.FillPlanner()
+        move = planner.move(board)
+        plan = list(planner.plan)
+        self.assertTrue(planner.proven)
+        self.assertEquals(len(plan), 96)
+        board.do_move(tron.ME, move)
+        self.assertTrue(planner.follows(board))
+        self.assertEquals(planner.move(board), plan[0])
+        self.assertEquals(planner.plan, plan[1:])
+        board.do_move(tron.ME, plan[0])
+
+        # Fill in a tile the plan goes through, so it has to plan again.
+        i = board.p1
+        for move in plan[1:40]:
+            i += board.offsets[move]
+        board.cells[i] = tronboard.WALL
+        self.assertFalse(planner.follows(board))
+        move = planner.move(board)
+        self.assertTrue(move in board.moves())
+        self.assertNotEquals(planner.plan, plan[2:])
+
+    def test_planner_extends_with_time_left(self):
+        board = tronboard.compact(tronutils.read_board('maps/u.txt'))
+        planner = endgame.FillPlanner()
+        board.do_move(tron.ME, planner.move(board))
+        searches = planner.searches
+        plan = list(planner.plan)
+
+        # Taken as not proven, the plan is only followed without time.
+        planner.proven = False
+        board.do_move(tron.ME, planner.move(board, time.time() + 0.01))
+        self.assertEquals(planner.searches, searches)
+        self.assertFalse(planner.proven)
+        self.assertEquals(planner.plan, plan[1:])
+        planner.move(board, time.time() + 1.0)
+        self.assertEquals(planner.searches, searches + 1)
+        self.assertTrue(planner.proven)
+
+    def test_planner_out_of_time(self):
+        board = tronboard.compact(tronutils.read_board('maps/u.txt'))
+        board.cells[board.p1 + board.offsets[tron.NORTH]] = tronboard.WALL
+        planner = endgame.FillPlanner()
+        move = planner.move(board, time.time() - 1.0)
+        self.assertEquals(planner.plan, [])
+        self.assertTrue(move in board.moves())
+
+    def test_recursion_limit(self):
+        limit = sys.getrecursionlimit()
+        board = tronboard.compact(tronutils.read_board('maps/huge-room.txt'))
+        try:
+            sys.setrecursionlimit(1000)
+            endgame.longest_fill(board, time.time() + 0.1)
+            self.assertEquals(sys.getrecursionlimit(), 1000)
+        finally:
+            sys.setrecursionlimit(limit)
+
+class TranspositionTableTestCase(unittest.TestCase):
+
+    def test_store_and_probe(self):
+        table = tronsearch.TranspositionTable(16)
+        self.assertEquals(table.probe(5), None)
+        table.store(5, 3, 0.5, tronsearch.EXACT, tron.NORTH)
+        self.assertEquals(table.probe(5)[:5], (5, 3, 0.5, tronsearch.EXACT, tron.NORTH))
+        self.assertEquals((table.hits, table.misses), (1, 1))
+
+    def test_replacement(self):
+        table = tronsearch.TranspositionTable(16)
+        table.store(1, 4, 0.0, tronsearch.EXACT)
+        table.store(17, 2, 0.0, tronsearch.EXACT) # same slot, shallower
+        table.store(33, 1, 0.0, tronsearch.EXACT) # replaces the recent one
+        self.assertNotEquals(table.probe(1), None)
+        self.assertEquals(table.probe(17), None)
+        self.assertNotEquals(table.probe(33), None)
+        table.store(49, 6, 0.0, tronsearch.EXACT) # deeper, pushes 1 down
+        self.assertNotEquals(table.probe(49), None)
+        self.assertNotEquals(table.probe(1), None)
+        self.assertEquals(table.probe(33), None)
+        table.new_search()
+        table.store(65, 1, 0.0, tronsearch.EXACT) # old entries give way
+        self.assertEquals(table.probe(65)[1], 1)
+        self.assertEquals(table.used(), 2)
+
+    def test_replacement_same_key(self):
+        table = tronsearch.TranspositionTable(16)
+        table.store(1, 4, 0.5, tronsearch.EXACT)
+        table.store(1, 2, 0.25, tronsearch.LOWER) # shallower, kept aside
+        self.assertEquals(table.deep[1][1:4], (4, 0.5, tronsearch.EXACT))
+        self.assertEquals(table.recent[1][1:4], (2, 0.25, tronsearch.LOWER))
+        table.store(1, tronsearch.COMPLETE, 1.0, tronsearch.EXACT)
+        self.assertEquals(table.probe(1)[1:4], (tronsearch.COMPLETE, 1.0, tronsearch.EXACT))
+        self.assertEquals(table.recent[1][1], 2)
+        table.new_search()
+        table.store(1, 1, 0.0, tronsearch.UPPER) # left over, so replaced
+        self.assertEquals(table.probe(1)[1], 1)
+
+    def test_ordering(self):
+        board = tronboard.compact(tronutils.read_board('maps/empty-room.txt'))
+        state = aimatron.InPlaceState(board, tron.ME)
+        ordering = tronsearch.MoveOrdering()
+        moves = [tron.NORTH, tron.EAST, tron.SOUTH, tron.WEST]
+        ordering.cutoff(state, tron.WEST, [], 4)
+        ordering.cutoff(state, tron.SOUTH, [], 2)
+        self.assertEquals(ordering.order(state, list(moves), []),
+                          [tron.SOUTH, tron.WEST, tron.NORTH, tron.EAST])
+        self.assertEquals(ordering.order(state, list(moves), [], tron.EAST)[0],
+                          tron.EAST)
+        ordering.pv = [tron.NORTH, tron.SOUTH, tron.EAST]
+        self.assertEquals(ordering.order(state, list(moves), [], tron.EAST)[0],
+                          tron.NORTH)
+        ordering.new_search((tron.NORTH, tron.SOUTH))
+        self.assertEquals(ordering.pv, [tron.EAST])
+        self.assertEquals(ordering.killers, {})
+        self.assertEquals(ordering.history[tron.ME, board.p1, tron.WEST], 8)
+        ordering.new_search((tron.NORTH, tron.NORTH))
+        self.assertEquals(ordering.pv, [])
+
+    def test_lookup_bounds(self):
+        table = tronsearch.TranspositionTable(16)
+        table.store(1, 4, 0.5, tronsearch.LOWER)
+        self.assertEquals(table.lookup(1, 4, -1.0, 0.25)[1], 0.5)
+        self.assertEquals(table.lookup(1, 4, -1.0, 0.75)[1], None)
+        self.assertEquals(table.lookup(1, 6, -1.0, 0.25)[1], None)
+        table.store(2, 4, -0.5, tronsearch.UPPER)
+        self.assertEquals(table.lookup(2, 2, -0.25, 1.0)[1], -0.5)
+        self.assertEquals(table.lookup(2, 2, -0.75, 1.0)[1], None)
+        self.assertEquals(table.cutoffs, 2)
+
+    def test_open_cutoffs(self):
+        # Only cutoffs above the depth limit, by entries that weren't
+        # complete, could have hidden a line going deeper.
+        table = tronsearch.TranspositionTable(16)
+        table.store(1, 4, 0.5, tronsearch.EXACT)
+        table.store(2, tronsearch.COMPLETE, 1.0, tronsearch.EXACT)
+        table.store(3, 0, 0.25, tronsearch.EXACT)
+        self.assertEquals(table.lookup(1, 2, -1.0, 1.0)[1], 0.5)
+        self.assertEquals(table.lookup(2, 8, -1.0, 1.0)[1], 1.0)
+        self.assertEquals(table.lookup(3, 0, -1.0, 1.0)[1], 0.25)
+        self.assertEquals((table.cutoffs, table.open_cutoffs), (3, 1))
+
+    def test_complete_search(self):
+        # Once every line ends before the depth limit, the root's
+        # children are all complete, and searching deeper visits
+        # nothing below them.
+        board = tronboard.compact(tronutils.read_board('cases/small-002.txt'))
+        game = aimatron.TronInPlaceGame()
+        state = aimatron.InPlaceState(board, tron.ME)
+        eval_fn = lambda s: aimatron.evaluate_board(s.board)
+        table = tronsearch.TranspositionTable(1 << 10)
+        stats = utils.Struct(nodes=0, max_depth=0)
+        cutoff_fn = aimatron.make_cutoff_fn(40, stats, None, game)
+        move, value = aimatron.inplace_search(state, game, cutoff_fn, eval_fn,
+                                              table, 40)
+        self.assertTrue(stats.max_depth < 40)
+        stats = utils.Struct(nodes=0, max_depth=0)
+        cutoff_fn = aimatron.make_cutoff_fn(80, stats, None, game)
+        self.assertEquals(aimatron.inplace_search(state, game, cutoff_fn, eval_fn,
+                                                  table, 80), (move, value))
+        self.assertEquals(stats.max_depth, 0)
+        self.assertEquals(table.open_cutoffs, 0)
+
 #_____________________________________________________________________
 # Shortest Path Tests
 #
@@ -315,6 +1615,145 @@ class EnvironmentRecognitionTestCase(unittest.TestCase):
         self.assertTrue((24,25) in points)
         self.assertTrue((25,24) in points)
 
+#_____________________________________________________________________
+# Frame Reader Tests
+#
+
+class FrameReaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.files = []
+
+    def tearDown(self):
+        for f in self.files:
+            f.close()
+
+    def input_fd(self, *texts):
+        f = tempfile.TemporaryFile()
+        f.write(''.join(texts))
+        f.seek(0)
+        self.files.append(f)
+        return f.fileno()
+
+    def map_text(self, filename):
+        return open(filename).read()
+
+    def test_read_frames(self):
+        maps = ['maps/u.txt', 'cases/u-001.txt', 'maps/huge-room.txt']
+        fd = self.input_fd(*[self.map_text(m) for m in maps])
+        reader = tronio.FrameReader(fd, chunk_size=37)
+        board = None
+        for m in maps:
+            expected = tronutils.read_board(m)
+            next = reader.read(board)
+            self.assertEquals(next.board, expected.board[:expected.height])
+            self.assertEquals(next.me(), expected.me())
+            self.assertEquals(next.them(), expected.them())
+            if board and board.width == next.width:
+                self.assertTrue(next is board, 'should fill in place')
+            board = next
+        self.assertEquals(reader.read(board), None)
+
+    def test_generate(self):
+        fd = self.input_fd(self.map_text('maps/u.txt'),
+                           self.map_text('cases/u-001.txt'), '\n')
+        boards = [(b, b.board) for b in tronio.generate(fd)]
+        self.assertEquals(len(boards), 2)
+        self.assertTrue(boards[0][0] is boards[1][0], 'should be reused')
+        self.assertEquals(boards[0][1], tronutils.read_board('maps/u.txt').board)
+        self.assertEquals(boards[1][1], tronutils.read_board('cases/u-001.txt').board)
+
+    def test_long_rows(self):
+        fd = self.input_fd('6 4\n######\n#1# 2# \n#   ##\r\n######\n')
+        board = tronio.FrameReader(fd).read()
+        self.assertEquals(board.board, tronutils.read_board('maps/test-board.txt').board)
+
+    def frame_text(self, board):
+        rows = ''.join('%s\n' % row for row in board.board)
+        return '%d %d\n%s' % (board.width, board.height, rows)
+
+    def test_incremental_update(self):
+        board = tronboard.compact(tronutils.read_board('maps/trix.txt'))
+        moves = [(tron.EAST, tron.WEST), (tron.SOUTH, tron.NORTH),
+                 (tron.SOUTH, tron.NORTH), (tron.WEST, tron.EAST)]
+        frames = [self.frame_text(board)]
+        for m1, m2 in moves:
+            board.do_move(tron.ME, m1)
+            board.do_move(tron.THEM, m2)
+            frames.append(self.frame_text(board))
+        fd = self.input_fd(*frames)
+        reader = tronio.FrameReader(fd)
+        next = reader.read()
+        self.assertEquals(next.last_moves, None)
+        next.labels() # so that they have to be kept up to date
+        for m, frame in zip(moves, frames[1:]):
+            next = reader.read(next)
+            expected = tronio.FrameReader(self.input_fd(frame)).read()
+            self.assertEquals(next.last_moves, m)
+            self.assertEquals(next.cells, expected.cells)
+            self.assertEquals((next.p1, next.p2), (expected.p1, expected.p2))
+            self.assertEquals(next.floor_count, expected.floor_count)
+            self.assertEquals(next.key, expected.key)
+            self.assertEquals([l >= 0 for l in next.labels()],
+                              [l >= 0 for l in expected.labels()])
+            for i in xrange(len(next.cells)):
+                self.assertEquals(next.region_size(i), expected.region_size(i))
+            self.assertEquals(next.connected(), expected.connected())
+
+    def test_update_from_scratch(self):
+        board = tronboard.compact(tronutils.read_board('maps/u.txt'))
+        other = tronboard.compact(tronutils.read_board('cases/u-001.txt'))
+        self.assertFalse(board.update(other.cells))
+        self.assertEquals(board.cells, other.cells)
+        self.assertEquals(board.me(), other.me())
+        self.assertEquals(board.last_moves, None)
+        self.assertEquals(board.floor_count, other.floor_count)
+
+    def test_invalid_input(self):
+        stderr = sys.stderr
+        sys.stderr = StringIO.StringIO()
+        try:
+            for text in ('6 4\n######\n#1# 2#\n', '6 4\n#1# 2#\n',
+                         'garbage\n'):
+                fd = self.input_fd(text)
+                self.assertRaises(SystemExit, list, tronio.generate(fd))
+        finally:
+            sys.stderr = stderr
+
+#_____________________________________________________________________
+# NumPy Distance Array Tests
+#
+
+@unittest.skipIf(tronarrays.numpy is None, 'numpy is not installed')
+class DistanceArrayTestCase(unittest.TestCase):
+
+    def test_distance_arrays(self):
+        for m in tronutils.list_files('maps/'):
+            board = tronutils.read_board(m)
+            d1, d2 = tronarrays.distance_arrays(board)
+            for d, coords in ((d1, board.me()), (d2, board.them())):
+                dmap = tronutils.distance_map(board, coords)
+                self.assertEquals((d >= 0).sum(), len(dmap), m)
+                for (y, x) in dmap:
+                    self.assertEquals(d[y, x], dmap[(y, x)], m)
+
+    def test_same_distance(self):
+        for m in tronutils.list_files('maps/'):
+            board = tronutils.read_board(m)
+            me, them = board.me(), board.them()
+            points = tronarrays.same_distance(board, me, them)
+            self.assertEquals(set(points),
+                              set(MyTronBot.same_distance(board, me, them)), m)
+            dmap = tronutils.distance_map(board, me)
+            self.assertEquals([dmap[p] for p in points],
+                              sorted(dmap[p] for p in points), m)
+
+    def test_territory(self):
+        board = tronutils.read_board('maps/test-board.txt')
+        self.assertEquals(tronarrays.territory(board), (2, 2))
+        board = tronutils.read_board('cases/trap-001.txt')
+        self.assertEquals(tronarrays.territory(board), (24, 4))
+
 #_____________________________________________________________________
 # Run tests if script.
 #
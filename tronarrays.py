@@ -0,0 +1,100 @@
+# tronarrays: NumPy distance maps and Voronoi regions for a TronBot.
+# Copyright (C) 2010 Corey Abshire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# NumPy is optional. The contest servers do not have it, so callers
+# should check tronarrays.numpy and fall back on the tronutils
+# versions of these routines when it is None.
+
+import tron, tronboard
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#_____________________________________________________________________
+# Board Arrays
+#
+
+# Distance given to tiles a player cannot reach at all.
+UNREACHABLE = -1
+
+def grid(board):
+    "Return the tiles of the board as a (height, width) uint8 array."
+    cells = tronboard.flatten(board)
+    tiles = numpy.frombuffer(str(cells), dtype=numpy.uint8)
+    return tiles.reshape(board.height, board.width)
+
+def distance_array(floor, coords):
+    "Find the distance to each floor tile from coords, as an int16 array."
+    # Each pass moves the whole edge of the search one step out, so
+    # this takes one pass per step rather than one per tile. The edge
+    # lives inside a border of False, so that its neighbors in each
+    # direction are just slices of the same array.
+    h, w = floor.shape
+    dist = numpy.empty((h, w), dtype=numpy.int16)
+    dist.fill(UNREACHABLE)
+    dist[coords] = 0
+    padded = numpy.zeros((h + 2, w + 2), dtype=bool)
+    edge = padded[1:-1, 1:-1]
+    edge[coords] = True
+    remaining = floor.copy()
+    d = 0
+    while True:
+        near = padded[:-2, 1:-1] | padded[2:, 1:-1]
+        near |= padded[1:-1, :-2]
+        near |= padded[1:-1, 2:]
+        near &= remaining
+        if not near.any():
+            return dist
+        d += 1
+        remaining ^= near
+        dist[near] = d
+        edge[...] = near
+
+def distance_arrays(board):
+    "Find the distance arrays for both players on the board."
+    floor = grid(board) == tronboard.FLOOR
+    return distance_array(floor, board.me()), distance_array(floor, board.them())
+
+#_____________________________________________________________________
+# Board Analysis
+#
+
+def equidistant(d1, d2):
+    "Find the tiles both players can reach in the same number of moves."
+    return (d1 > 0) & (d1 == d2)
+
+def voronoi(d1, d2):
+    "Split the floor into the tiles each player reaches strictly first."
+    reach1, reach2 = d1 > 0, d2 > 0
+    mine = reach1 & (~reach2 | (d1 < d2))
+    theirs = reach2 & (~reach1 | (d2 < d1))
+    return mine, theirs
+
+def territory(board):
+    "Count the tiles each player would reach first."
+    mine, theirs = voronoi(*distance_arrays(board))
+    return int(mine.sum()), int(theirs.sum())
+
+def same_distance(board, a, b):
+    "Return all points equidistant from a and b (like tronutils.same_distance)."
+    floor = grid(board) == tronboard.FLOOR
+    m = distance_array(floor, a)
+    same = equidistant(m, distance_array(floor, b))
+    ys, xs = numpy.nonzero(same)
+    order = numpy.argsort(m[ys, xs], kind='mergesort')
+    return [(int(ys[i]), int(xs[i])) for i in order]
@@ -0,0 +1,449 @@
+# tronboard: Compact board representation for a TronBot.
+# Copyright (C) 2010 Corey Abshire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import itertools, operator, random, tron
+
+#_____________________________________________________________________
+# Constants and Enumerations
+#
+
+# Byte values of the tiles. These are the same characters the engine
+# sends, so rows can be copied straight into the board from a map.
+FLOOR = ord(tron.FLOOR)
+WALL  = ord(tron.WALL)
+ME    = ord(tron.ME)
+THEM  = ord(tron.THEM)
+
+# Table for translate that turns walls into 1 and other tiles into 0.
+WALL_MASK = ''.join(chr(c == WALL) for c in xrange(256))
+
+# Random 64-bit keys for the parts of a search state that are not on
+# the board: whose turn it is, and the first half of a joint move
+# that has been chosen but not made yet (indexed by direction).
+_keys = random.Random(0)
+THEM_TO_MOVE_KEY = _keys.getrandbits(64)
+PENDING_KEYS = [0] + [_keys.getrandbits(64) for d in tron.DIRECTIONS]
+del _keys
+
+#_____________________________________________________________________
+# Board Geometry
+#
+
+class Geometry():
+    "Neighbor tables shared by all boards of one width and height."
+
+    # For each tile index i, moves[i] lists the tiles next to it that
+    # are on the board, as (index, direction) pairs in the order of
+    # tron.DIRECTIONS, and neighbors[i] lists just their indices.
+    # Working these out once per board size takes the bounds checks
+    # and direction arithmetic out of the inner loops of the graph
+    # routines, which only have to look at the tile values.
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.size = width * height
+        self.coords = [divmod(i, width) for i in xrange(self.size)]
+        steps = ((tron.NORTH, -1, 0), (tron.EAST, 0, 1),
+                 (tron.SOUTH, 1, 0), (tron.WEST, 0, -1))
+        self.moves = []
+        for y, x in self.coords:
+            self.moves.append(tuple(((y+dy) * width + x+dx, d)
+                                    for d, dy, dx in steps
+                                    if 0 <= y+dy < height and 0 <= x+dx < width))
+        self.neighbors = [tuple(j for j, d in m) for m in self.moves]
+
+        # Zobrist keys: one random 64-bit number for a wall on each
+        # tile, and one for each player on each tile. The key of a
+        # position is all of those that apply xored together, so it
+        # can be kept up to date by xoring in just what a move changes.
+        # The generator is seeded with the size so that keys are the
+        # same from one run to the next.
+        keys = random.Random(width << 16 | height)
+        self.wall_keys = [keys.getrandbits(64) for i in xrange(self.size)]
+        self.me_keys = [keys.getrandbits(64) for i in xrange(self.size)]
+        self.them_keys = [keys.getrandbits(64) for i in xrange(self.size)]
+
+    def index(self, coords):
+        "Translate (y, x) coordinates into a tile index."
+        y, x = coords
+        return y * self.width + x
+
+    def floor_neighbors(self, cells, i):
+        "Find the indices of the floor tiles next to tile i."
+        return [j for j in self.neighbors[i] if cells[j] == FLOOR]
+
+    def floor_moves(self, cells, i):
+        "Find the moves from tile i onto floor, as (index, direction) pairs."
+        return [(j, d) for j, d in self.moves[i] if cells[j] == FLOOR]
+
+    def fill(self, cells, roots):
+        "Find the set of floor tiles connected to the roots (and the roots)."
+        neighbors = self.neighbors
+        seen = set(roots)
+        edge = list(seen)
+        while edge:
+            i = edge.pop()
+            for j in neighbors[i]:
+                if cells[j] == FLOOR and j not in seen:
+                    seen.add(j)
+                    edge.append(j)
+        return seen
+
+    def zobrist(self, cells, p1, p2):
+        "Work out the Zobrist key of a position from scratch."
+
+        # The walls are picked out by a mask of the tiles made with
+        # translate, and their keys combined with reduce, so that the
+        # whole board is gone over in C rather than tile by tile.
+        walls = cells.translate(WALL_MASK)
+        key = reduce(operator.xor, itertools.compress(self.wall_keys, walls), 0)
+        if p1 >= 0:
+            key ^= self.me_keys[p1]
+        if p2 >= 0:
+            key ^= self.them_keys[p2]
+        return key
+
+# Geometries are shared between all the boards of the same size.
+geometries = {}
+
+def geometry(width, height):
+    "Return the Geometry for boards of the given width and height."
+    key = (width, height)
+    if key not in geometries:
+        geometries[key] = Geometry(width, height)
+    return geometries[key]
+
+#_____________________________________________________________________
+# Compact Board
+#
+
+class CompactBoard(tron.Board):
+    "A Tron board stored in a single flat bytearray."
+
+    # The tile at (y, x) lives at index y * width + x of cells. Both
+    # player positions are kept as indices and updated on every move,
+    # so finding a player never requires scanning the board. A player
+    # that has been run over in a collision has the position -1.
+
+    # Moves are made in place with do_move and taken back again with
+    # undo_move, which lets a search walk the whole game tree on one
+    # board. Each move pushes a small record on the history stack, so
+    # memory only grows with the depth of the walk.
+
+    # The board also keeps the Zobrist key of its position in key,
+    # which do_move updates from just the tiles the move changes and
+    # undo_move puts back from the history, so equal positions can be
+    # found by hashing without comparing tiles.
+
+    # Between turns, update brings the board up to date with the next
+    # frame by finding the two moves that were made, rather than
+    # loading every tile again. The moves are left in last_moves for
+    # the strategies. The labels of the floor regions are built on
+    # demand, and from then on only the regions that lose a tile are
+    # labelled again.
+
+    def __init__(self, width, height, cells, p1=None, p2=None, key=None):
+        self.width = width
+        self.height = height
+        self.cells = cells
+        self.p1 = p1 if p1 is not None else cells.find(tron.ME)
+        self.p2 = p2 if p2 is not None else cells.find(tron.THEM)
+        self.offsets = (0, -width, 1, width, -1) # indexed by direction
+        self.geometry = geometry(width, height)
+        if key is None:
+            key = self.geometry.zobrist(cells, self.p1, self.p2)
+        self.key = key
+        self.floor_count = cells.count(tron.FLOOR)
+        self.last_moves = None
+        self.history = []
+        self._labels = None
+
+    def copy(self):
+        "Return an independent copy of this board (without history)."
+        return CompactBoard(self.width, self.height, bytearray(self.cells),
+                            self.p1, self.p2, self.key)
+
+    def reset(self):
+        "Work everything out again from scratch, after cells were replaced."
+        self.p1 = self.cells.find(tron.ME)
+        self.p2 = self.cells.find(tron.THEM)
+        self.key = self.geometry.zobrist(self.cells, self.p1, self.p2)
+        self.floor_count = self.cells.count(tron.FLOOR)
+        self.last_moves = None
+        del self.history[:]
+        self._labels = None
+
+    def update(self, tiles):
+        "Bring the board up to date with the tiles of the next turn."
+
+        # Each player has moved to a tile next to where they were and
+        # left a wall behind, so only those few tiles are looked at to
+        # find the moves. A single comparison of the whole board, done
+        # in C, then makes sure that is all that changed. If it isn't,
+        # or a player can't be found, the board is loaded from scratch,
+        # unless it's the very same board again, where nothing needs to
+        # be worked out. Return whether the update was done incrementally.
+        cells = self.cells
+        if cells == tiles:
+            self.last_moves = None
+            del self.history[:]
+            return True
+        moves = []
+        for a, player in ((self.p1, ME), (self.p2, THEM)):
+            if a < 0 or tiles[a] != WALL:
+                break
+            for b, d in self.geometry.moves[a]:
+                if tiles[b] == player:
+                    moves.append((a, b, d, player))
+                    break
+        if len(moves) == 2:
+            geometry = self.geometry
+            key = self.key
+            for a, b, d, player in moves:
+                if cells[b] == FLOOR:
+                    self.floor_count -= 1
+                    self.unlabel(b)
+                elif cells[b] == WALL:
+                    key ^= geometry.wall_keys[b] # crashed into it
+                if player == ME:
+                    key ^= geometry.me_keys[a] ^ geometry.me_keys[b]
+                else:
+                    key ^= geometry.them_keys[a] ^ geometry.them_keys[b]
+                key ^= geometry.wall_keys[a]
+                cells[a] = WALL
+                cells[b] = player
+            if cells == tiles:
+                self.key = key
+                self.p1, self.p2 = moves[0][1], moves[1][1]
+                self.last_moves = (moves[0][2], moves[1][2])
+                del self.history[:]
+                return True
+        cells[:] = tiles
+        self.reset()
+        return False
+
+    def labels(self):
+        "Label every floor tile with its region, and every other tile with -1."
+        if self._labels is None:
+            self._labels = [-1] * len(self.cells)
+            self._members = {}
+            self._next_label = 0
+            self._dirty = set()
+            self.label([i for i, c in enumerate(self.cells) if c == FLOOR])
+        elif self._dirty:
+            tiles = []
+            for label in self._dirty:
+                tiles.extend(self._members.pop(label))
+            self._dirty.clear()
+            self.label(tiles)
+        return self._labels
+
+    def label(self, tiles):
+        "Give each region among the given floor tiles a new label."
+        labels = self._labels
+        for i in tiles:
+            if labels[i] >= 0 and labels[i] in self._members:
+                continue # already labelled as part of an earlier region
+            region = self.geometry.fill(self.cells, [i])
+            label = self._next_label
+            self._next_label += 1
+            self._members[label] = region
+            for j in region:
+                labels[j] = label
+
+    def unlabel(self, i):
+        "Note that the floor tile i is being filled in."
+        if self._labels is not None:
+            label = self._labels[i]
+            self._labels[i] = -1
+            self._members[label].discard(i)
+            self._dirty.add(label)
+
+    def region_size(self, i):
+        "Count the tiles in the floor region that holds tile i."
+        label = self.labels()[i]
+        if label < 0:
+            return 0
+        return len(self._members[label])
+
+    def connected(self):
+        "Determine whether the players can still reach each other."
+        if self.p1 < 0 or self.p2 < 0:
+            return False
+        if self.p2 in self.geometry.neighbors[self.p1]:
+            return True
+        labels = self.labels()
+        cells = self.cells
+        mine = set(labels[j] for j in self.geometry.floor_neighbors(cells, self.p1))
+        for j in self.geometry.floor_neighbors(cells, self.p2):
+            if labels[j] in mine:
+                return True
+        return False
+
+    @property
+    def board(self):
+        "The rows of the board as strings, just like tron.Board."
+        w = self.width
+        return [str(self.cells[i:i+w]) for i in xrange(0, len(self.cells), w)]
+
+    def __getitem__(self, coords):
+        "Retrieve the tile at the specified coordinates."
+        y, x = coords
+        if not 0 <= x < self.width or not 0 <= y < self.height:
+            return tron.WALL
+        return chr(self.cells[y * self.width + x])
+
+    def index(self, coords):
+        "Translate (y, x) coordinates into an index into cells."
+        y, x = coords
+        return y * self.width + x
+
+    def coords(self, i):
+        "Translate an index into cells back into (y, x) coordinates."
+        return divmod(i, self.width)
+
+    def me(self):
+        "Return your position on the board."
+        if self.p1 < 0:
+            raise KeyError("object '%s' is not in the board" % tron.ME)
+        return divmod(self.p1, self.width)
+
+    def them(self):
+        "Return the other player's position on the board."
+        if self.p2 < 0:
+            raise KeyError("object '%s' is not in the board" % tron.THEM)
+        return divmod(self.p2, self.width)
+
+    def find(self, obj):
+        "Find the first tile holding obj, using the tracked positions if possible."
+        if obj == tron.ME:
+            return self.me()
+        if obj == tron.THEM:
+            return self.them()
+        i = self.cells.find(obj)
+        if i < 0:
+            raise KeyError("object '%s' is not in the board" % obj)
+        return divmod(i, self.width)
+
+    def floor_adjacent(self, coords):
+        "Find the floor tiles next to coords, in the order of tron.DIRECTIONS."
+        y, x = coords
+        if not 0 <= x < self.width or not 0 <= y < self.height:
+            return [a for a in self.adjacent(coords) if self[a] == tron.FLOOR]
+        geometry = self.geometry
+        points = geometry.coords
+        cells = self.cells
+        return [points[j] for j in geometry.neighbors[y * self.width + x]
+                if cells[j] == FLOOR]
+
+    def do_move(self, player, direction):
+        "Move player one tile in direction, leaving a wall behind."
+        # The direction must lead to a tile on the board, which is
+        # always the case for moves onto floor tiles.
+        if player == tron.ME:
+            a = self.p1
+        else:
+            a = self.p2
+        if a < 0:
+            raise KeyError("object '%s' is not in the board" % player)
+        b = a + self.offsets[direction]
+        cells = self.cells
+        geometry = self.geometry
+        key = self.key
+        self.history.append((a, b, cells[b], self.p1, self.p2, key))
+        tile = cells[b]
+        if tile == FLOOR:
+            self.floor_count -= 1
+            self.unlabel(b)
+        elif tile == WALL:
+            key ^= geometry.wall_keys[b]
+        cells[a] = WALL
+        key ^= geometry.wall_keys[a]
+        if player == tron.ME:
+            cells[b] = ME
+            key ^= geometry.me_keys[a] ^ geometry.me_keys[b]
+            self.p1 = b
+            if self.p2 == b:
+                self.p2 = -1 # ran over them in a collision
+                key ^= geometry.them_keys[b]
+        else:
+            cells[b] = THEM
+            key ^= geometry.them_keys[a] ^ geometry.them_keys[b]
+            self.p2 = b
+            if self.p1 == b:
+                self.p1 = -1 # ran over me in a collision
+                key ^= geometry.me_keys[b]
+        self.key = key
+
+    def undo_move(self):
+        "Take back the last move made with do_move."
+        a, b, tile, p1, p2, key = self.history.pop()
+        cells = self.cells
+        cells[a] = cells[b]
+        cells[b] = tile
+        self.p1 = p1
+        self.p2 = p2
+        self.key = key
+        if tile == FLOOR:
+            self.floor_count += 1
+            self._labels = None # regions may have joined up again
+
+    def turn_key(self, m1, m2):
+        "Return the key after a turn where we move m1 and they move m2, onto two floor tiles."
+        # The same as do_move for both, without making either move.
+        g = self.geometry
+        a, b = self.p1, self.p2
+        c, d = a + self.offsets[m1], b + self.offsets[m2]
+        return (self.key ^ g.wall_keys[a] ^ g.me_keys[a] ^ g.me_keys[c] ^
+                g.wall_keys[b] ^ g.them_keys[b] ^ g.them_keys[d])
+
+def flatten(board):
+    "Return the tiles of any board as a flat bytearray, like CompactBoard.cells."
+    # This is the board's own bytearray for a CompactBoard, not a copy.
+    if isinstance(board, CompactBoard):
+        return board.cells
+    w, h = board.width, board.height
+    return bytearray(''.join(line[:w] for line in board.board[:h]))
+
+def floor_count(board):
+    "Count the floor tiles of any board."
+    if isinstance(board, CompactBoard):
+        return board.floor_count
+    return flatten(board).count(tron.FLOOR)
+
+def board_key(board):
+    "Return the Zobrist key of any board's position."
+    if isinstance(board, CompactBoard):
+        return board.key
+    cells = flatten(board)
+    g = geometry(board.width, board.height)
+    return g.zobrist(cells, cells.find(tron.ME), cells.find(tron.THEM))
+
+def state_key(board, to_move, move1=None):
+    "Return the Zobrist key of a search state: the board, side to move and pending move."
+    key = board_key(board)
+    if to_move == tron.THEM:
+        key ^= THEM_TO_MOVE_KEY
+    if move1:
+        key ^= PENDING_KEYS[move1]
+    return key
+
+def compact(board):
+    "Convert a tron.Board into a CompactBoard."
+    if isinstance(board, CompactBoard):
+        return board
+    return CompactBoard(board.width, board.height, flatten(board))
@@ -0,0 +1,144 @@
+# tronio: Fast reader for the board frames sent by the Tron engine.
+# Copyright (C) 2010 Corey Abshire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os, tron, tronboard
+from tron import invalid_input
+
+# How much input to ask the operating system for at a time.
+CHUNK_SIZE = 65536
+
+class FrameReader():
+    "Reads whole board frames from the engine into compact boards."
+
+    # The input is read in large chunks into one bytearray, and each
+    # frame is parsed right where it sits once all of it has arrived.
+    # A regular frame, where every row is exactly as wide as the board,
+    # is checked by looking at every (width + 1)th byte for the line
+    # ends and its tiles taken out in one go. Anything else is taken
+    # apart line by line, copying each row out of a memoryview of the
+    # buffer. Input that has been used is only dropped from the front
+    # of the buffer when the next chunk is read.
+
+    def __init__(self, fd=0, chunk_size=CHUNK_SIZE):
+        self.fd = fd
+        self.chunk_size = chunk_size
+        self.buf = bytearray()
+        self.pos = 0
+
+    def rest(self):
+        "Return the input that has been read but not used yet."
+        return str(self.buf[self.pos:])
+
+    def more(self):
+        "Read another chunk of input. Return False at the end of input."
+        data = os.read(self.fd, self.chunk_size)
+        if not data:
+            return False
+        if self.pos:
+            del self.buf[:self.pos]
+            self.pos = 0
+        self.buf += data
+        return True
+
+    def scan(self):
+        "Find the rows of the next frame, or None if they have not all arrived."
+
+        # Returns False at the end of the boards, and otherwise the
+        # dimensions, where the rows start, and where the frame ends.
+        # The row starts are None for a regular frame.
+        buf = self.buf
+        end = buf.find('\n', self.pos)
+        if end < 0:
+            return None
+        meta = str(buf[self.pos:end])
+        if not meta:
+            return False
+        dim = meta.split(' ')
+        if len(dim) != 2:
+            invalid_input("expected dimensions on first line")
+        try:
+            width, height = int(dim[0]), int(dim[1])
+        except ValueError:
+            invalid_input("malformed dimensions on first line")
+
+        start = end + 1
+        stride = width + 1
+        frame_end = start + height * stride
+        if buf[start+width:frame_end:stride] == '\n' * height:
+            return width, height, start, None, frame_end
+
+        starts = []
+        while len(starts) != height:
+            row = end + 1
+            end = buf.find('\n', row)
+            if end < 0:
+                return None
+            if end - row < width:
+                if end == row:
+                    invalid_input("unexpected EOF reading board")
+                invalid_input("malformed board")
+            starts.append(row)
+        return width, height, start, starts, end + 1
+
+    def read(self, board=None):
+        "Read the next frame into board, or a new board if it doesn't fit."
+        frame = self.scan()
+        while frame is None:
+            if not self.more():
+                if self.rest().strip():
+                    invalid_input("unexpected EOF reading board")
+                return None
+            frame = self.scan()
+        if frame is False:
+            return None
+        width, height, start, starts, self.pos = frame
+
+        if starts is None:
+            tiles = self.buf[start:self.pos]
+            del tiles[width::width+1]
+        else:
+            tiles = bytearray(width * height)
+            view = memoryview(self.buf)
+            i = 0
+            for row in starts:
+                tiles[i:i+width] = view[row:row+width]
+                i += width
+            del view # the buffer cannot grow while it is being viewed
+
+        if board is None or board.width != width or board.height != height:
+            return tronboard.CompactBoard(width, height, tiles)
+        board.update(tiles)
+        return board
+
+def generate(fd=0, reuse=True):
+    """Generate board objects, once per turn, like tron.Board.generate().
+
+    With reuse, the same board is brought up to date for every frame
+    with CompactBoard.update, so it must not be held onto from one turn
+    to the next, and board.last_moves holds the moves just made.
+    """
+
+    reader = FrameReader(fd)
+    board = None
+
+    while True:
+        board = reader.read(reuse and board or None)
+        if not board:
+            break
+        yield board
+
+    if reader.rest().strip():
+        invalid_input("garbage after last board: %s" % reader.rest())
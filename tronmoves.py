@@ -14,7 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import time, logging, games, utils, tron
+import time, logging, games, utils, tron, tronboard, bitboard, simsearch, endgame, mcts
 from tronutils import *
 from aimatron import *
 
@@ -71,7 +71,7 @@ def surrender_move(board):
 
 def most_open_move(board, order):
     "Find the move that has the most open floor filled around it."
-    p1, p2, t, touching = dfs_count_around(board)
+    p1, p2, t, touching = bitboard.dfs_count_around(board)
     wall_move = follow_wall_move(board, order)
     open_move = utils.argmax(p1.keys(), lambda k: p1[k])
     if p1[wall_move] == p1[open_move]:
@@ -82,10 +82,40 @@ def most_open_move(board, order):
     return best_move
 
 
-def minimax_move(board, finish_by=None):
+def fill_move(board, finish_by=None):
+    "Follow the longest path through the space I have left."
+    return endgame.planner.move(board, finish_by)
+
+
+def mcts_move(board, finish_by=None):
+    "Find a move with a Monte Carlo tree search of quick playouts."
+    return mcts.mcts_search(board, finish_by)
+
+
+# The searches minimax_move can use, by name, and mcts, which the bot
+# uses for the whole of the game until we are separated.
+searches = ['aima', 'inplace', 'pvs', 'stack', 'parallel', 'simultaneous',
+            'batched', 'mcts']
+
+def minimax_move(board, finish_by=None, search='aima'):
     "Find a move based on an alpha-beta search of the game tree."
-    game = TronGame()
-    return alphabeta_search(board, game, finish_by)
+    if search == 'inplace':
+        return inplace_alphabeta_search(board, finish_by)
+    if search == 'pvs':
+        return inplace_alphabeta_search(board, finish_by, pvs=True)
+    if search == 'stack':
+        return stack_alphabeta_search(board, finish_by)
+    if search == 'parallel':
+        return parallel_search(board, finish_by)
+    if search == 'simultaneous':
+        return simsearch.simultaneous_search(board, finish_by)
+    if search == 'batched':
+        return simsearch.simultaneous_search(board, finish_by, True)
+    if search == 'mcts':
+        return mcts_move(board, finish_by)
+    if search == 'aima':
+        return alphabeta_search(tronboard.compact(board), pooled_game, finish_by)
+    raise ValueError("not a valid search: %s" % search)
 
 
 def follow_path_move(board, path):
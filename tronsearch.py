@@ -0,0 +1,635 @@
+# tronsearch: Search support (transpositions, move ordering, timing) for a TronBot.
+# Copyright (C) 2010 Corey Abshire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging, sys, time, tron
+
+#_____________________________________________________________________
+# Constants and Enumerations
+#
+
+# What a value stored in the transposition table means. An alpha-beta
+# search only knows the exact value of a node when it falls inside the
+# window; otherwise it only knows a bound on it.
+EXACT = 0 # the value is exact
+LOWER = 1 # the real value is at least this (it failed high)
+UPPER = 2 # the real value is at most this (it failed low)
+
+# Depth stored for a position whose search ended before the depth
+# limit in every line, so that its value holds however deep it is
+# searched, and settles the position in every search after.
+COMPLETE = sys.maxint
+
+# Number of slots in a transposition table (each holds two entries).
+TABLE_SIZE = 1 << 16
+
+#_____________________________________________________________________
+# Transposition Table
+#
+
+class TranspositionTable():
+    "Fixed-size table of search results, keyed by Zobrist position keys."
+
+    # Each slot has two buckets. The deep bucket keeps the entry that
+    # was searched deepest, since that one saved the most work, unless
+    # it was left over from an earlier search. The recent bucket always
+    # takes whatever is stored last, and is where the deep entry goes
+    # when it is pushed out, so recent results are not lost either.
+    # That goes for a shallower result for the deep entry's own key
+    # too, which is kept beside it rather than in its place.
+    # The table never grows past its two lists of slots.
+
+    # Entries are tuples of (key, depth, value, bound, move, search),
+    # where depth is how many plies were searched below the position
+    # and search is the number of the search that stored it.
+
+    def __init__(self, size=TABLE_SIZE):
+        self.mask = size - 1
+        self.size = size
+        self.search = 0
+        self.clear()
+
+    def clear(self):
+        "Forget every stored position."
+        self.deep = [None] * self.size
+        self.recent = [None] * self.size
+        self.reset_stats()
+
+    def reset_stats(self):
+        "Start counting hits, misses and cutoffs again."
+        self.hits = 0
+        self.misses = 0
+        self.cutoffs = 0
+        self.open_cutoffs = 0
+        self.stores = 0
+
+    def new_search(self):
+        "Note that a new search is starting, so older entries may be replaced."
+        self.search += 1
+        self.reset_stats()
+
+    def probe(self, key):
+        "Find the entry for key, or None if the position is not stored."
+        i = key & self.mask
+        entry = self.deep[i]
+        if entry is None or entry[0] != key:
+            entry = self.recent[i]
+            if entry is None or entry[0] != key:
+                self.misses += 1
+                return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, value, bound, move=None):
+        "Remember the result of searching the position key depth plies."
+        i = key & self.mask
+        entry = (key, depth, value, bound, move, self.search)
+        deep = self.deep[i]
+        self.stores += 1
+        if deep is None:
+            self.deep[i] = entry
+        elif depth >= deep[1] or deep[5] != self.search:
+            self.deep[i] = entry
+            if deep[0] != key:
+                self.recent[i] = deep
+        else:
+            self.recent[i] = entry
+
+    def lookup(self, key, depth, alpha, beta):
+        "Return the stored entry and its value if it settles this node, else just the entry."
+
+        # The value settles the node if it was searched at least as
+        # deep, and is exact or a bound that falls outside the window.
+        # Cutoffs that skip plies the search would have gone on to the
+        # depth limit in are also counted as open, unless the entry is
+        # COMPLETE, so there were no such plies to skip.
+        entry = self.probe(key)
+        if entry is not None and entry[1] >= depth:
+            value, bound = entry[2], entry[3]
+            if (bound == EXACT or
+                (bound == LOWER and value >= beta) or
+                (bound == UPPER and value <= alpha)):
+                self.cutoffs += 1
+                if depth > 0 and entry[1] != COMPLETE:
+                    self.open_cutoffs += 1
+                return entry, value
+        return entry, None
+
+    def used(self):
+        "Count the entries in the table."
+        return (len(self.deep) - self.deep.count(None) +
+                len(self.recent) - self.recent.count(None))
+
+    def report(self):
+        "Describe the hit, miss and cutoff counts in one line."
+        probes = max(self.hits + self.misses, 1)
+        return ('tt %d hits (%0.1f%%), %d misses, %d cutoffs, %d stores' %
+                (self.hits, 100.0 * self.hits / probes, self.misses,
+                 self.cutoffs, self.stores))
+
+def bound(value, alpha, beta):
+    "Work out what kind of value a search with window (alpha, beta) returned."
+    if value <= alpha:
+        return UPPER
+    if value >= beta:
+        return LOWER
+    return EXACT
+
+#_____________________________________________________________________
+# Move Ordering
+#
+
+# Scores that put the principal variation and table moves ahead of
+# the killer moves, and those ahead of anything history has to say.
+PV_SCORE = 1 << 30
+HASH_SCORE = 1 << 29
+KILLER_SCORE = 1 << 28
+
+# How many killer moves to keep for each ply.
+KILLERS = 2
+
+class MoveOrdering():
+    "Orders the moves tried at each node, to get the most out of alpha-beta."
+
+    # Moves are tried in this order. First comes the move the last
+    # iteration's principal variation (pv) made at this ply, as long
+    # as the search is still following that variation. Next is the
+    # best move from the transposition table, then the killer moves
+    # that caused a cutoff at the same ply elsewhere in the tree, and
+    # then the rest by their history score. The history scores count
+    # how often each player moving from a given tile in a given
+    # direction caused a cutoff, weighted by the depth below it.
+
+    # History, killers and the pv are all kept between iterations, and
+    # between turns new_search moves them along by the turn just made.
+    # Pondering moves them along ahead of time instead (see seed), so
+    # that they are only moved along once a turn.
+
+    def __init__(self):
+        self.pv = []
+        self.killers = {}
+        self.history = {}
+        self.nodes = []
+        self.seeded = False
+
+    def new_search(self, last_moves=None):
+        "Get ready to search a new turn, after last_moves were made."
+
+        # The pv still applies if both players made the moves it
+        # predicted. Killers are shifted up the two plies of the turn
+        # and the history scores are halved so that they can adapt.
+        # A seeded ordering is already at this turn, pv and all.
+        if self.seeded:
+            self.seeded = False
+        else:
+            if last_moves and tuple(self.pv[:2]) == tuple(last_moves):
+                self.pv = self.pv[2:]
+            else:
+                self.pv = []
+            self.killers = dict((ply - 2, k) for ply, k in self.killers.iteritems()
+                                if ply >= 2)
+            for h in self.history:
+                self.history[h] >>= 1
+        self.nodes = []
+
+    def seed(self, pv=None):
+        "Move along to the next turn ahead of its search, which is then to start with pv."
+        if not self.seeded:
+            self.new_search()
+            self.seeded = True
+        self.pv = list(pv or [])
+
+    def order(self, state, moves, path, hash_move=None):
+        "Sort the moves available in state, reached by the moves in path."
+        ply = len(path)
+        pv_move = None
+        if ply < len(self.pv) and self.pv[:ply] == path:
+            pv_move = self.pv[ply]
+        killers = self.killers.get(ply, ())
+        history = self.history
+        player, tile = state.to_move, position(state)
+        def score(move):
+            if move == pv_move:
+                return PV_SCORE
+            if move == hash_move:
+                return HASH_SCORE
+            if move in killers:
+                return KILLER_SCORE - killers.index(move)
+            return history.get((player, tile, move), 0)
+        moves.sort(key=score, reverse=True)
+        return moves
+
+    def cutoff(self, state, move, path, depth):
+        "Note that move caused a cutoff with depth plies searched below it."
+        ply = len(path)
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[KILLERS:]
+        h = (state.to_move, position(state), move)
+        self.history[h] = self.history.get(h, 0) + depth * depth
+
+    def branching(self):
+        "Estimate the effective branching factor (per ply) of the last iteration."
+        # Iterations deepen by a whole turn, which is two plies.
+        if len(self.nodes) < 2 or not self.nodes[-2]:
+            return 0.0
+        return (float(self.nodes[-1]) / self.nodes[-2]) ** 0.5
+
+def position(state):
+    "Return the tile index of the player to move in state."
+    if state.to_move == tron.ME:
+        return state.board.p1
+    return state.board.p2
+
+#_____________________________________________________________________
+# Evaluation Cache
+#
+
+# Number of evaluations an EvalCache holds.
+EVAL_CACHE_SIZE = 1 << 17
+
+class EvalCache():
+    "Bounded cache of board evaluations that lasts the whole game."
+
+    # Evaluations only depend on the board, so any search that gets
+    # to the same position, this turn or a later one, can use the
+    # same value. Values are found by Zobrist key through a dict, and
+    # kept in a fixed number of slots that are reused with the clock
+    # algorithm: the hand goes around the slots, passing over (and
+    # clearing) the used flag of each one that was hit since it last
+    # came by, and takes the first one that wasn't.
+
+    # Every turn fills in two more tiles, so positions with more floor
+    # than the board of the current turn can't come up again. Rather
+    # than finding and dropping those, new_turn just notes how much
+    # floor is left, and the hand takes their slots right away.
+
+    # Each value can be flagged as settled, for a position whose value
+    # is known to be its final one, so the searches can tell those
+    # apart without working it out again.
+
+    def __init__(self, size=EVAL_CACHE_SIZE):
+        self.size = size
+        self.clear()
+
+    def clear(self):
+        "Forget every evaluation."
+        self.slots = {}
+        self.keys = [None] * self.size
+        self.values = [0.0] * self.size
+        self.floors = [0] * self.size
+        self.used = bytearray(self.size)
+        self.flags = bytearray(self.size)
+        self.hand = 0
+        self.floor = sys.maxint
+        self.reset_stats()
+
+    def reset_stats(self):
+        "Start counting hits, misses and evictions again."
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.expired = 0
+
+    def new_turn(self, floor):
+        "Note that a turn has started with floor tiles left on the board."
+        self.floor = floor
+        self.reset_stats()
+
+    def get(self, key):
+        "Find the value stored for key, or None if there isn't one."
+        i = self.slots.get(key)
+        if i is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.used[i] = 1
+        return self.values[i]
+
+    def settled(self, key):
+        "Determine whether the value stored for key was flagged as settled."
+        i = self.slots.get(key)
+        return i is not None and self.flags[i] == 1
+
+    def put(self, key, value, floor, settled=False):
+        "Store the value of a position with floor tiles left."
+
+        # A key that is already stored keeps its slot, so there is
+        # only ever one slot for each key.
+        i = self.slots.get(key)
+        if i is not None:
+            self.values[i] = value
+            self.floors[i] = floor
+            self.flags[i] = settled and 1 or 0
+            return
+        i = self.victim()
+        old = self.keys[i]
+        if old is not None:
+            del self.slots[old]
+            if self.floors[i] > self.floor:
+                self.expired += 1
+            else:
+                self.evicted += 1
+        self.keys[i] = key
+        self.values[i] = value
+        self.floors[i] = floor
+        self.flags[i] = settled and 1 or 0
+        self.used[i] = 0
+        self.slots[key] = i
+
+    def victim(self):
+        "Move the hand on to the next slot that can be reused, and return it."
+        keys, floors, used, size = self.keys, self.floors, self.used, self.size
+        while True:
+            i = self.hand
+            self.hand = i + 1 < size and i + 1 or 0
+            if keys[i] is None or floors[i] > self.floor or not used[i]:
+                return i
+            used[i] = 0
+
+    def report(self):
+        "Describe the hit rate and evictions in one line."
+        probes = max(self.hits + self.misses, 1)
+        return ('eval cache %d hits (%0.1f%%), %d misses, %d evicted, %d expired' %
+                (self.hits, 100.0 * self.hits / probes, self.misses,
+                 self.evicted, self.expired))
+
+#_____________________________________________________________________
+# Node Pool
+#
+
+# Most nodes a NodePool holds before it starts evicting. Each holds a
+# board when both players have moved, so this caps the memory as well.
+POOL_SIZE = 1 << 16
+
+# Share of the nodes evicted at once when the pool fills up.
+EVICT_SHARE = 8
+
+class NodePool():
+    "Holds the nodes of a search tree, up to a fixed number of them."
+
+    # Nodes live in the slots of one list, and refer to their parent
+    # and children by slot number rather than holding on to them, so
+    # nothing keeps a node alive once the pool lets go of it. Every
+    # node has a parent in the pool, except the root, so the tree is
+    # always whole. A node needs the slots index, parent, move (the
+    # one that led to it), children (a dict of slot numbers by move)
+    # and used.
+
+    # Each time a node is used it is stamped with a counter. When the
+    # pool is full, the coldest share of the subtrees is evicted. A
+    # subtree is only as cold as the last time any node in it was
+    # used, so the path being searched is never cold, even though
+    # the nodes near the root were made long before those below.
+
+    def __init__(self, capacity=POOL_SIZE):
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self):
+        "Let go of every node."
+        self.nodes = []
+        self.free = []
+        self.clock = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        "Start counting added and evicted nodes again."
+        self.added = 0
+        self.evicted = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.nodes) - len(self.free)
+
+    def touch(self, node):
+        "Note that node was just used."
+        node.used = self.clock
+        self.clock += 1
+
+    def add(self, node, parent=None, move=None):
+        "Put node in the pool as the child of parent for move, if there is room."
+        if parent is not None and parent.index < 0:
+            node.index = -1 # its parent was evicted
+            return node
+        if len(self) >= self.capacity:
+            self.evict_coldest()
+            if parent is not None and parent.index < 0:
+                node.index = -1
+                return node
+        if self.free:
+            i = self.free.pop()
+            self.nodes[i] = node
+        else:
+            i = len(self.nodes)
+            self.nodes.append(node)
+        node.index = i
+        node.move = move
+        node.children = {}
+        if parent is None:
+            node.parent = -1
+        else:
+            node.parent = parent.index
+            parent.children[move] = i
+        self.touch(node)
+        self.added += 1
+        return node
+
+    def child(self, node, move):
+        "Return the child of node for move, or None if it isn't in the pool."
+        i = node.children.get(move)
+        if i is None:
+            return None
+        child = self.nodes[i]
+        self.touch(child)
+        return child
+
+    def evict(self, node):
+        "Take node and the subtree below it out of the pool."
+        if node.parent >= 0:
+            parent = self.nodes[node.parent]
+            if parent.children.get(node.move) == node.index:
+                del parent.children[node.move]
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            stack.extend(self.nodes[i] for i in node.children.itervalues())
+            self.nodes[node.index] = None
+            self.free.append(node.index)
+            node.index = -1
+            node.children = {}
+            self.evicted += 1
+
+    def evict_coldest(self):
+        "Evict the coldest share of the nodes, as whole subtrees."
+
+        # The nodes are listed parents first, so that the last time
+        # each subtree was used can be worked out children first.
+        nodes = self.nodes
+        order = [n for n in nodes if n is not None and n.parent < 0]
+        i = 0
+        while i < len(order):
+            order.extend(nodes[j] for j in order[i].children.itervalues())
+            i += 1
+        warmth = {}
+        for node in reversed(order):
+            w = node.used
+            for j in node.children.itervalues():
+                if warmth[j] > w:
+                    w = warmth[j]
+            warmth[node.index] = w
+        order.sort(key=lambda n: warmth[n.index])
+        for node in order[:max(1, len(order) / EVICT_SHARE)]:
+            if node.index >= 0: # not already gone with an ancestor
+                self.evict(node)
+                self.evictions += 1
+
+    def reroot(self, root):
+        "Make root the root of the tree, evicting everything not under it."
+        if root.index < 0:
+            return
+        if root.parent >= 0:
+            parent = self.nodes[root.parent]
+            del parent.children[root.move]
+            root.parent = -1
+            while parent.parent >= 0:
+                parent = self.nodes[parent.parent]
+            self.evict(parent)
+            self.evictions += 1
+
+    def report(self):
+        "Describe the size of the pool and what was evicted in one line."
+        return ('pool %d/%d nodes, %d added, %d evicted in %d subtrees' %
+                (len(self), self.capacity, self.added, self.evicted,
+                 self.evictions))
+
+#_____________________________________________________________________
+# Time Management
+#
+
+class TimeAlmostUp():
+    "Exception class that represents when move submission is due."
+    pass
+
+# How late the clock may be checked after the deadline has passed.
+OVERSHOOT = 0.001
+
+# How much longer each iteration is guessed to take than the last,
+# until there have been two iterations to go on.
+GROWTH = 4.0
+
+# Stop deepening once the best move has been the same for this many
+# iterations in a row, if the next one would take more than this
+# share of the time left.
+STABLE_ITERATIONS = 4
+STABLE_SHARE = 0.5
+
+class TimeManager():
+    "Decides when an iterative deepening search should stop."
+
+    # Rather than reading the clock at every node, tick counts down
+    # and only reads it every interval nodes. The interval is set from
+    # the node rate seen so far so that the clock is read well within
+    # every OVERSHOOT seconds, which is then as late as the search can
+    # be in noticing the deadline. It starts at one node and doubles
+    # until enough time has gone by to measure the rate.
+    # A search with no deadline, such as pondering, can instead be
+    # stopped from another thread by setting the stop event.
+
+    # After each iteration, completed records its nodes and time, and
+    # predicts the time of the next one from the growth between the
+    # last two. If that would run past the deadline, the iteration is
+    # not started, since a search cut off partway through is wasted.
+
+    # The search also stops early once the best move has been stable
+    # for several iterations and the next one would use up a good part
+    # of the time left. The time left over is kept in saved.
+
+    def __init__(self, finish_by=None, overshoot=OVERSHOOT, stop=None):
+        self.finish_by = finish_by
+        self.stop = stop
+        self.overshoot = overshoot
+        self.start = self.last = time.time()
+        self.nodes = 0
+        self.interval = 1
+        self.countdown = 1
+        self.iterations = []
+        self.moves = []
+        self.saved = 0.0
+
+    def tick(self):
+        "Count a node, and raise TimeAlmostUp if the deadline has passed."
+        self.countdown -= 1
+        if self.countdown <= 0:
+            self.check()
+
+    def check(self):
+        "Read the clock, and work out how many nodes to go before reading it again."
+        now = time.time()
+        if self.finish_by and now >= self.finish_by:
+            raise TimeAlmostUp()
+        if self.stop is not None and self.stop.is_set():
+            raise TimeAlmostUp()
+        self.nodes += self.interval
+        elapsed = now - self.start
+        if elapsed < self.overshoot:
+            self.interval *= 2
+        else:
+            # Aim for half the overshoot, since some nodes take longer.
+            rate = self.nodes / elapsed
+            self.interval = max(1, int(rate * self.overshoot / 2))
+        self.countdown = self.interval
+
+    def elapsed(self):
+        "Return the time since the search started."
+        return time.time() - self.start
+
+    def branching(self):
+        "Estimate how many times longer each iteration takes than the last."
+        if len(self.iterations) < 2 or not self.iterations[-2][1]:
+            return GROWTH
+        return float(self.iterations[-1][1]) / self.iterations[-2][1]
+
+    def predict(self):
+        "Predict how long the next iteration will take."
+        if not self.iterations:
+            return 0.0
+        return self.iterations[-1][2] * self.branching()
+
+    def completed(self, depth, nodes, move=None):
+        "Record an iteration that finished, and return whether to start another."
+        now = time.time()
+        self.iterations.append((depth, nodes, now - self.last))
+        self.last = now
+        self.moves.append(move)
+        if not self.finish_by:
+            return True
+        left = self.finish_by - now
+        predicted = self.predict()
+        stable = self.moves[-STABLE_ITERATIONS:]
+        if (move is not None and len(stable) == STABLE_ITERATIONS
+            and stable.count(move) == len(stable)
+            and predicted > left * STABLE_SHARE):
+            self.saved = left
+            logging.debug('move stable for %d iterations; saved %0.3fs',
+                          STABLE_ITERATIONS, left)
+            return False
+        if predicted > left:
+            self.saved = left
+            logging.debug('next iteration would take about %0.3fs; saved %0.3fs',
+                          predicted, left)
+            return False
+        return True
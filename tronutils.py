@@ -14,7 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import os, sys, random, tron, dijkstra, brandes
+import os, sys, random, tron, tronboard, dijkstra, brandes
 from collections import deque
 
 #_____________________________________________________________________
@@ -84,6 +84,21 @@ is_wall = tile_is_a(tron.WALL)
 is_floor = tile_is_a(tron.FLOOR)
 is_nonwall = invert(tile_is_a(tron.WALL))
 
+# Tile values matched by the predicates above, so that the graph
+# routines can test a tile in a flat board without calling them.
+TILE_VALUES = { is_wall    : frozenset([tronboard.WALL]),
+                is_floor   : frozenset([tronboard.FLOOR]),
+                is_nonwall : frozenset([tronboard.FLOOR, tronboard.ME,
+                                        tronboard.THEM]) }
+
+def tile_mask(board, predicate):
+    "List whether each tile matches predicate, indexed like a flat board."
+    if predicate in TILE_VALUES:
+        values = TILE_VALUES[predicate]
+        return [c in values for c in tronboard.flatten(board)]
+    geometry = tronboard.geometry(board.width, board.height)
+    return [bool(predicate(board, coords)) for coords in geometry.coords]
+
 def tiles_matching(board, predicate):
     "Collect all tiles on the board matching fn."
     tiles = []
@@ -95,6 +110,8 @@ def tiles_matching(board, predicate):
 
 def adjacent(board, coords, predicate):
     "Find all tiles on board adjacent to coords matching the predicate."
+    if predicate is is_floor and isinstance(board, tronboard.CompactBoard):
+        return board.floor_adjacent(coords)
     return [a for a in board.adjacent(coords) if predicate(board, a)]
 
 def set_char(s, i, c):
@@ -103,6 +120,10 @@ def set_char(s, i, c):
     
 def apply_move(board, player, move):
     "Create a copy of board where move has been applied to player."
+    if isinstance(board, tronboard.CompactBoard):
+        next_board = board.copy()
+        next_board.do_move(player, move)
+        return next_board
     lines = [line for line in board.board] # shallow copy
     (y1,x1) = board.find(player)
     (y2,x2) = board.rel(move, (y1,x1))
@@ -173,26 +194,22 @@ def distance((y1, x1), (y2, x2)):
 # Board Analysis
 #
     
+def fill_around(board, coords):
+    "Indices of all the open spaces around coords, with the board geometry."
+    cells = tronboard.flatten(board)
+    geometry = tronboard.geometry(board.width, board.height)
+    roots = geometry.floor_neighbors(cells, geometry.index(coords))
+    return geometry.fill(cells, roots), geometry
+
 def points_around(board, coords, predicate=is_floor):
     "All the open spaces around coords."
-    # http://mail.python.org/pipermail/image-sig/2005-September/003559.html
-    count = 0
-    edge = [coords]
-    seen = set()
-    while edge:
-        newedge = []
-        for tile in edge:
-            for adj in adjacent(board, tile, is_floor):
-                if adj not in seen:
-                    count += 1
-                    seen.add(adj)
-                    newedge.append(adj)
-        edge = newedge
-    return seen
+    seen, geometry = fill_around(board, coords)
+    return set(geometry.coords[i] for i in seen)
 
 def count_around(board, coords, predicate=is_floor):
     "Count of all spaces around coords."
-    return len(points_around(board, coords, predicate))
+    seen, geometry = fill_around(board, coords)
+    return len(seen)
 
 def anticipate(board, coords, pattern, num_moves):
     pos = coords
@@ -236,18 +253,22 @@ class DijkstraNeighbors():
         return 1 # all neighbors are 1 square away in Tron
         
 class DijkstraGraph():
-    "Adapter for Dijkstra algorithm implementation. Graph of tiles."
+    "Adapter for Dijkstra algorithm implementation. Graph of tile indices."
 
     def __init__(self, board, test):
-        self.board = board
-        self.test = test
+        self.neighbors = tronboard.geometry(board.width, board.height).neighbors
+        self.mask = tile_mask(board, test)
 
-    def __getitem__(self, coords):
-        return DijkstraNeighbors(adjacent(self.board, coords, self.test))
+    def __getitem__(self, i):
+        mask = self.mask
+        return DijkstraNeighbors([j for j in self.neighbors[i] if mask[j]])
 
 def shortest_path(board, start, end, test=is_nonwall):
     "Return the shortest path between two points on the board."
-    return dijkstra.shortestPath(DijkstraGraph(board, test), start, end)
+    geometry = tronboard.geometry(board.width, board.height)
+    path = dijkstra.shortestPath(DijkstraGraph(board, test),
+                                 geometry.index(start), geometry.index(end))
+    return [geometry.coords[i] for i in path]
 
 def moves_between(path):
     "Number of moves it would take for two players to traverse the path."
@@ -257,8 +278,12 @@ def moves_between(path):
 
 def dijkstra_map(board, start, end, test=is_nonwall):
     "Run Dijkstra's algorithm and return the distance map."
-    d, p = dijkstra.Dijkstra(DijkstraGraph(board, test), start, end)
-    return d
+    geometry = tronboard.geometry(board.width, board.height)
+    if end is not None:
+        end = geometry.index(end)
+    d, p = dijkstra.Dijkstra(DijkstraGraph(board, test),
+                             geometry.index(start), end)
+    return dict((geometry.coords[i], d[i]) for i in d)
     
 
 #_____________________________________________________________________
@@ -311,26 +336,24 @@ def touching(t):
 def dfs_count_around(board):
     "Use DFS to count all the spaces on the board around either player."
     N = [tron.ME, tron.THEM]
-    A = Adjacent(board, is_floor)
-    P = [board.me(), board.them()]
+    cells = tronboard.flatten(board)
+    geometry = tronboard.geometry(board.width, board.height)
+    P = [geometry.index(board.me()), geometry.index(board.them())]
+    M = [geometry.floor_moves(cells, p) for p in P]
     C = [{} for p in P]
     T = []
-    remaining = set(A[P[0]] + A[P[1]])
+    remaining = set(a for m in M for a, d in m)
     while remaining:
         u = remaining.pop()
-        V = set([])
-        root_dfs(u, A, V)
+        V = geometry.fill(cells, [u])
         c = len(V)
         t = []
         for i in range(len(P)):
-            p = P[i]
-            for a in A[p]:
+            for a, d in M[i]:
                 if a in V:
-                    d = move_made(p, a)
                     C[i][d] = c
                     t.append((N[i],d))
-                    if a in remaining:
-                        remaining.remove(a)
+                    remaining.discard(a)
         T.append(t)
     return C[0], C[1], T, touching(T)
 
@@ -420,17 +443,21 @@ def heat_map(board, paths=20):
 
 def distance_map(board, coords):
     "Find the distance to all floor tiles from coords."
-    seen = set(coords)
-    q = deque([coords])
-    d = { coords: 0 }
+    cells = tronboard.flatten(board)
+    geometry = tronboard.geometry(board.width, board.height)
+    neighbors = geometry.neighbors
+    start = geometry.index(coords)
+    q = deque([start])
+    d = { start: 0 }
     while q:
         p = q.popleft()
-        for a in adjacent(board, p, is_floor):
-            if a not in seen:
-                seen.add(a)
+        dp = d[p] + 1
+        for a in neighbors[p]:
+            if cells[a] == tronboard.FLOOR and a not in d:
                 q.append(a)
-                d[a] = d[p] + 1
-    return d
+                d[a] = dp
+    points = geometry.coords
+    return dict((points[i], d[i]) for i in d)
 
 def same_distance(board, a, b):
     "Return all points equidistant from a and b."